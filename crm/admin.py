@@ -1,12 +1,17 @@
-import csv
+import logging
 import stripe
 from django.conf import settings
 from django.contrib import admin, messages
+from django.core import checks
+from django.core.exceptions import FieldDoesNotExist
 from django.core.files.base import ContentFile
-from django.http import HttpResponse
+from django.db import connection
 from django.utils import timezone
 from django.utils.safestring import mark_safe
 from utils.gcalendar import get_calendar_service, upsert_event
+from .conflicts import detect_conflicts as detect_lesson_conflicts
+from .exports import csv_response, start_background_export
+from .scheduling import schedule_lesson_requests
 from .models import (
     Lead,
     LeadNote,
@@ -23,6 +28,7 @@ from .models import (
     Classroom,
     Lesson,
     LessonAttendance,
+    LessonRequest,
     Invoice,
     PaymentPlan,
     PaymentSchedule,
@@ -32,6 +38,7 @@ from .models import (
     CommunicationTemplate,
     CommunicationLog,
     ScheduledEmail,
+    StripeEvent,
     ConflictDetection,
     ReminderLog,
     CalendarFeed,
@@ -39,6 +46,7 @@ from .models import (
     StaffProfile,
     Notification,
     NotificationReceipt,
+    ExportJob,
     HomeHeroSlide,
     Blog,
     BlogComment,
@@ -47,22 +55,118 @@ from .models import (
 )
 
 
+logger = logging.getLogger(__name__)
+
+
+class QueryCounter:
+    """Count the queries run on ``connection`` inside a ``with`` block, through ``execute_wrapper``."""
+
+    def __init__(self, db=connection):
+        self.db = db
+        self.count = 0
+        self._wrapper = None
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = self.db.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    def __len__(self):
+        return self.count
+
+
+class QueryBudgetAdmin(admin.ModelAdmin):
+    """ModelAdmin whose changelist declares the relations it loads and how many queries it may run.
+
+    Every foreign key shown in ``list_display`` must be covered by ``list_select_related`` (the system check
+    reports crm.W001 otherwise), so the query count of a changelist does not grow with the rows on the page.
+    When ADMIN_QUERY_BUDGET_ENFORCE is on, changelists that run more than ``changelist_query_budget`` queries
+    are logged; ``manage.py check_admin_query_budgets`` renders every changelist and fails on overruns.
+    """
+
+    list_select_related = False
+    changelist_query_budget = 12
+
+    def check(self, **kwargs):
+        return [*super().check(**kwargs), *self._check_list_select_related()]
+
+    def unloaded_relations(self):
+        """Foreign keys in ``list_display`` that ``list_select_related`` does not load."""
+        declared = self.list_select_related
+        if declared is True:
+            return []
+        loaded = {path.split("__")[0] for path in declared or ()}
+        missing = []
+        for name in self.list_display:
+            if not isinstance(name, str):
+                continue
+            try:
+                field = self.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if field.many_to_one or field.one_to_one:
+                if name not in loaded:
+                    missing.append(name)
+        return missing
+
+    def _check_list_select_related(self):
+        return [
+            checks.Warning(
+                f"list_display shows '{name}' but list_select_related does not load it.",
+                hint="Add it (and any relation its __str__ follows) to list_select_related.",
+                obj=self.__class__,
+                id="crm.W001",
+            )
+            for name in self.unloaded_relations()
+        ]
+
+    def changelist_view(self, request, extra_context=None):
+        if not getattr(settings, "ADMIN_QUERY_BUDGET_ENFORCE", False):
+            return super().changelist_view(request, extra_context)
+        with QueryCounter() as queries:
+            response = super().changelist_view(request, extra_context)
+            if hasattr(response, "render"):
+                response.render()
+        if len(queries) > self.changelist_query_budget:
+            logger.warning(
+                "%s changelist ran %d queries (budget %d)",
+                self.model._meta.label,
+                len(queries),
+                self.changelist_query_budget,
+            )
+        return response
+
+
 class ExportCsvMixin:
-    actions = ["export_as_csv"]
+    actions = ["export_as_csv", "export_as_csv_gzip", "export_as_csv_background"]
 
     def export_as_csv(self, request, queryset):
-        meta = self.model._meta
-        field_names = [field.name for field in meta.fields]
-        response = HttpResponse(content_type="text/csv")
-        response["Content-Disposition"] = f"attachment; filename={meta.model_name}.csv"
-        writer = csv.writer(response)
-        writer.writerow(field_names)
-        for obj in queryset:
-            writer.writerow([getattr(obj, field) for field in field_names])
-        return response
+        return csv_response(queryset)
 
     export_as_csv.short_description = "Export selected to CSV"
 
+    def export_as_csv_gzip(self, request, queryset):
+        return csv_response(queryset, compress=True)
+
+    export_as_csv_gzip.short_description = "Export selected to CSV (gzip)"
+
+    def export_as_csv_background(self, request, queryset):
+        start_background_export(queryset, request.user)
+        self.message_user(
+            request,
+            "Export queued; you will get a notification with the download link when it is ready.",
+            level=messages.INFO,
+        )
+
+    export_as_csv_background.short_description = "Export selected to CSV in the background"
+
 
 def _pdf_escape(value):
     return value.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
@@ -161,22 +265,23 @@ class BlogCommentInline(admin.TabularInline):
 # --- Admin Registrations ---
 
 @admin.register(Lead)
-class LeadAdmin(ExportCsvMixin, admin.ModelAdmin):
+class LeadAdmin(ExportCsvMixin, QueryBudgetAdmin):
     list_display = ("first_name", "last_name", "email", "phone", "status", "assigned_to", "created_at")
+    list_select_related = ("assigned_to",)
     list_filter = ("status", "assigned_to", "created_at")
     search_fields = ("first_name", "last_name", "email", "phone", "source", "interest")
     inlines = [LeadNoteInline, LeadTaskInline]
 
 
 @admin.register(Student)
-class StudentAdmin(ExportCsvMixin, admin.ModelAdmin):
+class StudentAdmin(ExportCsvMixin, QueryBudgetAdmin):
     list_display = ("first_name", "last_name", "email", "phone", "preferred_location", "created_at")
     search_fields = ("first_name", "last_name", "email", "phone")
     inlines = [StudentDocumentInline]
 
 
 @admin.register(Course)
-class CourseAdmin(ExportCsvMixin, admin.ModelAdmin):
+class CourseAdmin(ExportCsvMixin, QueryBudgetAdmin):
     list_display = ("name", "slug", "course_type", "price", "active")
     list_filter = ("course_type", "active")
     search_fields = ("name", "slug", "summary")
@@ -184,14 +289,16 @@ class CourseAdmin(ExportCsvMixin, admin.ModelAdmin):
 
 
 @admin.register(CourseSession)
-class CourseSessionAdmin(ExportCsvMixin, admin.ModelAdmin):
+class CourseSessionAdmin(ExportCsvMixin, QueryBudgetAdmin):
     list_display = ("course", "location", "delivery_mode", "start_date", "capacity", "enrollment_open")
+    list_select_related = ("course",)
     list_filter = ("delivery_mode", "location", "enrollment_open")
 
 
 @admin.register(Enrollment)
-class EnrollmentAdmin(ExportCsvMixin, admin.ModelAdmin):
+class EnrollmentAdmin(ExportCsvMixin, QueryBudgetAdmin):
     list_display = ("student", "session", "status", "enrolled_at", "balance")
+    list_select_related = ("student", "session__course")
     list_filter = ("status",)
     search_fields = ("student__first_name", "student__last_name")
     actions = ["submit_ministry"]
@@ -218,19 +325,20 @@ class EnrollmentAdmin(ExportCsvMixin, admin.ModelAdmin):
 
 
 @admin.register(EnrollmentRequest)
-class EnrollmentRequestAdmin(ExportCsvMixin, admin.ModelAdmin):
+class EnrollmentRequestAdmin(ExportCsvMixin, QueryBudgetAdmin):
     list_display = ("name", "email", "phone", "package", "status", "created_at")
     list_filter = ("status", "created_at")
     search_fields = ("name", "email", "phone")
 
 
 @admin.register(Instructor)
-class InstructorAdmin(ExportCsvMixin, admin.ModelAdmin):
+class InstructorAdmin(ExportCsvMixin, QueryBudgetAdmin):
     list_display = ("user", "phone", "license_number", "active")
+    list_select_related = ("user",)
 
 
 @admin.register(Blog)
-class BlogAdmin(ExportCsvMixin, admin.ModelAdmin):
+class BlogAdmin(ExportCsvMixin, QueryBudgetAdmin):
     list_display = ("title", "author_name", "is_published", "published_at", "updated_at")
     list_filter = ("is_published", "published_at")
     search_fields = ("title", "summary", "content", "author_name")
@@ -239,7 +347,7 @@ class BlogAdmin(ExportCsvMixin, admin.ModelAdmin):
 
 
 @admin.register(HomeHeroSlide)
-class HomeHeroSlideAdmin(ExportCsvMixin, admin.ModelAdmin):
+class HomeHeroSlideAdmin(ExportCsvMixin, QueryBudgetAdmin):
     list_display = ("title_line_1", "is_active", "display_order", "updated_at")
     list_filter = ("is_active", "updated_at")
     search_fields = ("title_line_1", "title_line_2", "title_line_3", "button_text", "button_url")
@@ -250,7 +358,7 @@ class HomeHeroSlideAdmin(ExportCsvMixin, admin.ModelAdmin):
 
 
 @admin.register(Testimonial)
-class TestimonialAdmin(ExportCsvMixin, admin.ModelAdmin):
+class TestimonialAdmin(ExportCsvMixin, QueryBudgetAdmin):
     list_display = ("name", "role", "rating", "is_published", "display_order", "updated_at")
     list_filter = ("is_published", "rating")
     search_fields = ("name", "role", "quote")
@@ -258,67 +366,50 @@ class TestimonialAdmin(ExportCsvMixin, admin.ModelAdmin):
 
 
 @admin.register(Vehicle)
-class VehicleAdmin(ExportCsvMixin, admin.ModelAdmin):
+class VehicleAdmin(ExportCsvMixin, QueryBudgetAdmin):
     list_display = ("name", "make", "model", "year", "plate_number", "active", "location")
     list_filter = ("active", "location")
 
 
 @admin.register(Classroom)
-class ClassroomAdmin(ExportCsvMixin, admin.ModelAdmin):
+class ClassroomAdmin(ExportCsvMixin, QueryBudgetAdmin):
     list_display = ("name", "location", "capacity")
 
 
 @admin.register(Lesson)
-class LessonAdmin(ExportCsvMixin, admin.ModelAdmin):
+class LessonAdmin(ExportCsvMixin, QueryBudgetAdmin):
     list_display = ("student", "lesson_type", "start_time", "end_time", "status", "instructor")
+    list_select_related = ("student", "instructor__user")
     list_filter = ("lesson_type", "status")
     search_fields = ("student__first_name", "student__last_name")
     actions = ["detect_conflicts"]
     inlines = [LessonAttendanceInline, ConflictDetectionInline, ReminderLogInline]
 
     def detect_conflicts(self, request, queryset):
-        created = 0
-        for lesson in queryset.select_related("instructor", "vehicle", "classroom"):
-            overlaps = Lesson.objects.filter(start_time__lt=lesson.end_time, end_time__gt=lesson.start_time).exclude(
-                pk=lesson.pk
-            )
-            if lesson.instructor:
-                conflicts = overlaps.filter(instructor=lesson.instructor)
-                for conflict in conflicts:
-                    _, was_created = ConflictDetection.objects.get_or_create(
-                        lesson=lesson,
-                        conflict_type="instructor",
-                        conflicting_lesson=conflict,
-                    )
-                    if was_created:
-                        created += 1
-            if lesson.vehicle:
-                conflicts = overlaps.filter(vehicle=lesson.vehicle)
-                for conflict in conflicts:
-                    _, was_created = ConflictDetection.objects.get_or_create(
-                        lesson=lesson,
-                        conflict_type="vehicle",
-                        conflicting_lesson=conflict,
-                    )
-                    if was_created:
-                        created += 1
-            if lesson.classroom:
-                conflicts = overlaps.filter(classroom=lesson.classroom)
-                for conflict in conflicts:
-                    _, was_created = ConflictDetection.objects.get_or_create(
-                        lesson=lesson,
-                        conflict_type="classroom",
-                        conflicting_lesson=conflict,
-                    )
-                    if was_created:
-                        created += 1
+        created = detect_lesson_conflicts(lesson_ids=queryset.values_list("pk", flat=True))
         if created:
             self.message_user(request, f"Detected {created} conflict(s).", level=messages.SUCCESS)
 
 
+@admin.register(LessonRequest)
+class LessonRequestAdmin(ExportCsvMixin, QueryBudgetAdmin):
+    list_display = ("name", "email", "phone", "preferred_date", "preferred_time", "status", "created_at")
+    list_filter = ("status", "preferred_date")
+    search_fields = ("name", "email", "phone")
+    actions = ["auto_schedule"]
+
+    def auto_schedule(self, request, queryset):
+        booked, unplaced = schedule_lesson_requests(queryset.filter(status="new"), apply=True)
+        if booked:
+            self.message_user(request, f"Scheduled {len(booked)} lesson request(s).", level=messages.SUCCESS)
+        if unplaced:
+            self.message_user(request, f"Could not place {len(unplaced)} request(s).", level=messages.WARNING)
+
+
 @admin.register(Invoice)
-class InvoiceAdmin(ExportCsvMixin, admin.ModelAdmin):
+class InvoiceAdmin(ExportCsvMixin, QueryBudgetAdmin):
     list_display = ("number", "enrollment", "issue_date", "due_date", "total_amount", "status", "stripe_checkout_session_id")
+    list_select_related = ("enrollment__student", "enrollment__session__course")
     list_filter = ("status",)
     search_fields = ("number",)
     actions = ["create_stripe_checkout"]
@@ -361,18 +452,63 @@ class InvoiceAdmin(ExportCsvMixin, admin.ModelAdmin):
 
 
 @admin.register(PaymentPlan)
-class PaymentPlanAdmin(ExportCsvMixin, admin.ModelAdmin):
+class PaymentPlanAdmin(ExportCsvMixin, QueryBudgetAdmin):
     list_display = ("name", "total_amount", "installment_count", "frequency", "active")
     list_filter = ("frequency", "active")
     inlines = [PaymentScheduleInline]
 
 
 @admin.register(Payment)
-class PaymentAdmin(ExportCsvMixin, admin.ModelAdmin):
+class PaymentAdmin(ExportCsvMixin, QueryBudgetAdmin):
     list_display = ("invoice", "amount", "paid_at", "method", "status", "stripe_payment_intent_id")
+    list_select_related = ("invoice",)
     list_filter = ("method", "status")
 
 
+@admin.register(StripeEvent)
+class StripeEventAdmin(QueryBudgetAdmin):
+    list_display = ("event_id", "event_type", "status", "attempts", "received_at", "processed_at")
+    list_filter = ("status", "event_type")
+    search_fields = ("event_id",)
+    readonly_fields = ("event_id", "event_type", "payload", "received_at", "processed_at")
+    actions = ["retry_events"]
+
+    def retry_events(self, request, queryset):
+        updated = queryset.exclude(status="processed").update(
+            status="pending", attempts=0, next_attempt_at=timezone.now(), last_error=""
+        )
+        self.message_user(request, f"Queued {updated} event(s) for another attempt.", level=messages.SUCCESS)
+
+    retry_events.short_description = "Retry selected events"
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(QueryBudgetAdmin):
+    list_display = ("model_label", "requested_by", "status", "created_at", "started_at", "finished_at")
+    list_select_related = ("requested_by",)
+    list_filter = ("status", "model_label")
+    readonly_fields = (
+        "model_label",
+        "object_ids",
+        "compress",
+        "requested_by",
+        "filename",
+        "error",
+        "created_at",
+        "started_at",
+        "finished_at",
+    )
+    actions = ["retry_exports"]
+
+    def retry_exports(self, request, queryset):
+        updated = queryset.filter(status="failed").update(
+            status="pending", filename="", error="", started_at=None, finished_at=None
+        )
+        self.message_user(request, f"Queued {updated} export(s) for another attempt.", level=messages.SUCCESS)
+
+    retry_exports.short_description = "Retry selected exports"
+
+
 # @admin.register(Certificate)
 # class CertificateAdmin(ExportCsvMixin, admin.ModelAdmin):
 #     list_display = ("certificate_number", "enrollment", "status", "issued_at", "submitted_at")
@@ -405,21 +541,22 @@ class PaymentAdmin(ExportCsvMixin, admin.ModelAdmin):
 
 
 @admin.register(CommunicationTemplate)
-class CommunicationTemplateAdmin(ExportCsvMixin, admin.ModelAdmin):
+class CommunicationTemplateAdmin(ExportCsvMixin, QueryBudgetAdmin):
     list_display = ("name", "channel", "active")
     list_filter = ("channel", "active")
     search_fields = ("name", "subject", "body")
 
 
 @admin.register(CalendarAccount)
-class CalendarAccountAdmin(admin.ModelAdmin):
+class CalendarAccountAdmin(QueryBudgetAdmin):
     list_display = ("provider", "owner", "email", "active", "token_expires_at", "created_at")
+    list_select_related = ("owner",)
     list_filter = ("provider", "active", "created_at")
     search_fields = ("email", "owner__username", "owner__email")
 
 
 @admin.register(Event)
-class EventAdmin(admin.ModelAdmin):
+class EventAdmin(QueryBudgetAdmin):
     list_display = ("title", "start", "end", "google_event_id")
     readonly_fields = ("google_event_id",)
 
@@ -447,13 +584,14 @@ class EventAdmin(admin.ModelAdmin):
 
 
 @admin.register(StaffProfile)
-class StaffProfileAdmin(ExportCsvMixin, admin.ModelAdmin):
+class StaffProfileAdmin(ExportCsvMixin, QueryBudgetAdmin):
     list_display = ("user", "role", "active")
+    list_select_related = ("user",)
     list_filter = ("role", "active")
 
 
 @admin.register(Notification)
-class NotificationAdmin(admin.ModelAdmin):
+class NotificationAdmin(QueryBudgetAdmin):
     list_display = ("title", "level", "audience", "active", "created_at")
     list_filter = ("level", "audience", "active", "created_at")
     search_fields = ("title", "body", "link_url")
@@ -0,0 +1,155 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .conflicts import RESOURCE_FIELDS, build_resource_index, load_lesson_intervals, sweep_overlaps
+from .dashboard_cache import bump_model_version
+from .journal import record_lessons_created
+from .models import Classroom, Enrollment, Instructor, Lesson, Vehicle
+
+MAX_UNPAID_LESSONS = 5
+
+CONFLICT_MESSAGES = {
+    "instructor": "Instructor is already booked for this time.",
+    "vehicle": "Vehicle is already booked for this time.",
+    "classroom": "Classroom is already booked for this time.",
+}
+UNPAID_LIMIT_MESSAGE = "Student has not paid in full. Maximum 5 lessons allowed."
+
+RESOURCE_MODELS = {"instructor": Instructor, "vehicle": Vehicle, "classroom": Classroom}
+
+
+def _proposal_key(index):
+    return ("proposed", index)
+
+
+def lesson_errors(lessons):
+    """Validate proposed lessons as a set; returns ``{index: [messages]}`` for the ones that fail.
+
+    Lessons are checked against the stored instructor, vehicle and classroom calendars, against each
+    other, and against the unpaid-lesson limit, using at most three queries regardless of batch size.
+    Lessons that already have a primary key are excluded from the stored side, as ``Lesson.clean`` does.
+    """
+    errors = {}
+    if not lessons:
+        return errors
+
+    proposed = []
+    for index, lesson in enumerate(lessons):
+        if lesson.start_time is None:
+            # Reported as a field error by full_clean(); nothing to check against the calendars.
+            continue
+        if not lesson.end_time:
+            lesson.end_time = lesson.start_time + timedelta(hours=1)
+        if lesson.start_time >= lesson.end_time:
+            errors.setdefault(index, []).append("End time must be after start time.")
+            continue
+        proposed.append(
+            {
+                "id": _proposal_key(index),
+                "start_time": lesson.start_time,
+                "end_time": lesson.end_time,
+                "instructor_id": lesson.instructor_id,
+                "vehicle_id": lesson.vehicle_id,
+                "classroom_id": lesson.classroom_id,
+            }
+        )
+
+    own_ids = {lesson.pk for lesson in lessons if lesson.pk}
+    resources = Q()
+    for _, field in RESOURCE_FIELDS:
+        ids = {row[field] for row in proposed if row[field]}
+        if ids:
+            resources |= Q(**{f"{field}__in": ids})
+    stored = []
+    if proposed and resources:
+        start = min(row["start_time"] for row in proposed)
+        end = max(row["end_time"] for row in proposed)
+        stored = [
+            row for row in load_lesson_intervals(start, end, extra_filter=resources) if row["id"] not in own_ids
+        ]
+
+    for (conflict_type, _), rows in build_resource_index(stored + proposed).items():
+        for first, second in sweep_overlaps(rows):
+            for row in (first, second):
+                if isinstance(row["id"], tuple):
+                    messages = errors.setdefault(row["id"][1], [])
+                    if CONFLICT_MESSAGES[conflict_type] not in messages:
+                        messages.append(CONFLICT_MESSAGES[conflict_type])
+
+    student_ids = {lesson.student_id for lesson in lessons if lesson.student_id}
+    if student_ids:
+        paid = set(
+            Enrollment.objects.filter(student_id__in=student_ids, status__in=["paid", "completed"])
+            .values_list("student_id", flat=True)
+            .distinct()
+        )
+        unpaid = student_ids - paid
+        if unpaid:
+            existing = dict(
+                Lesson.objects.filter(student_id__in=unpaid)
+                .exclude(pk__in=own_ids)
+                .values("student_id")
+                .annotate(total=Count("pk"))
+                .values_list("student_id", "total")
+            )
+            proposed_counts = Counter()
+            for index, lesson in enumerate(lessons):
+                if lesson.student_id not in unpaid:
+                    continue
+                proposed_counts[lesson.student_id] += 1
+                if existing.get(lesson.student_id, 0) + proposed_counts[lesson.student_id] > MAX_UNPAID_LESSONS:
+                    errors.setdefault(index, []).append(UNPAID_LIMIT_MESSAGE)
+    return errors
+
+
+def _lock_resources(lessons):
+    # Serialise concurrent bookings for the same instructor, vehicle or classroom until commit. A no-op on
+    # backends without row locks (SQLite), where writes are already serialised.
+    for conflict_type, field in RESOURCE_FIELDS:
+        ids = sorted({getattr(lesson, field) for lesson in lessons if getattr(lesson, field)})
+        if ids:
+            list(RESOURCE_MODELS[conflict_type].objects.select_for_update().filter(pk__in=ids).values_list("pk"))
+
+
+def book_lessons(lessons, student=None, session=None):
+    """Validate and insert a batch of unsaved lessons in one transaction.
+
+    ``student`` and ``session`` fill in lessons that do not set them, so a student's package or a whole
+    ``CourseSession`` schedule can be booked in one call. Nothing is written if any lesson fails; the raised
+    ``ValidationError`` lists every problem, keyed by the lesson's position in the batch.
+    """
+    lessons = list(lessons)
+    for lesson in lessons:
+        if student is not None and not lesson.student_id:
+            lesson.student = student
+        if session is not None and not lesson.session_id:
+            lesson.session = session
+        if lesson.pk:
+            raise ValueError("book_lessons only accepts unsaved lessons.")
+    if not lessons:
+        return []
+
+    with transaction.atomic():
+        _lock_resources(lessons)
+        errors = lesson_errors(lessons)
+        for index, lesson in enumerate(lessons):
+            if not lesson.student_id:
+                errors.setdefault(index, []).append("Student is required.")
+            if lesson.start_time is None:
+                errors.setdefault(index, []).append("Start time is required.")
+        if errors:
+            raise ValidationError(
+                {
+                    f"lesson_{index}": [f"Lesson {index + 1} ({lessons[index].start_time}): {message}" for message in messages]
+                    for index, messages in sorted(errors.items())
+                }
+            )
+        created = Lesson.objects.bulk_create(lessons, batch_size=500)
+        record_lessons_created(created)
+    # bulk_create skips post_save, so invalidate the dashboard widgets that read lessons here.
+    bump_model_version(Lesson)
+    return created
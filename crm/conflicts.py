@@ -0,0 +1,112 @@
+import heapq
+from datetime import timedelta
+
+from django.db.models import Q
+
+from .models import ConflictDetection, Lesson
+
+RESOURCE_FIELDS = (
+    ("instructor", "instructor_id"),
+    ("vehicle", "vehicle_id"),
+    ("classroom", "classroom_id"),
+)
+
+
+def _lesson_end(start_time, end_time):
+    return end_time or start_time + timedelta(hours=1)
+
+
+def load_lesson_intervals(start=None, end=None, extra_filter=None):
+    """Load every lesson overlapping ``[start, end)`` in one query as plain dicts."""
+    qs = Lesson.objects.all()
+    if start is not None:
+        qs = qs.filter(Q(end_time__gt=start) | Q(end_time__isnull=True, start_time__gt=start - timedelta(hours=1)))
+    if end is not None:
+        qs = qs.filter(start_time__lt=end)
+    if extra_filter is not None:
+        qs = qs.filter(extra_filter)
+    rows = []
+    fields = ("id", "start_time", "end_time", "student_id", "instructor_id", "vehicle_id", "classroom_id")
+    for row in qs.values(*fields).iterator():
+        row["end_time"] = _lesson_end(row["start_time"], row["end_time"])
+        rows.append(row)
+    return rows
+
+
+def build_resource_index(intervals):
+    """Group intervals per (resource type, resource id), each list sorted by start time."""
+    index = {}
+    for row in intervals:
+        for conflict_type, field in RESOURCE_FIELDS:
+            resource_id = row.get(field)
+            if resource_id:
+                index.setdefault((conflict_type, resource_id), []).append(row)
+    for rows in index.values():
+        rows.sort(key=lambda r: (r["start_time"], r["end_time"]))
+    return index
+
+
+def sweep_overlaps(rows):
+    """Yield every overlapping pair in a start-sorted interval list.
+
+    Uses a min-heap of active end times, so the cost is O(n log n + k) for k overlaps.
+    """
+    active = []
+    for order, row in enumerate(rows):
+        while active and active[0][0] <= row["start_time"]:
+            heapq.heappop(active)
+        for _, _, other in active:
+            yield other, row
+        heapq.heappush(active, (row["end_time"], order, row))
+
+
+def find_conflicts(intervals):
+    """Return ``(conflict_type, lesson_id, conflicting_lesson_id)`` for every overlap, in both directions."""
+    conflicts = []
+    for (conflict_type, _), rows in build_resource_index(intervals).items():
+        for first, second in sweep_overlaps(rows):
+            conflicts.append((conflict_type, first["id"], second["id"]))
+            conflicts.append((conflict_type, second["id"], first["id"]))
+    return conflicts
+
+
+def record_conflicts(conflicts):
+    """Bulk-insert ConflictDetection rows that do not exist yet; returns the number created."""
+    if not conflicts:
+        return 0
+    lesson_ids = {lesson_id for _, lesson_id, _ in conflicts}
+    existing = set(
+        ConflictDetection.objects.filter(lesson_id__in=lesson_ids).values_list(
+            "conflict_type", "lesson_id", "conflicting_lesson_id"
+        )
+    )
+    missing = []
+    for conflict in dict.fromkeys(conflicts):
+        if conflict not in existing:
+            conflict_type, lesson_id, conflicting_id = conflict
+            missing.append(
+                ConflictDetection(lesson_id=lesson_id, conflict_type=conflict_type, conflicting_lesson_id=conflicting_id)
+            )
+    ConflictDetection.objects.bulk_create(missing, batch_size=500)
+    return len(missing)
+
+
+def detect_conflicts(start=None, end=None, lesson_ids=None):
+    """Detect and record resource conflicts for a time window.
+
+    When ``lesson_ids`` is given, only conflicts involving those lessons are recorded (from their side),
+    and the window defaults to the span of those lessons.
+    """
+    if lesson_ids is not None:
+        lesson_ids = set(lesson_ids)
+        if not lesson_ids:
+            return 0
+        selected = load_lesson_intervals(extra_filter=Q(pk__in=lesson_ids))
+        if not selected:
+            return 0
+        start = min(row["start_time"] for row in selected)
+        end = max(row["end_time"] for row in selected)
+    conflicts = find_conflicts(load_lesson_intervals(start, end))
+    if lesson_ids is not None:
+        conflicts = [conflict for conflict in conflicts if conflict[1] in lesson_ids]
+    return record_conflicts(conflicts)
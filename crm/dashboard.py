@@ -2,11 +2,13 @@ from jet.dashboard.dashboard import Dashboard
 from jet.dashboard import modules
 from datetime import timedelta
 from django.db.models import Count, F, Q, Sum
-from django.db.models.functions import TruncDay, TruncMonth
+from django.db.models.functions import TruncDay
 from django.conf import settings
 from django.utils import timezone
 
-from .models import Enrollment, Invoice, Lead, Lesson, Payment
+from .dashboard_cache import get_or_build
+from .models import Course, CourseSession, Enrollment, Invoice, Lead, Lesson, Payment
+from .rollups import leads_by_month, revenue_by_month
 
 
 class BaseChartModule(modules.DashboardModule):
@@ -20,6 +22,9 @@ class BaseChartModule(modules.DashboardModule):
     min_height = 260
     supports_range_filter = True
     default_range_days = 180
+    cache_models = ()
+    # Widgets whose window or labels follow the clock also key their cache on the local date.
+    cache_by_day = False
 
     def get_range_value(self, request):
         if not request:
@@ -42,6 +47,19 @@ class BaseChartModule(modules.DashboardModule):
     def build_chart_data(self, request=None, since=None):
         return [], []
 
+    def get_chart_data(self, request=None, since=None, range_value=""):
+        if not self.cache_models:
+            return self.build_chart_data(request=request, since=since)
+        if self.cache_by_day:
+            range_value = f"{range_value}@{timezone.localdate().isoformat()}"
+        labels, values = get_or_build(
+            type(self),
+            range_value,
+            self.cache_models,
+            lambda: self.build_chart_data(request=request, since=since),
+        )
+        return list(labels), list(values)
+
     def init_with_context(self, context):
         request = context.get("request")
         since = self.get_since(request) if self.supports_range_filter else None
@@ -58,7 +76,7 @@ class BaseChartModule(modules.DashboardModule):
         subtitle = self.subtitle
         if range_label:
             subtitle = f"{subtitle} • {range_label}" if subtitle else range_label
-        labels, values = self.build_chart_data(request=request, since=since)
+        labels, values = self.get_chart_data(request=request, since=since, range_value=range_value)
         stable_id = getattr(self.model, "id", None) or self.title.lower().replace(" ", "-")
         root_id = f"chart-widget-{stable_id}"
         canvas_id = f"chart-canvas-{stable_id}"
@@ -93,6 +111,7 @@ class LeadStatusDoughnutModule(BaseChartModule):
     chart_type = "doughnut"
     dataset_label = "Leads"
     subtitle = "Pipeline distribution"
+    cache_models = (Lead,)
 
     def build_chart_data(self, request=None, since=None):
         qs = Lead.objects.all()
@@ -113,6 +132,7 @@ class InvoiceStatusPieModule(BaseChartModule):
     chart_type = "pie"
     dataset_label = "Invoices"
     subtitle = "Billing overview"
+    cache_models = (Invoice,)
 
     def build_chart_data(self, request=None, since=None):
         qs = Invoice.objects.all()
@@ -135,20 +155,12 @@ class LeadsByMonthLineModule(BaseChartModule):
     subtitle = "Trend"
     x_title = "Month"
     y_title = "Leads"
+    cache_models = (Lead,)
 
     def build_chart_data(self, request=None, since=None):
-        qs = Lead.objects.all()
-        if since:
-            qs = qs.filter(created_at__gte=since)
-        rows = (
-            qs
-            .annotate(month=TruncMonth("created_at"))
-            .values("month")
-            .annotate(count=Count("id"))
-            .order_by("month")
-        )
-        labels = [row["month"].strftime("%b %Y") for row in rows if row["month"]]
-        values = [row["count"] for row in rows]
+        rows = [row for row in leads_by_month(since) if row["month"]]
+        labels = [row["month"].strftime("%b %Y") for row in rows]
+        values = [row["value"] or 0 for row in rows]
         return labels, values
 
 
@@ -157,6 +169,7 @@ class LessonStatusRadarModule(BaseChartModule):
     chart_type = "radar"
     dataset_label = "Lessons"
     subtitle = "By status"
+    cache_models = (Lesson,)
 
     def build_chart_data(self, request=None, since=None):
         qs = Lesson.objects.all()
@@ -190,6 +203,7 @@ class EnrollmentsByCourseBarModule(BaseChartModule):
     x_title = "Course"
     y_title = "Enrollments"
     min_height = 320
+    cache_models = (Enrollment, CourseSession, Course)
 
     def build_chart_data(self, request=None, since=None):
         qs = Enrollment.objects.all()
@@ -213,6 +227,7 @@ class LeadsBySourceBarModule(BaseChartModule):
     x_title = "Source"
     y_title = "Leads"
     min_height = 320
+    cache_models = (Lead,)
 
     def build_chart_data(self, request=None, since=None):
         qs = Lead.objects.all()
@@ -241,6 +256,8 @@ class LessonsNext7DaysBarModule(BaseChartModule):
     y_title = "Lessons"
     min_height = 320
     supports_range_filter = False
+    cache_models = (Lesson,)
+    cache_by_day = True
 
     def build_chart_data(self, request=None, since=None):
         start = timezone.now()
@@ -273,20 +290,12 @@ class RevenueByMonthLineModule(BaseChartModule):
     subtitle = "Payments completed"
     x_title = "Month"
     y_title = "Amount"
+    cache_models = (Payment,)
 
     def build_chart_data(self, request=None, since=None):
-        qs = Payment.objects.filter(status="completed")
-        if since:
-            qs = qs.filter(paid_at__gte=since)
-        rows = (
-            qs
-            .annotate(month=TruncMonth("paid_at"))
-            .values("month")
-            .annotate(total=Sum("amount"))
-            .order_by("month")
-        )
-        labels = [row["month"].strftime("%b %Y") for row in rows if row["month"]]
-        values = [float(row["total"] or 0) for row in rows]
+        rows = [row for row in revenue_by_month(since) if row["month"]]
+        labels = [row["month"].strftime("%b %Y") for row in rows]
+        values = [float(row["value"] or 0) for row in rows]
         return labels, values
 
 
@@ -295,6 +304,7 @@ class InvoiceAmountByStatusDoughnutModule(BaseChartModule):
     chart_type = "doughnut"
     dataset_label = "Amount"
     subtitle = "Sum of invoice totals"
+    cache_models = (Invoice,)
 
     def build_chart_data(self, request=None, since=None):
         qs = Invoice.objects.all()
@@ -344,29 +354,9 @@ class KPIModule(modules.DashboardModule):
     col_width = 12
 
     def init_with_context(self, context):
-        from .models import EnrollmentRequest, Lead, Payment, Student
-
-        total_students = Student.objects.count()
-        
-        # Revenue this month
-        now = timezone.now()
-        start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        revenue_month = Payment.objects.filter(
-            status="completed", paid_at__gte=start_of_month
-        ).aggregate(total=Sum("amount"))["total"] or 0
-
-        # New leads this month
-        new_leads = Lead.objects.filter(created_at__gte=start_of_month).count()
-        
-        # Pending Enrollments
-        pending_enrollments = EnrollmentRequest.objects.filter(status="new").count()
-
-        self.kpis = [
-            {"label": "Total Students", "value": total_students, "trend": "", "trend_class": "neutral"},
-            {"label": "Revenue (Month)", "value": f"${revenue_month:,.0f}", "trend": "This Month", "trend_class": "positive"},
-            {"label": "New Leads", "value": new_leads, "trend": "This Month", "trend_class": "neutral"},
-            {"label": "Pending Enrollments", "value": pending_enrollments, "trend": "Action Required", "trend_class": "negative" if pending_enrollments > 0 else "neutral"},
-        ]
+        from .dashboard_data import get_dashboard_snapshot
+
+        self.kpis = get_dashboard_snapshot().get("kpis", [])
 
 
 class CustomIndexDashboard(Dashboard):
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.cache import cache
+
+CACHE_PREFIX = "crm:dashboard-widget"
+
+
+def _version_key(model):
+    return f"{CACHE_PREFIX}:version:{model._meta.label_lower}"
+
+
+def _widget_timeout():
+    return int(getattr(settings, "DASHBOARD_WIDGET_CACHE_SECONDS", 300))
+
+
+def bump_model_version(model):
+    key = _version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def widget_cache_key(module_cls, range_value, models):
+    version_keys = [_version_key(model) for model in models]
+    versions = cache.get_many(version_keys)
+    version_part = ".".join(str(versions.get(key, 0)) for key in version_keys)
+    return f"{CACHE_PREFIX}:{module_cls.__module__}.{module_cls.__name__}:{range_value or '-'}:{version_part}"
+
+
+def get_or_build(module_cls, range_value, models, builder):
+    key = widget_cache_key(module_cls, range_value, models)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    result = builder()
+    cache.set(key, result, _widget_timeout())
+    return result
@@ -3,17 +3,26 @@ from datetime import timedelta
 from urllib.parse import quote
 from django.conf import settings
 from django.db.models import Count, Sum
-from django.db.models.functions import TruncDay, TruncMonth
+from django.db.models.functions import TruncDay
 from django.urls import reverse
 from django.utils import timezone
-from .models import Enrollment, Invoice, Lead, Lesson, Payment, EnrollmentRequest, Student
+from .models import DashboardSnapshot, Enrollment, Invoice, Lead, Lesson, Payment, EnrollmentRequest, Student
+from .rollups import leads_by_month, revenue_by_month
 
-def get_dashboard_data():
+SNAPSHOT_KEY = "default"
+
+
+def _snapshot_max_age():
+    return timedelta(seconds=int(getattr(settings, "DASHBOARD_SNAPSHOT_MAX_AGE", 600)))
+
+
+def compute_dashboard_snapshot():
     data = {}
     
     # KPIs
     now = timezone.now()
     start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    pending_enrollments = EnrollmentRequest.objects.filter(status="new").count()
     
     data['kpis'] = [
         {
@@ -39,64 +48,15 @@ def get_dashboard_data():
         },
         {
             "label": "Pending Enrollments",
-            "value": EnrollmentRequest.objects.filter(status="new").count(),
+            "value": pending_enrollments,
             "trend": "Action Required",
-            "trend_class": "negative" if EnrollmentRequest.objects.filter(status="new").count() > 0 else "neutral",
+            "trend_class": "negative" if pending_enrollments > 0 else "neutral",
             "url": reverse("admin:crm_enrollmentrequest_changelist")
         },
     ]
 
     # Charts Helper
-    def prepare_chart(qs, label_field, value_field, count_field="id", limit=None, is_date=False, date_format="%b %Y"):
-        if is_date:
-            try:
-                rows = qs.annotate(key=label_field).values("key").annotate(value=value_field).order_by("key")
-                labels = []
-                values = []
-                for row in rows:
-                    key = row["key"]
-                    if key:
-                        labels.append(key.strftime(date_format))
-                        values.append(float(row["value"] or 0))
-                return json.dumps(labels), json.dumps(values)
-            except Exception:
-                date_expr = getattr(label_field, "source_expressions", None)
-                date_field = None
-                if date_expr and len(date_expr) > 0:
-                    date_field = getattr(date_expr[0], "name", None)
-                is_month = isinstance(label_field, TruncMonth)
-                items = list(qs.values_list(date_field))
-                bucket = {}
-                for it in items:
-                    dt = it[0]
-                    if not dt:
-                        continue
-                    dt_local = timezone.localtime(dt) if timezone.is_aware(dt) else dt
-                    if is_month:
-                        k = dt_local.replace(day=1, hour=0, minute=0, second=0, microsecond=0).date()
-                    else:
-                        k = dt_local.date()
-                    bucket[k] = bucket.get(k, 0) + 1 if isinstance(value_field, Count) else bucket.get(k, 0)
-                if isinstance(value_field, Sum):
-                    val_expr = getattr(value_field, "source_expressions", None)
-                    val_field = None
-                    if val_expr and len(val_expr) > 0:
-                        val_field = getattr(val_expr[0], "name", None)
-                    items = list(qs.values_list(date_field, val_field))
-                    bucket = {}
-                    for dt, amt in items:
-                        if not dt:
-                            continue
-                        dt_local = timezone.localtime(dt) if timezone.is_aware(dt) else dt
-                        if is_month:
-                            k = dt_local.replace(day=1, hour=0, minute=0, second=0, microsecond=0).date()
-                        else:
-                            k = dt_local.date()
-                        bucket[k] = bucket.get(k, 0) + float(amt or 0)
-                keys = sorted(bucket.keys())
-                labels = [k.strftime(date_format) for k in keys]
-                values = [float(bucket[k]) for k in keys]
-                return json.dumps(labels), json.dumps(values)
+    def prepare_chart(qs, label_field, value_field, count_field="id", limit=None):
         rows = qs.values(label_field).annotate(value=value_field).order_by(f"-value")
         if limit:
             rows = rows[:limit]
@@ -107,6 +67,13 @@ def get_dashboard_data():
             values.append(float(row["value"] or 0))
         return json.dumps(labels), json.dumps(values)
 
+    # Month charts read the daily rollup tables, so no Python bucketing fallback is needed
+    def prepare_month_chart(rows, date_format="%b %Y"):
+        rows = [row for row in rows if row["month"]]
+        labels = [row["month"].strftime(date_format) for row in rows]
+        values = [float(row["value"] or 0) for row in rows]
+        return {"labels": json.dumps(labels), "values": json.dumps(values)}
+
     # Lead Status (Doughnut)
     labels, values = prepare_chart(Lead.objects.all(), "status", Count("id"))
     data['lead_status'] = {"labels": labels, "values": values}
@@ -117,13 +84,7 @@ def get_dashboard_data():
 
     # Leads by Month (Line) - Last 12 Months
     one_year_ago = timezone.now() - timedelta(days=365)
-    labels, values = prepare_chart(
-        Lead.objects.filter(created_at__gte=one_year_ago), 
-        TruncMonth("created_at"), 
-        Count("id"), 
-        is_date=True
-    )
-    data['leads_by_month'] = {"labels": labels, "values": values}
+    data['leads_by_month'] = prepare_month_chart(leads_by_month(one_year_ago))
 
     # Lesson Status (Radar) - Custom logic for radar labels
     lesson_rows = Lesson.objects.values("status").annotate(count=Count("id"))
@@ -161,13 +122,7 @@ def get_dashboard_data():
     data['lessons_next_7_days'] = {"labels": json.dumps(next_7_labels), "values": json.dumps(next_7_values)}
 
     # Revenue by Month (Line) - Last 12 Months
-    labels, values = prepare_chart(
-        Payment.objects.filter(status="completed", paid_at__gte=one_year_ago), 
-        TruncMonth("paid_at"), 
-        Sum("amount"), 
-        is_date=True
-    )
-    data['revenue_by_month'] = {"labels": labels, "values": values}
+    data['revenue_by_month'] = prepare_month_chart(revenue_by_month(one_year_ago))
 
     # Invoice Amount by Status (Doughnut)
     labels, values = prepare_chart(Invoice.objects.all(), "status", Sum("total_amount"))
@@ -217,16 +172,41 @@ def get_dashboard_data():
         
     data['lead_flow_sankey'] = json.dumps(sankey_data)
 
+    return data
+
+
+def refresh_dashboard_snapshot():
+    data = compute_dashboard_snapshot()
+    snapshot, _ = DashboardSnapshot.objects.update_or_create(
+        key=SNAPSHOT_KEY,
+        defaults={"data": data, "computed_at": timezone.now()},
+    )
+    return snapshot
+
+
+def get_dashboard_snapshot():
+    snapshot = DashboardSnapshot.objects.filter(key=SNAPSHOT_KEY).first()
+    if not snapshot or snapshot.computed_at < timezone.now() - _snapshot_max_age():
+        # Scheduler is not running (or fell behind); rebuild once so the next renders are cheap again.
+        snapshot = refresh_dashboard_snapshot()
+    return dict(snapshot.data or {})
+
+
+def get_dashboard_data():
+    data = get_dashboard_snapshot()
+
     # Recent Leads (Table)
     data['recent_leads'] = Lead.objects.order_by("-created_at")[:5]
 
     # Upcoming Lessons (Table)
     data['upcoming_lessons'] = Lesson.objects.filter(
         start_time__gte=timezone.now(), status="scheduled"
-    ).order_by("start_time")[:5]
+    ).select_related("instructor__user").order_by("start_time")[:5]
 
     # Recent Payments (Table)
-    data['recent_payments'] = Payment.objects.filter(status="completed").order_by("-paid_at")[:5]
+    data['recent_payments'] = (
+        Payment.objects.filter(status="completed").select_related("invoice").order_by("-paid_at")[:5]
+    )
     
     embed_url = getattr(settings, "GOOGLE_CALENDAR_EMBED_URL", "") or ""
     calendar_id = getattr(settings, "GOOGLE_CALENDAR_ID", "") or ""
@@ -0,0 +1,508 @@
+import csv
+import gzip
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import rollups
+from .dashboard_cache import bump_model_version
+from .identity import IDENTITY_FIELDS
+from .journal import get_checkpoint, record_lessons_created, save_checkpoint
+from .models import Enrollment, Invoice, Lead, Lesson, LessonChange, Payment, Student
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional; Parquet files need pyarrow
+    pyarrow = None
+
+FORMATS = ("csv", "jsonl", "parquet")
+# Above this many days touched by one chunk the rollup tables are rebuilt instead of refreshed day by day.
+ROLLUP_REFRESH_DAY_LIMIT = 60
+
+
+@dataclass
+class Dataset:
+    """How one model maps to rows in a data file.
+
+    ``key`` is the column rows are matched on when importing (blank keys always insert). ``references`` maps
+    a column such as ``student__email`` to the foreign key it resolves; ``export_only`` columns are written
+    but ignored on import.
+    """
+
+    model: type
+    key: str
+    columns: tuple
+    references: dict = field(default_factory=dict)
+    export_only: tuple = ()
+
+    @property
+    def import_columns(self):
+        return [column for column in self.columns if column not in self.export_only]
+
+
+DATASETS = {
+    "leads": Dataset(
+        Lead,
+        key="email",
+        columns=("email", "first_name", "last_name", "phone", "source", "interest", "status", "notes", "created_at"),
+        export_only=("created_at",),
+    ),
+    "students": Dataset(
+        Student,
+        key="email",
+        columns=(
+            "email",
+            "first_name",
+            "middle_name",
+            "last_name",
+            "phone",
+            "address_line1",
+            "address_line2",
+            "city",
+            "province",
+            "postal_code",
+            "date_of_birth",
+            "license_number",
+            "license_issue_date",
+            "license_expiry_date",
+            "license_status",
+            "preferred_location",
+            "created_at",
+        ),
+        export_only=("created_at",),
+    ),
+    "enrollments": Dataset(
+        Enrollment,
+        key="id",
+        columns=(
+            "id",
+            "student__email",
+            "session_id",
+            "status",
+            "payment_plan_id",
+            "balance",
+            "completed_at",
+            "dropped_at",
+            "enrolled_at",
+        ),
+        references={"student__email": ("student", Student, "email")},
+        export_only=("enrolled_at",),
+    ),
+    "invoices": Dataset(
+        Invoice,
+        key="number",
+        columns=(
+            "number",
+            "enrollment_id",
+            "issue_date",
+            "due_date",
+            "total_amount",
+            "status",
+            "notes",
+            "stripe_payment_intent_id",
+            "stripe_checkout_session_id",
+            "stripe_customer_id",
+        ),
+    ),
+    "lessons": Dataset(
+        Lesson,
+        key="id",
+        columns=(
+            "id",
+            "student__email",
+            "instructor_id",
+            "vehicle_id",
+            "classroom_id",
+            "session_id",
+            "lesson_type",
+            "start_time",
+            "end_time",
+            "pickup_address",
+            "dropoff_address",
+            "status",
+            "notes",
+        ),
+        references={"student__email": ("student", Student, "email")},
+    ),
+    "payments": Dataset(
+        Payment,
+        key="id",
+        columns=(
+            "id",
+            "invoice__number",
+            "amount",
+            "paid_at",
+            "method",
+            "reference",
+            "status",
+            "stripe_payment_intent_id",
+        ),
+        references={"invoice__number": ("invoice", Invoice, "number")},
+    ),
+}
+
+
+def detect_format(path, fmt=None):
+    fmt = fmt or Path(path.removesuffix(".gz")).suffix.lstrip(".")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}; use one of {', '.join(FORMATS)}.")
+    if fmt == "parquet" and pyarrow is None:
+        raise ValueError("Parquet files need the pyarrow package.")
+    return fmt
+
+
+def _open_text(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def _text(value):
+    if value is None:
+        return None
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def checkpoint_name(kind, dataset_name, path):
+    digest = hashlib.md5(os.path.abspath(path).encode("utf-8")).hexdigest()[:16]
+    return f"{kind}:{dataset_name}:{digest}"
+
+
+# --- Export ---
+
+
+class _Writer:
+    def __init__(self, path, fmt, columns, append):
+        self.fmt = fmt
+        self.columns = columns
+        if fmt == "parquet":
+            self.handle = None
+            self.schema = None
+            self.path = path
+            return
+        self.handle = _open_text(path, "a" if append else "w")
+        if fmt == "csv":
+            self.csv = csv.writer(self.handle)
+            if not append:
+                self.csv.writerow(columns)
+
+    def write(self, rows):
+        if self.fmt == "csv":
+            self.csv.writerows([[_text(value) for value in row] for row in rows])
+        elif self.fmt == "jsonl":
+            self.handle.writelines(json.dumps(dict(zip(self.columns, map(_text, row)))) + "\n" for row in rows)
+        else:
+            table = pyarrow.Table.from_pylist([dict(zip(self.columns, map(_text, row))) for row in rows], self.schema)
+            if self.handle is None:
+                self.schema = table.schema
+                self.handle = pyarrow.parquet.ParquetWriter(self.path, self.schema)
+            self.handle.write_table(table)
+
+    def close(self):
+        if self.handle is not None:
+            self.handle.close()
+
+
+def export_dataset(dataset_name, path, fmt=None, chunk_size=5000, resume=False, progress=None):
+    """Write every row of a dataset to ``path``; returns the number of rows written.
+
+    Rows are read in primary-key batches (keyset, not OFFSET, and never the whole table at once), and the
+    last key written is checkpointed after each batch together with the file size at that point. ``resume``
+    truncates the file back to that size before appending, so a batch written after the last checkpoint is
+    not duplicated. Parquet and gzip files cannot be cut back like that and always start over.
+    """
+    dataset = DATASETS[dataset_name]
+    fmt = detect_format(path, fmt)
+    appendable = fmt != "parquet" and not path.endswith(".gz")
+    checkpoint = get_checkpoint(checkpoint_name("export", dataset_name, path))
+    size = get_checkpoint(checkpoint_name("export-size", dataset_name, path))
+    resume = resume and appendable and checkpoint.position > 0 and os.path.exists(path)
+    if resume:
+        os.truncate(path, size.position)
+    last_pk = checkpoint.position if resume else 0
+    writer = _Writer(path, fmt, list(dataset.columns), append=resume)
+    written = 0
+    queryset = dataset.model.objects.order_by("pk").values_list("pk", *dataset.columns)
+    try:
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+            if not batch:
+                break
+            writer.write([row[1:] for row in batch])
+            last_pk = batch[-1][0]
+            written += len(batch)
+            if appendable:
+                writer.handle.flush()
+                with transaction.atomic():
+                    save_checkpoint(checkpoint, last_pk)
+                    save_checkpoint(size, os.path.getsize(path))
+            if progress:
+                progress(written)
+    finally:
+        writer.close()
+    with transaction.atomic():
+        save_checkpoint(checkpoint, 0)
+        save_checkpoint(size, 0)
+    return written
+
+
+# --- Import ---
+
+
+def _read_rows(path, fmt, skip, chunk_size):
+    """Yield lists of row dicts, ``chunk_size`` at a time, after skipping the first ``skip`` rows."""
+    if fmt == "parquet":
+        parquet = pyarrow.parquet.ParquetFile(path)
+        for batch in parquet.iter_batches(batch_size=chunk_size):
+            rows = batch.to_pylist()
+            if skip >= len(rows):
+                skip -= len(rows)
+                continue
+            yield rows[skip:]
+            skip = 0
+        return
+    with _open_text(path, "r") as handle:
+        rows = csv.DictReader(handle) if fmt == "csv" else (json.loads(line) for line in handle if line.strip())
+        chunk = []
+        for index, row in enumerate(rows):
+            if index < skip:
+                continue
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+@dataclass
+class ImportResult:
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    errors: list = field(default_factory=list)
+
+
+class _ChunkImporter:
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.model = dataset.model
+        # get_field() also resolves attnames such as ``session_id`` to their foreign key.
+        self.fields = {
+            column: self.model._meta.get_field(dataset.references[column][0] if column in dataset.references else column)
+            for column in dataset.import_columns
+        }
+        self.auto_now = [f.attname for f in self.model._meta.concrete_fields if getattr(f, "auto_now", False)]
+        # Bulk writes skip save(), which is what normally derives the identity keys.
+        self.identity_keys = IDENTITY_FIELDS if hasattr(self.model, "refresh_identity_keys") else ()
+        self.touched_days = set()
+
+    def _convert(self, column, value):
+        model_field = self.fields[column]
+        if column in self.dataset.references:
+            value = str(value or "").strip()
+            if not value and not model_field.null:
+                raise ValidationError(f"{column} is required")
+            return value or None
+        if isinstance(value, str) and model_field.get_internal_type() not in ("CharField", "TextField", "EmailField"):
+            value = value.strip() or None
+        if value is None:
+            if model_field.null or model_field.primary_key:
+                return None
+            if model_field.get_internal_type() in ("CharField", "TextField", "EmailField"):
+                return ""
+            if model_field.has_default():
+                return model_field.get_default()
+            raise ValidationError(f"{column} is required")
+        target = model_field.target_field if model_field.is_relation else model_field
+        value = target.to_python(value)
+        if isinstance(value, datetime) and timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return value
+
+    def _lookup(self, model, name, values):
+        values = {value for value in values if value not in (None, "")}
+        found = {}
+        # The lowest id wins when a natural key is not unique.
+        for value, pk in model.objects.filter(**{f"{name}__in": values}).order_by("-pk").values_list(name, "pk"):
+            found[value] = pk
+        return found
+
+    def _existing(self, keys):
+        """Map each key already stored to ``(pk, {attname: current value})`` for the imported columns."""
+        keys = {key for key in keys if key not in (None, "")}
+        attnames = [f.attname for f in self.fields.values()]
+        found = {}
+        rows = self.model.objects.filter(**{f"{self.dataset.key}__in": keys}).order_by("-pk")
+        for key, pk, *values in rows.values_list(self.dataset.key, "pk", *attnames):
+            found[key] = (pk, dict(zip(attnames, values)))
+        return found
+
+    def run(self, rows, offset, result):
+        dataset = self.dataset
+        parsed = []
+        for index, row in enumerate(rows, start=offset + 1):
+            try:
+                parsed.append((index, {column: self._convert(column, row.get(column)) for column in self.fields}))
+            except ValidationError as exc:
+                result.errors.append(f"row {index}: {'; '.join(exc.messages)}")
+
+        references = {
+            column: self._lookup(model, name, [values[column] for _, values in parsed])
+            for column, (_, model, name) in dataset.references.items()
+        }
+        existing = self._existing([values[dataset.key] for _, values in parsed])
+
+        to_create, to_update, seen = [], {}, {}
+        now = timezone.now()
+        for index, values in parsed:
+            attributes = {}
+            missing = None
+            for column, value in values.items():
+                if column in references:
+                    relation = dataset.references[column][0]
+                    if value is not None and value not in references[column]:
+                        missing = f"row {index}: no {relation} with {column.split('__')[1]} {value!r}"
+                    attributes[f"{relation}_id"] = references[column].get(value)
+                else:
+                    attributes[self.fields[column].attname] = value
+            if missing:
+                result.errors.append(missing)
+                continue
+            key = values[dataset.key]
+            pk, current = existing.get(key, (None, None)) if key not in (None, "") else (None, None)
+            if current is not None and all(current[name] == value for name, value in attributes.items()):
+                # Re-importing an unchanged row costs no write.
+                result.unchanged += 1
+                continue
+            if pk is None and key not in (None, "") and key in seen:
+                # Repeated key inside one chunk: the later row wins.
+                for name, value in attributes.items():
+                    setattr(seen[key], name, value)
+                continue
+            obj = self.model(**attributes)
+            if self.identity_keys:
+                obj.refresh_identity_keys()
+            if pk is not None:
+                obj.pk = pk
+                for name in self.auto_now:
+                    setattr(obj, name, now)
+                to_update[pk] = obj
+                self.before_update(current)
+            else:
+                to_create.append(obj)
+                if key not in (None, ""):
+                    seen[key] = obj
+
+        created = self.model.objects.bulk_create(to_create, batch_size=500)
+        self._update(list(to_update.values()))
+        self.after_write(created, list(to_update.values()))
+        result.created += len(created)
+        result.updated += len(to_update)
+        result.rows += len(rows)
+
+    def _update(self, objs):
+        """One prepared UPDATE run with executemany; bulk_update's per-row CASE expressions cost far more."""
+        if not objs:
+            return
+        meta = self.model._meta
+        columns = [f for f in self.fields.values() if not f.primary_key]
+        columns += [meta.get_field(name) for name in (*self.auto_now, *self.identity_keys)]
+        quote = connection.ops.quote_name
+        assignments = ", ".join(f"{quote(f.column)} = %s" for f in columns)
+        sql = f"UPDATE {quote(meta.db_table)} SET {assignments} WHERE {quote(meta.pk.column)} = %s"
+        params = [[f.get_db_prep_save(getattr(obj, f.attname), connection) for f in columns] + [obj.pk] for obj in objs]
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+
+    def before_update(self, current):
+        # A payment moved to another day leaves a stale rollup on the old one.
+        if self.model is Payment:
+            self.touched_days.add(rollups._local_day(current["paid_at"]))
+
+    def after_write(self, created, updated):
+        """bulk_create/bulk_update send no signals, so keep the journal and rollups in step here."""
+        if self.model is Lesson:
+            record_lessons_created(created)
+            LessonChange.objects.bulk_create(
+                [LessonChange(lesson_id=lesson.pk, action="updated") for lesson in updated], batch_size=500
+            )
+        if self.model is Lead:
+            self.touched_days.update(rollups._local_day(lead.created_at or timezone.now()) for lead in created)
+            self.touched_days.update(
+                rollups._local_day(created_at)
+                for created_at in Lead.objects.filter(pk__in=[lead.pk for lead in updated]).values_list(
+                    "created_at", flat=True
+                )
+            )
+        if self.model is Payment:
+            self.touched_days.update(rollups._local_day(payment.paid_at) for payment in created + updated)
+
+
+def _refresh_rollup_days(model, days):
+    refresh = rollups.refresh_lead_day if model is Lead else rollups.refresh_payment_day
+    for day in sorted(day for day in days if day):
+        refresh(day)
+
+
+def _rebuild_rollups(model):
+    rollups.rebuild_lead_rollups() if model is Lead else rollups.rebuild_payment_rollups()
+
+
+def import_dataset(dataset_name, path, fmt=None, chunk_size=2000, resume=False, progress=None):
+    """Upsert a data file into a dataset's model; returns an :class:`ImportResult`.
+
+    Each chunk is matched on the dataset key with one query and written with ``bulk_create`` and one
+    ``executemany`` UPDATE in one transaction together with its checkpoint and the dashboard rollups for the
+    days it touched, so ``resume`` skips exactly the rows an interrupted run committed and leaves no stale day.
+    Rows that fail to parse or reference a missing record are reported and skipped.
+    """
+    dataset = DATASETS[dataset_name]
+    fmt = detect_format(path, fmt)
+    checkpoint = get_checkpoint(checkpoint_name("import", dataset_name, path))
+    # A chunk touching too many days defers to one full rebuild at the end. The pending rebuild is recorded
+    # in the chunk's transaction, so a resumed run still performs it.
+    has_rollups = dataset.model in (Lead, Payment)
+    rebuild = get_checkpoint(checkpoint_name("rollups", dataset_name, path)) if has_rollups else None
+    skip = checkpoint.position if resume else 0
+    importer = _ChunkImporter(dataset)
+    result = ImportResult()
+    offset = skip
+    for rows in _read_rows(path, fmt, skip, chunk_size):
+        # The checkpoint commits with the chunk, so a resumed run neither repeats nor loses rows.
+        with transaction.atomic():
+            importer.run(rows, offset, result)
+            offset += len(rows)
+            save_checkpoint(checkpoint, offset)
+            if has_rollups:
+                days = {day for day in importer.touched_days if day}
+                importer.touched_days.clear()
+                if rebuild.position or len(days) > ROLLUP_REFRESH_DAY_LIMIT:
+                    if not rebuild.position:
+                        save_checkpoint(rebuild, 1)
+                else:
+                    _refresh_rollup_days(dataset.model, days)
+        if progress:
+            progress(offset, result)
+    if has_rollups and rebuild.position:
+        with transaction.atomic():
+            _rebuild_rollups(dataset.model)
+            save_checkpoint(rebuild, 0)
+    if result.created or result.updated:
+        bump_model_version(dataset.model)
+    save_checkpoint(checkpoint, 0)
+    return result
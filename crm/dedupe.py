@@ -0,0 +1,186 @@
+from django.db import transaction
+from django.db.models import Case, OuterRef, Q, Subquery, Value, When
+
+from .identity import normalize_email, normalize_phone
+from .models import CommunicationLog, EnrollmentRequest, Lead, LeadNote, LeadTask, ScheduledEmail, Student
+
+# How far along the funnel each status is; merging keeps the furthest one. Closed leads reopen on a new enquiry.
+STATUS_RANK = {"closed": -1, "new": 0, "contacted": 1, "qualified": 2, "converted": 3}
+FILLABLE_FIELDS = ("first_name", "last_name", "email", "phone", "source", "interest")
+
+
+def find_student(email="", phone="", user=None):
+    """The student a form submission belongs to: the logged-in user's, else the oldest with the same email."""
+    if user is not None and user.is_authenticated:
+        student = Student.objects.filter(user=user).first()
+        if student:
+            return student
+    email_key = normalize_email(email)
+    if email_key:
+        return Student.objects.filter(email_key=email_key).order_by("pk").first()
+    return None
+
+
+def find_lead(email="", phone="", first_name=""):
+    """The oldest lead with the same email, or failing that the same phone number and first name.
+
+    A phone number alone is not trusted because households share one.
+    """
+    email_key = normalize_email(email)
+    phone_key = normalize_phone(phone) if first_name else ""
+    match = Q()
+    if email_key:
+        match |= Q(email_key=email_key)
+    if phone_key:
+        match |= Q(phone_key=phone_key, first_name__iexact=first_name)
+    if not match:
+        return None
+    # One round-trip for both keys; an email match outranks a phone match.
+    email_first = Case(When(email_key=email_key, then=Value(0)), default=Value(1)) if email_key else Value(0)
+    return Lead.objects.filter(match).order_by(email_first, "pk").first()
+
+
+def capture_lead(first_name, last_name="", email="", phone="", source="", interest="", notes="", student=None):
+    """Return ``(lead, created)`` for a form submission, reusing the person's existing lead when there is one.
+
+    An existing lead gets its blank fields filled in and the new enquiry recorded as a note instead of a
+    second Lead row.
+    """
+    lead = find_lead(email, phone, first_name)
+    if lead is None:
+        lead = Lead.objects.create(
+            first_name=first_name,
+            last_name=last_name,
+            email=email,
+            phone=phone,
+            status="new",
+            source=source,
+            interest=interest,
+            notes=notes,
+            student=student,
+        )
+        return lead, True
+
+    submitted = {
+        "first_name": first_name,
+        "last_name": last_name,
+        "email": email,
+        "phone": phone,
+        "source": source,
+        "interest": interest,
+    }
+    changed = [name for name, value in submitted.items() if value and not getattr(lead, name)]
+    for name in changed:
+        setattr(lead, name, submitted[name])
+    if student is not None and not lead.student_id:
+        lead.student = student
+        changed.append("student")
+    if lead.status == "closed":
+        lead.status = "new"
+        changed.append("status")
+    if changed:
+        lead.save(update_fields=[*changed, "updated_at"])
+
+    note = "\n".join(
+        part
+        for part in (
+            f"New enquiry{f' via {source}' if source else ''}: {interest}" if interest else "",
+            notes,
+        )
+        if part
+    )
+    if note:
+        LeadNote.objects.create(lead=lead, note=note)
+    return lead, False
+
+
+def _lead_clusters():
+    """Groups of lead ids that belong to one person, found with a union-find over the identity keys."""
+    parent = {}
+
+    def find(item):
+        root = item
+        while parent[root] != root:
+            root = parent[root]
+        while parent[item] != root:
+            parent[item], item = root, parent[item]
+        return root
+
+    first_seen = {}
+    rows = Lead.objects.order_by("pk").values_list("pk", "email_key", "phone_key", "first_name")
+    for pk, email_key, phone_key, first_name in rows.iterator(chunk_size=5000):
+        parent[pk] = pk
+        keys = []
+        if email_key:
+            keys.append(("email", email_key))
+        if phone_key and first_name:
+            keys.append(("phone", phone_key, first_name.strip().lower()))
+        for key in keys:
+            other = first_seen.setdefault(key, pk)
+            if other != pk:
+                parent[find(pk)] = find(other)
+
+    clusters = {}
+    for pk in parent:
+        clusters.setdefault(find(pk), []).append(pk)
+    return [sorted(members) for members in clusters.values() if len(members) > 1]
+
+
+def merge_leads(primary, duplicates):
+    """Fold ``duplicates`` into ``primary``: move their notes, tasks, messages and requests, then delete them."""
+    duplicate_ids = [lead.pk for lead in duplicates]
+    with transaction.atomic():
+        LeadNote.objects.filter(lead_id__in=duplicate_ids).update(lead=primary)
+        LeadTask.objects.filter(lead_id__in=duplicate_ids).update(lead=primary)
+        CommunicationLog.objects.filter(to_lead_id__in=duplicate_ids).update(to_lead=primary)
+        ScheduledEmail.objects.filter(to_lead_id__in=duplicate_ids).update(to_lead=primary)
+        EnrollmentRequest.objects.filter(lead_id__in=duplicate_ids).update(lead=primary)
+
+        notes = []
+        for duplicate in duplicates:
+            for name in FILLABLE_FIELDS:
+                if not getattr(primary, name) and getattr(duplicate, name):
+                    setattr(primary, name, getattr(duplicate, name))
+            if not primary.assigned_to_id and duplicate.assigned_to_id:
+                primary.assigned_to_id = duplicate.assigned_to_id
+            if not primary.student_id and duplicate.student_id:
+                primary.student_id = duplicate.student_id
+            if STATUS_RANK.get(duplicate.status, 0) > STATUS_RANK.get(primary.status, 0):
+                primary.status = duplicate.status
+            if duplicate.notes:
+                notes.append(LeadNote(lead=primary, note=f"Merged from lead #{duplicate.pk}: {duplicate.notes}"))
+        LeadNote.objects.bulk_create(notes)
+        primary.save()
+        Lead.objects.filter(pk__in=duplicate_ids).delete()
+
+
+def link_identities():
+    """Point leads at their student and enrollment requests at their lead by email; returns rows linked."""
+    student = Student.objects.filter(email_key=OuterRef("email_key")).order_by("pk").values("pk")[:1]
+    leads = (
+        Lead.objects.filter(student__isnull=True)
+        .exclude(email_key="")
+        .filter(email_key__in=Student.objects.exclude(email_key="").values("email_key"))
+        .update(student=Subquery(student))
+    )
+    lead = Lead.objects.filter(email_key=OuterRef("email_key")).order_by("pk").values("pk")[:1]
+    requests = (
+        EnrollmentRequest.objects.filter(lead__isnull=True)
+        .exclude(email_key="")
+        .filter(email_key__in=Lead.objects.exclude(email_key="").values("email_key"))
+        .update(lead=Subquery(lead))
+    )
+    return leads + requests
+
+
+def dedupe_leads(dry_run=False):
+    """Merge every cluster of duplicate leads into its oldest member; returns ``(clusters, leads_removed)``."""
+    clusters = _lead_clusters()
+    removed = sum(len(cluster) - 1 for cluster in clusters)
+    if dry_run:
+        return clusters, removed
+    for cluster in clusters:
+        leads = list(Lead.objects.filter(pk__in=cluster).order_by("pk"))
+        if len(leads) > 1:
+            merge_leads(leads[0], leads[1:])
+    return clusters, removed
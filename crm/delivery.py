@@ -0,0 +1,353 @@
+import hashlib
+import json
+import logging
+import os
+import select
+import socket
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import timedelta
+from urllib import request as urlrequest
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection, send_mail
+from django.db import close_old_connections, connection as db_connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import CommunicationLog, ScheduledEmail
+
+logger = logging.getLogger(__name__)
+
+
+def email_dedupe_key(recipient_email, subject, body):
+    """Hash identifying one message, so "was this already sent?" is an indexed lookup, not a body comparison."""
+    digest = hashlib.sha256()
+    for part in (recipient_email.strip().lower(), subject, body):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _dispatcher_address():
+    host, _, port = getattr(settings, "EMAIL_DISPATCHER_ADDRESS", "").rpartition(":")
+    return (host, int(port)) if host and port.isdigit() else None
+
+
+def notify_dispatcher():
+    """Wake the email dispatcher with a UDP datagram; a dispatcher that is not running just polls later."""
+    address = _dispatcher_address()
+    if address is None:
+        return
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.sendto(b"1", address)
+    except OSError:
+        pass
+
+
+def queue_email(*, recipient_email, subject, body, to_lead=None, to_student=None, dedupe=False):
+    """Record a ScheduledEmail and try to send it right away; failures stay queued for the delivery job.
+
+    The row is created already claimed (``sending`` under this process's lease), so the delivery job cannot
+    pick it up while SMTP is still running here. Inside a transaction the send waits for the commit, so SMTP
+    never holds it open and a rolled-back caller sends nothing. In ``EMAIL_OUTBOX_MODE`` nothing is sent
+    here: the dispatcher is woken once the row commits, so the request never waits on SMTP. With ``dedupe``
+    nothing is queued when the same message to the same recipient already exists. Returns the number of
+    messages sent.
+    """
+    if not recipient_email:
+        return 0
+    dedupe_key = email_dedupe_key(recipient_email, subject, body)
+    if dedupe and ScheduledEmail.objects.filter(dedupe_key=dedupe_key).exclude(status="cancelled").exists():
+        return 0
+    now = timezone.now()
+    outbox = getattr(settings, "EMAIL_OUTBOX_MODE", False)
+    claim = {}
+    if not outbox:
+        lease_seconds = int(getattr(settings, "EMAIL_DELIVERY_LEASE_SECONDS", 300))
+        claim = {
+            "claimed_by": default_worker_id()[:120],
+            "claim_token": uuid.uuid4().hex,
+            "lease_expires_at": now + timedelta(seconds=lease_seconds),
+        }
+    scheduled = ScheduledEmail.objects.create(
+        recipient_email=recipient_email,
+        subject=subject,
+        body=body,
+        scheduled_for=now,
+        channel="email",
+        to_lead=to_lead,
+        to_student=to_student,
+        status="scheduled" if outbox else "sending",
+        dedupe_key=dedupe_key,
+        **claim,
+    )
+    if outbox:
+        transaction.on_commit(notify_dispatcher)
+        return 0
+    if db_connection.in_atomic_block:
+        transaction.on_commit(lambda: _send_claimed(scheduled))
+        return 0
+    return _send_claimed(scheduled)
+
+
+def _send_claimed(scheduled):
+    """Send a row :func:`queue_email` claimed; status writes only apply while the claim is still ours."""
+    claimed = ScheduledEmail.objects.filter(pk=scheduled.pk, status="sending", claim_token=scheduled.claim_token)
+    released = {"claim_token": "", "lease_expires_at": None}
+    try:
+        html_message = scheduled.body if scheduled.body.strip().startswith("<") else None
+        send_mail(
+            scheduled.subject,
+            scheduled.body if not html_message else "",
+            getattr(settings, "DEFAULT_FROM_EMAIL", None),
+            [scheduled.recipient_email],
+            fail_silently=False,
+            html_message=html_message,
+        )
+    except Exception as exc:
+        claimed.update(status="scheduled", last_error=str(exc), **released)
+        logger.exception("Email send failed (queued for retry): %s", scheduled.subject)
+        return 0
+    claimed.update(status="sent", sent_at=timezone.now(), last_error="", **released)
+    return 1
+
+
+def _send_sms(recipient_phone, message):
+    webhook = getattr(settings, "SMS_WEBHOOK_URL", "")
+    if not webhook:
+        raise ValueError("SMS webhook is not configured")
+    payload = json.dumps({"to": recipient_phone, "message": message}).encode("utf-8")
+    req = urlrequest.Request(webhook, data=payload, headers={"Content-Type": "application/json"})
+    token = getattr(settings, "SMS_WEBHOOK_TOKEN", "")
+    if token:
+        req.add_header("Authorization", f"Bearer {token}")
+    with urlrequest.urlopen(req, timeout=30) as response:
+        response.read()
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _claimable(now):
+    """Rows waiting to be sent, plus rows left in ``sending`` by a worker whose lease has run out."""
+    return Q(status="scheduled") | Q(status="sending", lease_expires_at__lt=now)
+
+
+def claim_due_emails(now, limit, worker_id=None, lease_seconds=None):
+    """Atomically move up to ``limit`` due rows to ``sending`` under a fresh claim token.
+
+    Rows still marked ``sending`` after their lease expired (a worker died mid-batch) are claimable again.
+    """
+    lease_seconds = int(lease_seconds or getattr(settings, "EMAIL_DELIVERY_LEASE_SECONDS", 300))
+    claim_now = timezone.now()
+    claimable = _claimable(claim_now)
+    token = uuid.uuid4().hex
+    skip_locked = db_connection.features.has_select_for_update_skip_locked
+    # Without SKIP LOCKED (SQLite) a read-then-write transaction only adds lock contention; the conditional
+    # UPDATE below is what guarantees each row is claimed by a single worker.
+    with transaction.atomic() if skip_locked else nullcontext():
+        candidates = ScheduledEmail.objects.filter(claimable, scheduled_for__lte=now).order_by("pk")
+        if skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        candidate_ids = list(candidates.values_list("pk", flat=True)[:limit])
+        if not candidate_ids:
+            return []
+        ScheduledEmail.objects.filter(claimable, pk__in=candidate_ids).update(
+            status="sending",
+            claimed_by=(worker_id or default_worker_id())[:120],
+            claim_token=token,
+            lease_expires_at=claim_now + timedelta(seconds=lease_seconds),
+        )
+    return list(
+        ScheduledEmail.objects.filter(claim_token=token, status="sending")
+        .select_related("template", "to_lead", "to_student")
+        .order_by("pk")
+    )
+
+
+def _build_job(scheduled):
+    subject = scheduled.subject
+    body = scheduled.body
+    if scheduled.template:
+        subject = scheduled.template.subject or subject
+        body = scheduled.template.body or body
+
+    if scheduled.channel == "sms":
+        recipient = scheduled.recipient_phone
+        if not recipient and scheduled.to_student:
+            recipient = scheduled.to_student.phone
+        return {"pk": scheduled.pk, "channel": "sms", "recipient": recipient, "subject": subject, "body": body}
+
+    recipient = scheduled.recipient_email
+    if not recipient and scheduled.to_lead:
+        recipient = scheduled.to_lead.email
+    if not recipient and scheduled.to_student:
+        recipient = scheduled.to_student.email
+    return {"pk": scheduled.pk, "channel": "email", "recipient": recipient, "subject": subject, "body": body}
+
+
+def _build_message(job, connection):
+    body = job["body"]
+    html_message = body if body.strip().startswith("<") else None
+    message = EmailMultiAlternatives(
+        job["subject"],
+        body if not html_message else "",
+        getattr(settings, "DEFAULT_FROM_EMAIL", None),
+        [job["recipient"]],
+        connection=connection,
+    )
+    if html_message:
+        message.attach_alternative(html_message, "text/html")
+    return message
+
+
+def _send_chunk(jobs):
+    """Send one chunk over a single SMTP connection; runs in a worker thread and never touches the ORM."""
+    results = []
+    connection = None
+    try:
+        for job in jobs:
+            try:
+                if not job["recipient"]:
+                    raise ValueError("Missing recipient phone" if job["channel"] == "sms" else "Missing recipient email")
+                if job["channel"] == "sms":
+                    _send_sms(job["recipient"], job["body"])
+                else:
+                    if connection is None:
+                        connection = get_connection(fail_silently=False)
+                        connection.open()
+                    _build_message(job, connection).send()
+                results.append((job, timezone.now(), ""))
+            except Exception as exc:
+                if connection is not None and job["channel"] == "email":
+                    # The SMTP session may be unusable after an error; reopen for the next message.
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+                    connection = None
+                results.append((job, None, str(exc)))
+    finally:
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass
+    return results
+
+
+def deliver_scheduled_emails(now=None, workers=None, batch_size=None, worker_id=None):
+    """Send every due ScheduledEmail using pooled connections and bulk status writes.
+
+    Rows are claimed in pages before sending, so several processes or hosts can drain the queue concurrently.
+    A failed send is rescheduled with exponential backoff until ``EMAIL_DELIVERY_MAX_ATTEMPTS``.
+    Returns a ``(sent, failed)`` tuple.
+    """
+    now = now or timezone.now()
+    workers = max(1, int(workers or getattr(settings, "EMAIL_DELIVERY_WORKERS", 4)))
+    batch_size = max(1, int(batch_size or getattr(settings, "EMAIL_DELIVERY_BATCH_SIZE", 50)))
+    page_size = workers * batch_size
+    worker_id = worker_id or default_worker_id()
+    max_attempts = int(getattr(settings, "EMAIL_DELIVERY_MAX_ATTEMPTS", 5))
+    retry_seconds = int(getattr(settings, "EMAIL_DELIVERY_RETRY_SECONDS", 60))
+    sent = failed = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            page = claim_due_emails(now, page_size, worker_id=worker_id)
+            if not page:
+                break
+            token = page[0].claim_token
+            by_pk = {scheduled.pk: scheduled for scheduled in page}
+            jobs = [_build_job(scheduled) for scheduled in page]
+            chunks = [jobs[i : i + batch_size] for i in range(0, len(jobs), batch_size)]
+
+            updates = []
+            logs = []
+            for results in executor.map(_send_chunk, chunks):
+                for job, sent_at, error in results:
+                    scheduled = by_pk[job["pk"]]
+                    scheduled.attempts += 1
+                    scheduled.claim_token = ""
+                    scheduled.lease_expires_at = None
+                    if error:
+                        # Transient SMTP outages are retried with backoff, so outbox mail survives a down host.
+                        if scheduled.attempts < max_attempts:
+                            scheduled.status = "scheduled"
+                            scheduled.scheduled_for = timezone.now() + timedelta(
+                                seconds=retry_seconds * 2 ** (scheduled.attempts - 1)
+                            )
+                        else:
+                            scheduled.status = "failed"
+                        scheduled.last_error = error
+                        failed += 1
+                    else:
+                        scheduled.status = "sent"
+                        scheduled.sent_at = sent_at
+                        scheduled.last_error = ""
+                        sent += 1
+                        logs.append(
+                            CommunicationLog(
+                                template=scheduled.template,
+                                to_lead=scheduled.to_lead,
+                                to_student=scheduled.to_student,
+                                recipient_email=job["recipient"] if job["channel"] == "email" else "",
+                                recipient_phone=job["recipient"] if job["channel"] == "sms" else "",
+                                status="sent",
+                                sent_at=sent_at,
+                            )
+                        )
+                    updates.append(scheduled)
+
+            with transaction.atomic():
+                # bulk_update keeps the queryset's filters, so a row whose lease ran out and was claimed by
+                # another worker is left to that worker instead of being overwritten.
+                ScheduledEmail.objects.filter(claim_token=token).bulk_update(
+                    updates,
+                    ["status", "sent_at", "last_error", "attempts", "claim_token", "lease_expires_at", "scheduled_for"],
+                    batch_size=500,
+                )
+                CommunicationLog.objects.bulk_create(logs, batch_size=500)
+    return sent, failed
+
+
+def run_dispatcher(poll_seconds=None, iterations=None):
+    """Send queued emails as they arrive: wake on a :func:`notify_dispatcher` datagram or every ``poll_seconds``.
+
+    Each wake-up costs one indexed EXISTS query when the outbox is empty.
+    """
+    poll_seconds = float(poll_seconds or getattr(settings, "EMAIL_DISPATCHER_POLL_SECONDS", 1))
+    address = _dispatcher_address()
+    sock = None
+    if address is not None:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(address)
+        sock.setblocking(False)
+    try:
+        while iterations is None or iterations > 0:
+            close_old_connections()
+            now = timezone.now()
+            if ScheduledEmail.objects.filter(_claimable(now), scheduled_for__lte=now).exists():
+                sent, failed = deliver_scheduled_emails(now=now)
+                if failed:
+                    logger.warning("Email dispatcher: %s sent, %s failed", sent, failed)
+            if iterations is not None:
+                iterations -= 1
+            if sock is None:
+                time.sleep(poll_seconds)
+                continue
+            if select.select([sock], [], [], poll_seconds)[0]:
+                # One pass covers every message queued so far, so collapse a burst of wake-ups.
+                try:
+                    while sock.recv(64):
+                        pass
+                except BlockingIOError:
+                    pass
+    finally:
+        if sock is not None:
+            sock.close()
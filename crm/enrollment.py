@@ -0,0 +1,177 @@
+from django.db import IntegrityError, OperationalError, transaction
+from django.db.models import F
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from .dedupe import capture_lead, find_student
+from .models import CourseSession, Enrollment, EnrollmentRequest, Invoice, InvoiceSequence, Student
+from .pricing import course_pricing
+
+
+# Attempts at a whole enrollment that deadlocked or collided with a hand-entered invoice number.
+ENROLLMENT_RETRIES = 3
+MYSQL_DEADLOCK = 1213
+POSTGRES_DEADLOCK = "40P01"
+
+# Days whose counter row this process has already seen; rows are never deleted.
+_sequence_days = set()
+
+
+def _invoice_prefix(day):
+    return f"INV-{day:%Y%m%d}-"
+
+
+def _seed_sequence(day):
+    """Start a day's counter above any number already issued for it, e.g. by the old random scheme."""
+    prefix = _invoice_prefix(day)
+    # Zero-padded suffixes of equal length sort like numbers; longer ones are larger.
+    last = (
+        Invoice.objects.filter(number__startswith=prefix)
+        .annotate(length=Length("number"))
+        .order_by("-length", "-number")
+        .values_list("number", flat=True)
+        .first()
+    )
+    suffix = last[len(prefix):] if last else ""
+    return int(suffix) if suffix.isdigit() else 0
+
+
+def ensure_invoice_sequence(day):
+    """Create the day's counter row in its own short transaction, before any enrollment holds locks.
+
+    Racing first-of-day inserts inside the enrollment transaction deadlock on InnoDB gap locks; out here a
+    loser only gets an IntegrityError for the row the winner created.
+    """
+    if day in _sequence_days:
+        return
+    seed = _seed_sequence(day)
+    try:
+        # A plain INSERT, not get_or_create: a read before the write is what SQLite cannot upgrade under load.
+        with transaction.atomic():
+            InvoiceSequence.objects.create(day=day, last_number=seed)
+    except IntegrityError:
+        pass
+    _sequence_days.add(day)
+
+
+def reseed_invoice_sequence(day):
+    """Move the day's counter past a number issued outside it, e.g. typed into the admin by hand."""
+    seed = _seed_sequence(day)
+    InvoiceSequence.objects.filter(day=day, last_number__lt=seed).update(last_number=seed)
+
+
+def allocate_invoice_number(day=None):
+    """Next ``INV-YYYYMMDD-NNNN`` number from the day's counter; must run inside a transaction.
+
+    The UPDATE locks the counter row until the caller commits, so concurrent enrollments get consecutive
+    numbers without probing for collisions, and a rolled-back enrollment gives its number back. Call
+    :func:`ensure_invoice_sequence` before opening the transaction; creating the row in here is only a
+    fallback.
+    """
+    day = day or timezone.localdate()
+    while True:
+        if InvoiceSequence.objects.filter(day=day).update(last_number=F("last_number") + 1):
+            number = InvoiceSequence.objects.filter(day=day).values_list("last_number", flat=True).get()
+            return f"{_invoice_prefix(day)}{number:04d}"
+        _sequence_days.discard(day)
+        ensure_invoice_sequence(day)
+
+
+def _is_deadlock(exc):
+    cause = exc.__cause__
+    if getattr(cause, "pgcode", None) == POSTGRES_DEADLOCK or getattr(cause, "sqlstate", None) == POSTGRES_DEADLOCK:
+        return True
+    return bool(exc.args) and exc.args[0] == MYSQL_DEADLOCK
+
+
+def course_total_with_hst(course):
+    if course.fees_display:
+        return course.total_with_hst
+    return course_pricing(course.price, course.fees)[1]
+
+
+def enroll_student(course, details, user=None, day=None):
+    """Create the student, lead, enrollment request, enrollment and draft invoice for a web enrollment.
+
+    Everything commits together or not at all. The invoice number is allocated first: on SQLite that makes
+    the first statement a write, so concurrent enrollments queue for the write lock instead of failing to
+    upgrade a read lock. An enrollment the database aborts as a deadlock victim, or whose invoice number
+    was already taken by one entered by hand, is run again from the start (after moving the counter past
+    the taken number), unless the caller's own transaction is open. Emails are left to the caller so SMTP never runs
+    inside the transaction. ``day`` is the issue date, today by default. Returns ``(student, invoice)``.
+    """
+    today = day or timezone.localdate()
+    ensure_invoice_sequence(today)
+    retry = not transaction.get_connection().in_atomic_block
+    for attempt in range(1, ENROLLMENT_RETRIES + 1):
+        try:
+            return _enroll(course, details, user, today)
+        except IntegrityError:
+            if not (retry and attempt < ENROLLMENT_RETRIES):
+                raise
+            reseed_invoice_sequence(today)
+        except OperationalError as exc:
+            if not (retry and attempt < ENROLLMENT_RETRIES and _is_deadlock(exc)):
+                raise
+
+
+def _enroll(course, details, user, today):
+    first_name = details.get("first_name", "")
+    last_name = details.get("last_name", "")
+    email = details.get("email", "")
+    phone = details.get("phone", "")
+    city = details.get("city", "")
+    province = details.get("province", "")
+    notes = details.get("notes", "")
+
+    with transaction.atomic():
+        invoice_number = allocate_invoice_number(today)
+        student = find_student(email, phone, user=user)
+        if not student:
+            student = Student.objects.create(
+                first_name=first_name,
+                last_name=last_name,
+                email=email,
+                phone=phone,
+                address_line1=details.get("address", ""),
+                city=city,
+                province=province,
+                postal_code=details.get("postal_code", ""),
+            )
+        lead, _ = capture_lead(
+            first_name=first_name,
+            last_name=last_name,
+            email=email,
+            phone=phone,
+            interest=course.title,
+            notes=notes,
+            student=student,
+        )
+        EnrollmentRequest.objects.create(
+            name=f"{first_name} {last_name}",
+            email=email,
+            phone=phone,
+            package=course.enroll_package or course.title,
+            preferred_location=f"{city}, {province}",
+            notes=notes,
+            lead=lead,
+        )
+        # Web enrollments attach to the course's open session, or a placeholder until staff schedule one.
+        session = CourseSession.objects.filter(course=course, enrollment_open=True).first()
+        if not session:
+            session = CourseSession.objects.create(
+                course=course,
+                start_date=today,
+                location="Online/TBD",
+                delivery_mode="online" if "online" in (course.session or "").lower() else "in_class",
+            )
+        enrollment = Enrollment.objects.create(student=student, session=session, status="pending")
+        invoice = Invoice.objects.create(
+            enrollment=enrollment,
+            number=invoice_number,
+            issue_date=today,
+            total_amount=course_total_with_hst(course),
+            status="draft",
+            notes=f"Enrollment for {course.title}",
+        )
+    return student, invoice
@@ -0,0 +1,223 @@
+import csv
+import logging
+import re
+import time
+import uuid
+import zlib
+from datetime import timedelta
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib import admin
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import ExportJob, Notification
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FILENAME = re.compile(r"^[a-z0-9_]+-\d{14}-[0-9a-f]{32}\.csv(\.gz)?$")
+
+
+class _Echo:
+    """File-like object whose ``write`` hands the line back, so csv.writer can feed a generator."""
+
+    def write(self, value):
+        return value
+
+
+def _related_paths(model):
+    """``select_related`` paths that load each foreign key of ``model`` plus whatever its ``__str__`` follows.
+
+    The deeper relations are taken from the related model's admin ``list_select_related``, which already
+    declares what rendering that model as text needs.
+    """
+    paths = []
+    for field in model._meta.fields:
+        if not field.is_relation:
+            continue
+        paths.append(field.name)
+        related_admin = admin.site._registry.get(field.related_model)
+        declared = getattr(related_admin, "list_select_related", ())
+        if isinstance(declared, (list, tuple)):
+            paths.extend(f"{field.name}__{path}" for path in declared)
+    return paths
+
+
+def csv_rows(queryset):
+    """Yield the header and one row per object: every concrete field, foreign keys rendered as text."""
+    model = queryset.model
+    field_names = [field.name for field in model._meta.fields]
+    yield field_names
+    chunk_size = int(getattr(settings, "EXPORT_CHUNK_SIZE", 2000))
+    rows = queryset.select_related(*_related_paths(model)).order_by("pk")
+    for obj in rows.iterator(chunk_size=chunk_size):
+        yield [getattr(obj, name) for name in field_names]
+
+
+def csv_chunks(queryset, batch_rows=500):
+    """Encode ``csv_rows`` into UTF-8 byte chunks of ``batch_rows`` lines each."""
+    writer = csv.writer(_Echo())
+    lines = []
+    for row in csv_rows(queryset):
+        lines.append(writer.writerow(row))
+        if len(lines) >= batch_rows:
+            yield "".join(lines).encode("utf-8")
+            lines = []
+    if lines:
+        yield "".join(lines).encode("utf-8")
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def csv_response(queryset, compress=False):
+    meta = queryset.model._meta
+    chunks = csv_chunks(queryset)
+    filename = f"{meta.model_name}.csv"
+    if compress:
+        chunks = gzip_chunks(chunks)
+        filename += ".gz"
+    response = StreamingHttpResponse(chunks, content_type="application/gzip" if compress else "text/csv")
+    response["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
+
+
+def export_directory():
+    return Path(getattr(settings, "EXPORT_ROOT", Path(settings.BASE_DIR) / "private" / "exports"))
+
+
+def export_path(filename):
+    """Path of a finished export, or ``None`` when ``filename`` is not one (including any path traversal)."""
+    if not EXPORT_FILENAME.match(filename):
+        return None
+    path = export_directory() / filename
+    return path if path.is_file() else None
+
+
+def _notify(job, meta):
+    if job.status == "done":
+        notification = Notification.objects.create(
+            title=f"{meta.verbose_name_plural.capitalize()} export is ready",
+            body=job.filename,
+            level="success",
+            link_url=reverse("export_download", args=[job.filename]),
+            audience="selected",
+            created_by=job.requested_by,
+        )
+    else:
+        notification = Notification.objects.create(
+            title=f"{meta.verbose_name_plural.capitalize()} export failed",
+            body=job.error,
+            level="error",
+            audience="selected",
+            created_by=job.requested_by,
+        )
+    if job.requested_by_id:
+        notification.recipients.add(job.requested_by_id)
+    notification.sync_receipts()
+    return notification
+
+
+def run_export_job(job):
+    """Write a claimed job's CSV under EXPORT_ROOT, record how it ended and notify whoever asked for it.
+
+    EXPORT_ROOT is outside MEDIA_ROOT, so the file holding student and lead contact details is never
+    served publicly; :func:`prune_exports` deletes it after EXPORT_RETENTION_HOURS.
+    """
+    model = apps.get_model(job.model_label)
+    meta = model._meta
+    path = export_directory() / job.filename
+    path.parent.mkdir(parents=True, exist_ok=True)
+    chunks = csv_chunks(model._default_manager.filter(pk__in=job.object_ids))
+    if job.compress:
+        chunks = gzip_chunks(chunks)
+    try:
+        with open(path, "wb") as handle:
+            for chunk in chunks:
+                handle.write(chunk)
+    except Exception as exc:
+        logger.exception("CSV export of %s failed", meta.label)
+        path.unlink(missing_ok=True)
+        job.status = "failed"
+        job.error = str(exc)
+    else:
+        job.status = "done"
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "error", "finished_at"])
+    return _notify(job, meta)
+
+
+def process_export_jobs(now=None, limit=10):
+    """Run pending export jobs; returns ``(done, failed)``.
+
+    A job is claimed with a conditional UPDATE, so overlapping runners never write the same file. A job still
+    ``running`` after EXPORT_JOB_TIMEOUT_SECONDS belonged to a process that died; it is marked failed, its
+    partial file removed and its requester told, instead of staying "running" forever.
+    """
+    now = now or timezone.now()
+    timeout = timedelta(seconds=int(getattr(settings, "EXPORT_JOB_TIMEOUT_SECONDS", 3600)))
+    done = failed = 0
+    for job in ExportJob.objects.filter(status="running", started_at__lt=now - timeout).select_related("requested_by"):
+        if not ExportJob.objects.filter(pk=job.pk, status="running").update(
+            status="failed", error="The export was interrupted.", finished_at=now
+        ):
+            continue
+        if job.filename:
+            (export_directory() / job.filename).unlink(missing_ok=True)
+        job.status, job.error = "failed", "The export was interrupted."
+        _notify(job, apps.get_model(job.model_label)._meta)
+        failed += 1
+
+    pending = ExportJob.objects.filter(status="pending").order_by("created_at", "pk").values_list("pk", flat=True)
+    for pk in list(pending[:limit]):
+        job = ExportJob.objects.select_related("requested_by").get(pk=pk)
+        model_name = job.model_label.rsplit(".", 1)[-1].lower()
+        filename = f"{model_name}-{now:%Y%m%d%H%M%S}-{uuid.uuid4().hex}.csv{'.gz' if job.compress else ''}"
+        if not ExportJob.objects.filter(pk=pk, status="pending").update(
+            status="running", started_at=timezone.now(), filename=filename
+        ):
+            continue
+        job.filename = filename
+        run_export_job(job)
+        if job.status == "done":
+            done += 1
+        else:
+            failed += 1
+    return done, failed
+
+
+def prune_exports(now=None):
+    """Delete exports older than EXPORT_RETENTION_HOURS; returns the number of files removed.
+
+    Exports written to the public MEDIA_ROOT/exports by earlier releases are swept as well.
+    """
+    hours = int(getattr(settings, "EXPORT_RETENTION_HOURS", 24))
+    cutoff = (now or time.time()) - hours * 3600
+    removed = 0
+    for directory in (export_directory(), Path(settings.MEDIA_ROOT) / "exports"):
+        if not directory.is_dir():
+            continue
+        for path in directory.iterdir():
+            if path.is_file() and EXPORT_FILENAME.match(path.name) and path.stat().st_mtime < cutoff:
+                path.unlink(missing_ok=True)
+                removed += 1
+    return removed
+
+
+def start_background_export(queryset, user, compress=True):
+    """Queue an export of ``queryset`` for the scheduler's export runner; the admin request returns immediately."""
+    return ExportJob.objects.create(
+        model_label=queryset.model._meta.label,
+        object_ids=list(queryset.values_list("pk", flat=True)),
+        compress=compress,
+        requested_by=user,
+    )
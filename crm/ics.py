@@ -0,0 +1,119 @@
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .journal import changed_lesson_ids, latest_position
+from .models import Lesson
+
+CACHE_PREFIX = "crm:calendar-feed"
+
+CALENDAR_HEADER = "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//Sams Driving//CRM//EN\r\nCALSCALE:GREGORIAN\r\n"
+CALENDAR_FOOTER = "END:VCALENDAR"
+
+
+def _ics_time(value):
+    return value.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def feed_lessons(feed, now=None):
+    lessons = Lesson.objects.all()
+    if feed.feed_type == "student" and feed.student_id:
+        lessons = lessons.filter(student_id=feed.student_id)
+    if feed.feed_type == "instructor" and feed.instructor_id:
+        lessons = lessons.filter(instructor_id=feed.instructor_id)
+    if not feed.include_past:
+        lessons = lessons.filter(end_time__gte=now or timezone.now())
+    return lessons
+
+
+def _render_events(lessons):
+    """Map lesson id to ``(start, end, updated_at, VEVENT text)``, streaming rows from the database."""
+    events = {}
+    rows = lessons.values_list("id", "lesson_type", "start_time", "end_time", "updated_at")
+    for lesson_id, lesson_type, start_time, end_time, updated_at in rows.iterator(chunk_size=500):
+        end_time = end_time or start_time + timedelta(hours=1)
+        events[lesson_id] = (
+            start_time,
+            end_time,
+            updated_at,
+            "BEGIN:VEVENT\r\n"
+            f"UID:lesson-{lesson_id}@samsdriving\r\n"
+            f"DTSTAMP:{_ics_time(updated_at)}\r\n"
+            f"DTSTART:{_ics_time(start_time)}\r\n"
+            f"DTEND:{_ics_time(end_time)}\r\n"
+            f"SUMMARY:{lesson_type.title()} Lesson\r\n"
+            "END:VEVENT\r\n",
+        )
+    return events
+
+
+def _state_cache_key(feed):
+    return f"{CACHE_PREFIX}:{feed.token}"
+
+
+def load_feed_state(feed, now=None):
+    """Return the rendered events of a feed, applying only journal deltas to the cached copy.
+
+    The state holds every event plus the journal position it reflects. When the journal has not moved the
+    cached state is returned as is; otherwise only the lessons changed since that position are re-read.
+    Caching is controlled by CALENDAR_FEED_CACHE_SECONDS (0 rebuilds on every request).
+    """
+    now = now or timezone.now()
+    timeout = int(getattr(settings, "CALENDAR_FEED_CACHE_SECONDS", 0))
+    position = latest_position()
+    state = cache.get(_state_cache_key(feed)) if timeout else None
+
+    if state is None:
+        events = _render_events(feed_lessons(feed, now))
+        state = {
+            "position": position,
+            "events": events,
+            "modified_at": max((event[2] for event in events.values()), default=None),
+        }
+    elif position > state["position"]:
+        changed = changed_lesson_ids(state["position"], position)
+        fresh = _render_events(feed_lessons(feed, now).filter(pk__in=changed)) if changed else {}
+        events = state["events"]
+        for lesson_id in changed:
+            event = fresh.get(lesson_id)
+            if events.get(lesson_id) == event:
+                continue
+            if event is None:
+                events.pop(lesson_id, None)
+                changed_at = now
+            else:
+                events[lesson_id] = event
+                changed_at = event[2]
+            state["modified_at"] = max(filter(None, (state["modified_at"], changed_at)))
+        state["position"] = position
+    else:
+        return state
+
+    if timeout:
+        cache.set(_state_cache_key(feed), state, timeout)
+    return state
+
+
+def visible_events(feed, state, now=None):
+    now = now or timezone.now()
+    events = state["events"].values()
+    if not feed.include_past:
+        events = [event for event in events if event[1] >= now]
+    return sorted(events, key=lambda event: event[0])
+
+
+def feed_etag(events):
+    digest = hashlib.md5()
+    for start_time, end_time, updated_at, text in events:
+        digest.update(text.encode("utf-8"))
+    return f'"{digest.hexdigest()}"'
+
+
+def render_calendar(events):
+    yield CALENDAR_HEADER
+    for event in events:
+        yield event[3]
+    yield CALENDAR_FOOTER
@@ -0,0 +1,29 @@
+import re
+
+NON_DIGITS = re.compile(r"\D+")
+# Mailboxes that ignore dots and "+tag" suffixes in the local part.
+DOTLESS_DOMAINS = {"gmail.com": "gmail.com", "googlemail.com": "gmail.com"}
+
+IDENTITY_FIELDS = ("email_key", "phone_key")
+
+
+def normalize_email(value):
+    """Lower-cased address with provider aliases folded, e.g. ``J.Doe+ads@GMail.com`` -> ``jdoe@gmail.com``."""
+    email = (value or "").strip().lower()
+    local, at, domain = email.rpartition("@")
+    if not at or not local or not domain:
+        return ""
+    if domain in DOTLESS_DOMAINS:
+        local = local.split("+", 1)[0].replace(".", "")
+        domain = DOTLESS_DOMAINS[domain]
+    return f"{local}@{domain}"[:254]
+
+
+def normalize_phone(value):
+    """The last ten digits of a North American number; shorter numbers are kept whole, junk becomes ``""``."""
+    digits = NON_DIGITS.sub("", value or "")
+    if len(digits) == 11 and digits.startswith("1"):
+        digits = digits[1:]
+    if len(digits) < 7:
+        return ""
+    return digits[-10:]
@@ -0,0 +1,63 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Lesson, LessonChange, SyncCheckpoint
+
+# Journal ids are allocated before commit, so a change can become visible after a higher id was already read.
+# Consumers re-read this many positions behind their checkpoint; applying a change twice is harmless.
+REREAD_OVERLAP = 50
+
+
+def record_lesson_change(lesson_id, action):
+    LessonChange.objects.create(lesson_id=lesson_id, action=action)
+
+
+def record_lessons_created(lessons):
+    """Journal lessons inserted with ``bulk_create``, which sends no post_save signals."""
+    lesson_ids = [lesson.pk for lesson in lessons if lesson.pk]
+    if len(lesson_ids) < len(lessons):
+        # Backends that cannot return ids from a bulk insert (MySQL): look the rows up again. Over-matching an
+        # existing lesson only makes consumers re-read it.
+        lesson_ids = list(
+            Lesson.objects.filter(
+                student_id__in={lesson.student_id for lesson in lessons},
+                start_time__in={lesson.start_time for lesson in lessons},
+            ).values_list("pk", flat=True)
+        )
+    LessonChange.objects.bulk_create(
+        [LessonChange(lesson_id=lesson_id, action="created") for lesson_id in lesson_ids], batch_size=500
+    )
+
+
+def latest_position():
+    return LessonChange.objects.aggregate(position=Max("pk"))["position"] or 0
+
+
+def changed_lesson_ids(since, until=None):
+    """Ids of lessons created, updated or deleted after journal position ``since`` (up to ``until``)."""
+    changes = LessonChange.objects.filter(pk__gt=max(since - REREAD_OVERLAP, 0))
+    if until is not None:
+        changes = changes.filter(pk__lte=until)
+    return set(changes.values_list("lesson_id", flat=True))
+
+
+def get_checkpoint(name):
+    checkpoint, _ = SyncCheckpoint.objects.get_or_create(name=name)
+    return checkpoint
+
+
+def save_checkpoint(checkpoint, position, checked_at=None):
+    checkpoint.position = position
+    checkpoint.checked_at = checked_at or timezone.now()
+    checkpoint.save(update_fields=["position", "checked_at"])
+
+
+def prune_lesson_changes(now=None):
+    """Delete journal rows older than LESSON_CHANGE_RETENTION_DAYS; returns the number removed."""
+    days = int(getattr(settings, "LESSON_CHANGE_RETENTION_DAYS", 30))
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    deleted, _ = LessonChange.objects.filter(changed_at__lt=cutoff).delete()
+    return deleted
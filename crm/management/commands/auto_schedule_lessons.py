@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from crm.models import LessonRequest
+from crm.scheduling import schedule_lesson_requests
+
+
+class Command(BaseCommand):
+    help = "Place new lesson requests on instructor and vehicle calendars"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--apply", action="store_true", help="Book the placed lessons instead of only listing them")
+        parser.add_argument("--limit", type=int, default=None, help="Only consider the oldest N new requests")
+
+    def handle(self, *args, **options):
+        requests = LessonRequest.objects.filter(status="new").order_by("created_at")
+        if options["limit"]:
+            requests = requests[: options["limit"]]
+        placements, unplaced = schedule_lesson_requests(requests, apply=options["apply"])
+        for placement in placements:
+            self.stdout.write(
+                f"{placement['request']}: {placement['start_time']:%Y-%m-%d %H:%M} "
+                f"with {placement['instructor']} in {placement['vehicle']}"
+            )
+        for request, reason in unplaced:
+            self.stdout.write(self.style.WARNING(f"{request}: {reason}"))
+        verb = "Booked" if options["apply"] else "Proposed"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(placements)} lesson(s); {len(unplaced)} request(s) left unplaced."))
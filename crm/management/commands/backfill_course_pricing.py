@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from crm.models import PRICING_FIELDS, Course
+from crm.page_cache import invalidate_model
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized pricing and feature columns on every course"
+
+    def handle(self, *args, **options):
+        courses = list(Course.objects.all())
+        for course in courses:
+            course.refresh_pricing()
+        Course.objects.bulk_update(courses, PRICING_FIELDS, batch_size=200)
+        invalidate_model(Course)
+        self.stdout.write(self.style.SUCCESS(f"Refreshed pricing for {len(courses)} course(s)."))
@@ -0,0 +1,52 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from crm.models import Instructor, LessonRequest, Student
+from crm.scheduling import plan_lesson_requests
+
+PREFERRED_TIMES = ["", "Morning", "Afternoon", "Evening", "10:00 AM", "2pm", "after 5", "13:30"]
+
+
+class Command(BaseCommand):
+    help = "Time the lesson auto-scheduler against synthetic requests on the populate_full_data fixtures"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500, help="Number of synthetic lesson requests")
+        parser.add_argument("--days", type=int, default=14, help="Spread preferred dates over this many days")
+        parser.add_argument("--populate", action="store_true", help="Run populate_full_data first")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options["populate"] or not Instructor.objects.exists():
+            call_command("populate_full_data", stdout=self.stdout)
+
+        rng = random.Random(options["seed"])
+        emails = list(Student.objects.exclude(email="").values_list("email", flat=True))
+        today = timezone.localdate()
+        # Requests are built in memory only; the planner never writes, so the database is left untouched.
+        requests = [
+            LessonRequest(
+                name=f"Benchmark Request {index}",
+                email=rng.choice(emails) if emails and rng.random() < 0.3 else f"benchmark{index}@example.com",
+                preferred_date=today + timedelta(days=rng.randint(1, options["days"])),
+                preferred_time=rng.choice(PREFERRED_TIMES),
+            )
+            for index in range(options["requests"])
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            placements, unplaced = plan_lesson_requests(requests)
+            elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"Planned {len(requests)} request(s) in {elapsed * 1000:.1f} ms using {len(queries)} queries: "
+            f"{len(placements)} placed, {len(unplaced)} unplaced."
+        )
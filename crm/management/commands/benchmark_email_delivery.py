@@ -0,0 +1,146 @@
+import multiprocessing
+import time
+import uuid
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Spawned workers import this module before django.setup(), so models are imported inside functions only.
+LOCMEM_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+
+
+def _setup_child():
+    import django
+    from django.conf import settings
+
+    django.setup()
+    settings.EMAIL_BACKEND = LOCMEM_BACKEND
+
+
+def _abandon_claim(limit, lease_seconds):
+    """Claim rows like a worker would, then die before sending any of them."""
+    _setup_child()
+    import os
+
+    from django.db import connection
+    from django.utils import timezone
+
+    from crm.delivery import claim_due_emails
+
+    claimed = claim_due_emails(timezone.now(), limit, worker_id="benchmark-crashed", lease_seconds=lease_seconds)
+    connection.close()
+    os._exit(0 if claimed else 1)
+
+
+def _deliver(worker_id, threads, batch_size, queue):
+    _setup_child()
+    from django.core import mail
+    from django.db import connection
+
+    from crm.delivery import deliver_scheduled_emails
+
+    try:
+        sent, failed = deliver_scheduled_emails(workers=threads, batch_size=batch_size, worker_id=worker_id)
+        queue.put((worker_id, sent, failed, [message.to[0] for message in getattr(mail, "outbox", [])], ""))
+    except Exception as exc:
+        queue.put((worker_id, 0, 0, [], repr(exc)))
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Drain seeded ScheduledEmail rows with several worker processes on the locmem backend and check that each "
+        "is sent exactly once, including rows abandoned mid-lease by a crashed worker"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--emails", type=int, default=300, help="Number of due emails to seed")
+        parser.add_argument("--processes", type=int, default=4, help="Worker processes draining the queue at once")
+        parser.add_argument("--threads", type=int, default=2, help="Send threads per worker process")
+        parser.add_argument("--batch-size", type=int, default=10, help="Emails per claimed chunk")
+        parser.add_argument("--abandoned", type=int, default=20, help="Rows claimed by a worker that dies mid-lease")
+        parser.add_argument("--keep", action="store_true", help="Keep the benchmark emails and communication logs")
+
+    def handle(self, *args, **options):
+        from django.utils import timezone
+
+        from crm.models import CommunicationLog, ScheduledEmail
+
+        now = timezone.now()
+        # Workers claim every due row, so real queued mail would be "sent" into locmem and lost.
+        pending = ScheduledEmail.objects.filter(status__in=["scheduled", "sending"], scheduled_for__lte=now).count()
+        if pending:
+            raise CommandError(f"{pending} due email(s) already queued; run this against a development database.")
+
+        run = uuid.uuid4().hex[:8]
+        prefix = f"benchmark-{run}-"
+        ScheduledEmail.objects.bulk_create(
+            [
+                ScheduledEmail(
+                    recipient_email=f"{prefix}{index}@example.com",
+                    subject=f"Delivery benchmark {run} #{index}",
+                    body="Delivery benchmark",
+                    scheduled_for=now,
+                    channel="email",
+                    status="scheduled",
+                )
+                for index in range(options["emails"])
+            ],
+            batch_size=500,
+        )
+        rows = ScheduledEmail.objects.filter(recipient_email__startswith=prefix)
+        try:
+            context = multiprocessing.get_context("spawn")
+
+            lease_seconds = 1
+            if options["abandoned"]:
+                crashed = context.Process(target=_abandon_claim, args=(options["abandoned"], lease_seconds))
+                crashed.start()
+                crashed.join()
+                abandoned = rows.filter(status="sending", claimed_by="benchmark-crashed").count()
+                if crashed.exitcode != 0 or abandoned != options["abandoned"]:
+                    raise CommandError(f"The crashing worker left {abandoned} row(s) claimed; expected {options['abandoned']}.")
+                self.stdout.write(f"A crashed worker abandoned {abandoned} row(s) in 'sending'.")
+                # Workers only reclaim a row once its lease is strictly in the past.
+                time.sleep(lease_seconds + 0.5)
+
+            queue = context.Queue()
+            workers = [
+                context.Process(
+                    target=_deliver, args=(f"benchmark-{index}", options["threads"], options["batch_size"], queue)
+                )
+                for index in range(max(1, options["processes"]))
+            ]
+            started = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            results = [queue.get(timeout=300) for _ in workers]
+            for worker in workers:
+                worker.join()
+            wall = time.perf_counter() - started
+
+            errors = [f"{worker_id}: {error}" for worker_id, _, _, _, error in results if error]
+            delivered = Counter(recipient for *_, recipients, _ in results for recipient in recipients)
+            expected = set(rows.values_list("recipient_email", flat=True))
+            missing = expected - set(delivered)
+            repeated = sorted(recipient for recipient, count in delivered.items() if count > 1)
+            unsent = rows.exclude(status="sent").count()
+            stranded = rows.filter(claimed_by="benchmark-crashed").count()
+
+            for worker_id, sent, failed, _, _ in sorted(results):
+                self.stdout.write(f"  {worker_id}: {sent} sent, {failed} failed")
+            self.stdout.write(
+                f"{len(expected)} email(s) across {len(workers)} process(es) in {wall:.2f} s: "
+                f"{len(missing)} missing, {len(repeated)} sent more than once, {unsent} not marked sent, "
+                f"{stranded} abandoned row(s) never reclaimed."
+            )
+        finally:
+            if not options["keep"]:
+                CommunicationLog.objects.filter(recipient_email__startswith=prefix).delete()
+                rows.delete()
+        if errors:
+            raise CommandError("Worker(s) failed: " + "; ".join(errors))
+        if missing or repeated or unsent or stranded:
+            raise CommandError("Delivery was not exactly-once.")
+        self.stdout.write(self.style.SUCCESS("Every email was sent exactly once."))
@@ -0,0 +1,89 @@
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from crm.admin import QueryCounter
+from crm.enrollment import enroll_student
+from crm.models import Course, EnrollmentRequest, InvoiceSequence, Lead, Student
+
+
+class Command(BaseCommand):
+    help = (
+        "Run concurrent web enrollments on an issue date with no invoice counter yet, so they also race to create "
+        "it, and report the queries each enrollment ran and how invoice numbers were allocated"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--enrollments", type=int, default=100, help="Number of enrollments to create")
+        parser.add_argument("--concurrency", type=int, default=8, help="Enrollments running at once")
+        parser.add_argument("--keep", action="store_true", help="Keep the benchmark students, leads and invoices")
+
+    def handle(self, *args, **options):
+        course = Course.objects.filter(active=True).exclude(slug="").first()
+        if course is None:
+            raise CommandError("No active course to enroll in; run populate_full_data first.")
+        run = uuid.uuid4().hex[:8]
+        # A far-future day nobody has invoiced on: every worker starts by racing for the first number of the day.
+        used = set(InvoiceSequence.objects.values_list("day", flat=True))
+        day = date(2099, 1, 1)
+        while day in used:
+            day += timedelta(days=random.randint(1, 3650))
+
+        def enroll(index):
+            details = {
+                "first_name": "Benchmark",
+                "last_name": f"Student {index}",
+                "email": f"benchmark-{run}-{index}@example.com",
+                "phone": f"416555{index:04d}",
+                "city": "Toronto",
+                "province": "ON",
+            }
+            try:
+                with QueryCounter() as queries:
+                    started = time.perf_counter()
+                    _, invoice = enroll_student(course, details, day=day)
+                    elapsed = time.perf_counter() - started
+                return invoice.number, len(queries), elapsed
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, options["concurrency"])) as executor:
+            results = list(executor.map(enroll, range(options["enrollments"])))
+        wall = time.perf_counter() - started
+
+        numbers = [number for number, _, _ in results]
+        queries = sorted(count for _, count, _ in results)
+        latencies = sorted(elapsed for _, _, elapsed in results)
+        suffixes = sorted(int(number.rsplit("-", 1)[1]) for number in numbers)
+        consecutive = suffixes == list(range(suffixes[0], suffixes[0] + len(suffixes)))
+        duplicates = len(numbers) - len(set(numbers))
+        counter = InvoiceSequence.objects.filter(day=day).values_list("last_number", flat=True).first()
+
+        self.stdout.write(
+            f"{len(results)} enrollment(s) at concurrency {options['concurrency']} in {wall:.2f} s "
+            f"({len(results) / wall:.1f}/s); p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+            f"p99 {latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000:.1f} ms."
+        )
+        self.stdout.write(f"Queries per enrollment: min {queries[0]}, median {queries[len(queries) // 2]}, max {queries[-1]}.")
+        self.stdout.write(
+            f"Invoice numbers {numbers and min(numbers)} .. {numbers and max(numbers)}: {duplicates} duplicate(s), "
+            f"{'consecutive' if consecutive else 'with gaps'}, day counter at {counter}."
+        )
+
+        if not options["keep"]:
+            students = Student.objects.filter(email__startswith=f"benchmark-{run}-")
+            Lead.objects.filter(email__startswith=f"benchmark-{run}-").delete()
+            EnrollmentRequest.objects.filter(email__startswith=f"benchmark-{run}-").delete()
+            # Enrollments and invoices cascade from the student.
+            students.delete()
+            InvoiceSequence.objects.filter(day=day).delete()
+        if duplicates:
+            raise CommandError("Duplicate invoice numbers were allocated.")
+        if suffixes[0] != 1 or counter != len(results):
+            raise CommandError("The racing first allocations of the day did not share one counter starting at 1.")
@@ -0,0 +1,42 @@
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpRequest
+from django.urls import reverse
+
+from crm.admin import QueryBudgetAdmin, QueryCounter
+
+
+class Command(BaseCommand):
+    help = "Render every crm admin changelist and fail if one runs more queries than its budget"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--per-page", type=int, default=100, help="Rows to render per changelist.")
+
+    def handle(self, *args, **options):
+        user = get_user_model()(username="query-budget", is_active=True, is_staff=True, is_superuser=True)
+        over_budget = []
+        for model, model_admin in sorted(admin.site._registry.items(), key=lambda item: item[0]._meta.label):
+            if not isinstance(model_admin, QueryBudgetAdmin):
+                continue
+            model_admin.list_per_page = options["per_page"]
+            request = HttpRequest()
+            request.method = "GET"
+            request.path = reverse(f"admin:{model._meta.app_label}_{model._meta.model_name}_changelist")
+            request.META = {"SCRIPT_NAME": "", "SERVER_NAME": "localhost", "SERVER_PORT": "80"}
+            request.user = user
+            with QueryCounter() as queries:
+                response = admin.site.admin_view(model_admin.changelist_view)(request)
+                if hasattr(response, "render"):
+                    response.render()
+            budget = model_admin.changelist_query_budget
+            rows = model._default_manager.count()
+            line = f"{model._meta.label}: {len(queries)} queries for {min(rows, options['per_page'])} row(s), budget {budget}"
+            if len(queries) > budget:
+                over_budget.append(model._meta.label)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        if over_budget:
+            raise CommandError(f"Over query budget: {', '.join(over_budget)}")
+        self.stdout.write(self.style.SUCCESS("All changelists are within budget."))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.query_plans import check_query_plans
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the hot crm queries and fail if any of them reads a whole table"
+
+    def handle(self, *args, **options):
+        failed = []
+        for name, plan, full_scans in check_query_plans():
+            if full_scans:
+                failed.append(name)
+                self.stdout.write(self.style.ERROR(f"{name}: full scan of {', '.join(full_scans)}"))
+            else:
+                self.stdout.write(f"{name}: indexed")
+            if full_scans or options["verbosity"] > 1:
+                self.stdout.write("\n".join(f"    {line}" for line in plan.splitlines()))
+        if failed:
+            raise CommandError(f"Full table scans in: {', '.join(failed)}")
+        self.stdout.write(self.style.SUCCESS("Every hot query uses an index."))
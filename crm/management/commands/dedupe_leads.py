@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from crm.dedupe import dedupe_leads, link_identities
+
+
+class Command(BaseCommand):
+    help = "Merge leads that share a normalized email or phone and link leads to students by email"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report duplicate clusters without merging them")
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        clusters, removed = dedupe_leads(dry_run=dry_run)
+        for cluster in clusters[:20]:
+            self.stdout.write(f"Leads {', '.join(str(pk) for pk in cluster)}")
+        if len(clusters) > 20:
+            self.stdout.write(f"... and {len(clusters) - 20} more cluster(s)")
+        if dry_run:
+            self.stdout.write(f"{len(clusters)} cluster(s); {removed} duplicate lead(s) would be merged.")
+            return
+        linked = link_identities()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Merged {removed} duplicate lead(s) in {len(clusters)} cluster(s); linked {linked} record(s)."
+            )
+        )
@@ -0,0 +1,24 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from crm.conflicts import detect_conflicts
+
+
+class Command(BaseCommand):
+    help = "Detect instructor, vehicle and classroom double-bookings in a window of lessons"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days-back", type=int, default=1, help="Include lessons starting this many days ago")
+        parser.add_argument("--days", type=int, default=180, help="Include lessons up to this many days ahead")
+        parser.add_argument("--all", action="store_true", help="Scan every lesson regardless of date")
+
+    def handle(self, *args, **options):
+        if options["all"]:
+            start = end = None
+        else:
+            now = timezone.now()
+            start = now - timedelta(days=options["days_back"])
+            end = now + timedelta(days=options["days"])
+        created = detect_conflicts(start, end)
+        self.stdout.write(self.style.SUCCESS(f"Detected {created} new conflict(s)."))
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.data_pipeline import DATASETS, FORMATS, export_dataset
+
+
+class Command(BaseCommand):
+    help = "Export a CRM dataset (leads, students, enrollments, invoices, lessons, payments) to CSV, JSONL or Parquet"
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=sorted(DATASETS))
+        parser.add_argument("path", help="Output file; the format follows the extension, .gz compresses CSV/JSONL.")
+        parser.add_argument("--format", choices=FORMATS, help="Override the format implied by the extension.")
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument("--resume", action="store_true", help="Append to an interrupted export of the same file.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def progress(written):
+            self.stdout.write(f"{written} row(s) written ({written / max(time.monotonic() - started, 0.001):.0f}/s)")
+
+        try:
+            written = export_dataset(
+                options["dataset"],
+                options["path"],
+                fmt=options["format"],
+                chunk_size=options["chunk_size"],
+                resume=options["resume"],
+                progress=progress,
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(f"Exported {written} {options['dataset']} row(s) to {options['path']}."))
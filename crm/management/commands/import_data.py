@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.data_pipeline import DATASETS, FORMATS, import_dataset
+
+
+class Command(BaseCommand):
+    help = "Upsert a CSV, JSONL or Parquet file into a CRM dataset, matching rows on its natural key"
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=sorted(DATASETS))
+        parser.add_argument("path", help="Input file; the format follows the extension, .gz is decompressed.")
+        parser.add_argument("--format", choices=FORMATS, help="Override the format implied by the extension.")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument("--resume", action="store_true", help="Skip rows an interrupted import already committed.")
+        parser.add_argument("--show-errors", type=int, default=20, help="How many skipped rows to list.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def progress(position, result):
+            elapsed = max(time.monotonic() - started, 0.001)
+            self.stdout.write(
+                f"{position} row(s) read: {result.created} created, {result.updated} updated, "
+                f"{result.unchanged} unchanged, {len(result.errors)} skipped ({result.rows / elapsed:.0f}/s)"
+            )
+
+        try:
+            result = import_dataset(
+                options["dataset"],
+                options["path"],
+                fmt=options["format"],
+                chunk_size=options["chunk_size"],
+                resume=options["resume"],
+                progress=progress,
+            )
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+        for error in result.errors[: options["show_errors"]]:
+            self.stderr.write(error)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {result.rows} row(s): {result.created} created, {result.updated} updated, "
+                f"{result.unchanged} unchanged, {len(result.errors)} skipped."
+            )
+        )
@@ -3,6 +3,7 @@ from datetime import timedelta
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from crm.models import Lead
+from crm.rollups import rebuild_lead_rollups
 
 class Command(BaseCommand):
     help = 'Populate database with dummy leads'
@@ -51,4 +52,7 @@ class Command(BaseCommand):
             Lead.objects.filter(pk=lead.pk).update(created_at=created_at, updated_at=created_at)
             count += 1
 
+        # created_at was backdated with update(), which bypasses the rollup signals
+        rebuild_lead_rollups()
+
         self.stdout.write(self.style.SUCCESS(f'Successfully created {count} dummy leads'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from crm.payments import process_stripe_inbox
+
+
+class Command(BaseCommand):
+    help = "Apply Stripe webhook events waiting in the inbox, retrying failures with backoff"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=100, help="Events to apply per pass.")
+
+    def handle(self, *args, **options):
+        processed = failed = 0
+        while True:
+            done, errors = process_stripe_inbox(limit=options["limit"])
+            processed += done
+            failed += errors
+            if done + errors < options["limit"]:
+                break
+        if processed or failed:
+            self.stdout.write(self.style.SUCCESS(f"Applied {processed} Stripe event(s); {failed} failed."))
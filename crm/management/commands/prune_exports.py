@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from crm.exports import prune_exports
+
+
+class Command(BaseCommand):
+    help = "Delete background CSV exports older than EXPORT_RETENTION_HOURS"
+
+    def handle(self, *args, **options):
+        removed = prune_exports()
+        self.stdout.write(self.style.SUCCESS(f"Pruned {removed} export(s)."))
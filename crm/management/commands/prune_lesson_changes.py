@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from crm.journal import prune_lesson_changes
+
+
+class Command(BaseCommand):
+    help = "Delete lesson change journal rows older than LESSON_CHANGE_RETENTION_DAYS"
+
+    def handle(self, *args, **options):
+        deleted = prune_lesson_changes()
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} lesson change(s)."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from crm.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the blog search index from every blog post"
+
+    def handle(self, *args, **options):
+        count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} blog post(s)."))
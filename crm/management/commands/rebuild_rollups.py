@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from crm.rollups import rebuild_lead_rollups, rebuild_payment_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily lead and payment rollup tables from source rows"
+
+    def handle(self, *args, **options):
+        lead_rows = rebuild_lead_rollups()
+        payment_rows = rebuild_payment_rollups()
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt {lead_rows} lead rollup row(s) and {payment_rows} payment rollup row(s).")
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from crm.dashboard_data import refresh_dashboard_snapshot
+
+
+class Command(BaseCommand):
+    help = "Recompute the admin dashboard KPI snapshot"
+
+    def handle(self, *args, **options):
+        snapshot = refresh_dashboard_snapshot()
+        self.stdout.write(self.style.SUCCESS(f"Dashboard snapshot refreshed at {snapshot.computed_at}"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from crm.delivery import run_dispatcher
+
+
+class Command(BaseCommand):
+    help = "Send queued emails within about a second of being queued (use with EMAIL_OUTBOX_MODE)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--poll-seconds", type=float, default=None, help="Longest wait between outbox checks.")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Email dispatcher running.")
+        run_dispatcher(poll_seconds=options["poll_seconds"])
@@ -1,137 +1,125 @@
-import json
 from datetime import timedelta
-from urllib import request as urlrequest
 from django.conf import settings
 from django.core.management.base import BaseCommand
-from django.core.mail import send_mail
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.template.loader import get_template
 from django.utils import timezone
 
-from crm.models import ScheduledEmail, CommunicationLog, Lesson, ReminderLog
+from crm.delivery import deliver_scheduled_emails
+from crm.journal import changed_lesson_ids, get_checkpoint, latest_position, save_checkpoint
+from crm.models import ScheduledEmail, Lesson, ReminderLog
 
+REMINDER_CHECKPOINT = "lesson_reminders"
 
-def _send_sms(recipient_phone, message):
-    webhook = getattr(settings, "SMS_WEBHOOK_URL", "")
-    if not webhook:
-        raise ValueError("SMS webhook is not configured")
-    payload = json.dumps({"to": recipient_phone, "message": message}).encode("utf-8")
-    req = urlrequest.Request(webhook, data=payload, headers={"Content-Type": "application/json"})
-    token = getattr(settings, "SMS_WEBHOOK_TOKEN", "")
-    if token:
-        req.add_header("Authorization", f"Bearer {token}")
-    with urlrequest.urlopen(req, timeout=30) as response:
-        response.read()
 
+def _reminder_offsets():
+    hours = {int(h) for h in getattr(settings, "LESSON_REMINDER_OFFSETS_HOURS", (24,)) if int(h) > 0}
+    return sorted(hours, reverse=True)
+
+
+def _reminder_bands(now, offsets):
+    # Each lesson only falls into the band of the closest offset, so a late booking gets one reminder
+    # rather than every reminder whose window it is already inside.
+    bands = []
+    for index, hours in enumerate(offsets):
+        lower = now + timedelta(hours=offsets[index + 1]) if index + 1 < len(offsets) else now
+        bands.append((hours, f"lesson_{hours}h", lower, now + timedelta(hours=hours)))
+    return bands
 
-from django.template.loader import get_template
 
 def _enqueue_lesson_reminders(now):
-    window_end = now + timedelta(hours=24)
+    offsets = _reminder_offsets()
+    if not offsets:
+        return 0
+    bands = _reminder_bands(now, offsets)
+
+    # Between runs a lesson can only become due by time passing into a band's upper edge or by being created
+    # or rescheduled, so after the first run only that time slice and the journal delta are scanned.
+    checkpoint = get_checkpoint(REMINDER_CHECKPOINT)
+    position = latest_position()
+    previous_run = checkpoint.checked_at
+    if previous_run is not None and previous_run <= now:
+        changed_ids = changed_lesson_ids(checkpoint.position, position)
+    else:
+        previous_run = changed_ids = None
+
+    pending = Q()
+    for hours, reminder_type, lower, upper in bands:
+        already_sent = ReminderLog.objects.filter(lesson=OuterRef("pk"), reminder_type=reminder_type)
+        lower_bound = Q(start_time__gte=lower) if lower == now else Q(start_time__gt=lower)
+        band = lower_bound & Q(start_time__lte=upper)
+        if previous_run is not None:
+            band &= Q(start_time__gt=previous_run + timedelta(hours=hours)) | Q(pk__in=changed_ids)
+        pending |= band & ~Exists(already_sent)
+
     upcoming = (
-        Lesson.objects.filter(start_time__gte=now, start_time__lte=window_end, status="scheduled")
-        .select_related("student", "instructor")
+        Lesson.objects.filter(pending, status="scheduled")
+        .select_related("student", "instructor__user")
         .order_by("start_time")
     )
+
+    template = get_template("emails/lesson_reminder.html")
+    logs = []
+    emails = []
     for lesson in upcoming:
-        reminder_time = lesson.start_time - timedelta(hours=24)
-        if reminder_time < now:
-            reminder_time = now
-        exists = ReminderLog.objects.filter(lesson=lesson, reminder_type="lesson_24h").exists()
-        if exists:
-            continue
-        ReminderLog.objects.create(lesson=lesson, reminder_type="lesson_24h", scheduled_for=reminder_time)
+        hours, reminder_type = next(
+            (hours, reminder_type)
+            for hours, reminder_type, lower, upper in reversed(bands)
+            if lesson.start_time <= upper
+        )
+        reminder_time = max(lesson.start_time - timedelta(hours=hours), now)
+        logs.append(ReminderLog(lesson=lesson, reminder_type=reminder_type, scheduled_for=reminder_time))
         student = lesson.student
         if student and student.email:
-            # Use HTML template for reminder
+            instructor_user = lesson.instructor.user if lesson.instructor else None
             context = {
                 "student_name": f"{student.first_name} {student.last_name}".strip(),
                 "lesson_type": lesson.lesson_type,
                 "start_time": lesson.start_time,
                 "end_time": lesson.end_time,
-                "instructor_name": f"{lesson.instructor.user.first_name} {lesson.instructor.user.last_name}" if lesson.instructor and lesson.instructor.user else "Assigned Instructor",
+                "instructor_name": f"{instructor_user.first_name} {instructor_user.last_name}" if instructor_user else "Assigned Instructor",
                 "pickup_location": lesson.pickup_address,
             }
-            body = get_template("emails/lesson_reminder.html").render(context)
-            
-            ScheduledEmail.objects.create(
-                to_student=student,
-                recipient_email=student.email,
-                subject="Upcoming Lesson Reminder",
-                body=body,
-                scheduled_for=reminder_time,
-                channel="email",
+            emails.append(
+                ScheduledEmail(
+                    to_student=student,
+                    recipient_email=student.email,
+                    subject="Upcoming Lesson Reminder",
+                    body=template.render(context),
+                    scheduled_for=reminder_time,
+                    channel="email",
+                )
             )
         if student and student.phone:
-            ScheduledEmail.objects.create(
-                to_student=student,
-                recipient_phone=student.phone,
-                subject="",
-                body=f"Lesson reminder: {lesson.start_time}",
-                scheduled_for=reminder_time,
-                channel="sms",
+            emails.append(
+                ScheduledEmail(
+                    to_student=student,
+                    recipient_phone=student.phone,
+                    subject="",
+                    body=f"Lesson reminder: {lesson.start_time}",
+                    scheduled_for=reminder_time,
+                    channel="sms",
+                )
             )
 
+    with transaction.atomic():
+        ReminderLog.objects.bulk_create(logs, batch_size=500)
+        ScheduledEmail.objects.bulk_create(emails, batch_size=500)
+        save_checkpoint(checkpoint, position, checked_at=now)
+    return len(logs)
+
 
 class Command(BaseCommand):
     help = "Send scheduled emails"
 
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None, help="Concurrent delivery workers")
+        parser.add_argument("--batch-size", type=int, default=None, help="Messages sent per pooled connection")
+
     def handle(self, *args, **options):
         now = timezone.now()
         _enqueue_lesson_reminders(now)
-        due_emails = ScheduledEmail.objects.filter(status="scheduled", scheduled_for__lte=now)
-        for scheduled in due_emails:
-            scheduled.attempts += 1
-            subject = scheduled.subject
-            body = scheduled.body
-            if scheduled.template:
-                subject = scheduled.template.subject or subject
-                body = scheduled.template.body or body
-            try:
-                if scheduled.channel == "sms":
-                    recipient = scheduled.recipient_phone
-                    if not recipient and scheduled.to_student:
-                        recipient = scheduled.to_student.phone
-                    if not recipient:
-                        raise ValueError("Missing recipient phone")
-                    _send_sms(recipient, body)
-                    scheduled.status = "sent"
-                    scheduled.sent_at = timezone.now()
-                    scheduled.last_error = ""
-                    scheduled.save(update_fields=["status", "sent_at", "last_error", "attempts"])
-                    CommunicationLog.objects.create(
-                        template=scheduled.template,
-                        to_lead=scheduled.to_lead,
-                        to_student=scheduled.to_student,
-                        recipient_phone=recipient,
-                        status="sent",
-                        sent_at=scheduled.sent_at,
-                    )
-                else:
-                    recipient = scheduled.recipient_email
-                    if not recipient and scheduled.to_lead:
-                        recipient = scheduled.to_lead.email
-                    if not recipient and scheduled.to_student:
-                        recipient = scheduled.to_student.email
-                    if not recipient:
-                        raise ValueError("Missing recipient email")
-                    
-                    # Check if body looks like HTML (starts with <)
-                    html_message = body if body.strip().startswith("<") else None
-                    
-                    send_mail(subject, body if not html_message else "", None, [recipient], fail_silently=False, html_message=html_message)
-                
-                scheduled.status = "sent"
-                scheduled.sent_at = timezone.now()
-                scheduled.last_error = ""
-                scheduled.save(update_fields=["status", "sent_at", "last_error", "attempts"])
-                CommunicationLog.objects.create(
-                    template=scheduled.template,
-                    to_lead=scheduled.to_lead,
-                    to_student=scheduled.to_student,
-                    recipient_email=recipient,
-                    status="sent",
-                    sent_at=scheduled.sent_at,
-                )
-            except Exception as exc:
-                scheduled.status = "failed"
-                scheduled.last_error = str(exc)
-                scheduled.save(update_fields=["status", "last_error", "attempts"])
+        sent, failed = deliver_scheduled_emails(now, workers=options["workers"], batch_size=options["batch_size"])
+        if sent or failed:
+            self.stdout.write(f"Sent {sent} message(s), {failed} failed.")
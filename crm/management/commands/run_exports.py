@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from crm.exports import process_export_jobs
+
+
+class Command(BaseCommand):
+    help = "Write queued admin CSV exports and fail the ones whose runner died"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=10, help="Export jobs to run per pass.")
+
+    def handle(self, *args, **options):
+        done, failed = process_export_jobs(limit=options["limit"])
+        if done or failed:
+            self.stdout.write(self.style.SUCCESS(f"Finished {done} export(s); {failed} failed."))
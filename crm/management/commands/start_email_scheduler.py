@@ -1,4 +1,5 @@
 from apscheduler.schedulers.blocking import BlockingScheduler
+from django.conf import settings
 from django.core.management import BaseCommand, call_command
 from django.utils import timezone
 
@@ -8,5 +9,62 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         scheduler = BlockingScheduler(timezone=str(timezone.get_current_timezone()))
-        scheduler.add_job(lambda: call_command("run_email_scheduler"), "interval", minutes=1, id="scheduled_emails")
+        scheduler.add_job(
+            lambda: call_command("run_email_scheduler"),
+            "interval",
+            minutes=1,
+            id="scheduled_emails",
+            max_instances=1,
+            coalesce=True,
+        )
+        scheduler.add_job(
+            lambda: call_command("process_stripe_inbox"),
+            "interval",
+            seconds=int(getattr(settings, "STRIPE_INBOX_POLL_SECONDS", 5)),
+            id="stripe_inbox",
+            max_instances=1,
+            coalesce=True,
+        )
+        scheduler.add_job(
+            lambda: call_command("refresh_dashboard_snapshot"),
+            "interval",
+            seconds=int(getattr(settings, "DASHBOARD_SNAPSHOT_REFRESH_SECONDS", 300)),
+            id="dashboard_snapshot",
+            max_instances=1,
+            coalesce=True,
+        )
+        scheduler.add_job(
+            lambda: call_command("detect_conflicts"),
+            "cron",
+            hour=2,
+            minute=30,
+            id="nightly_conflict_detection",
+            max_instances=1,
+            coalesce=True,
+        )
+        scheduler.add_job(
+            lambda: call_command("prune_lesson_changes"),
+            "cron",
+            hour=3,
+            minute=0,
+            id="nightly_lesson_journal_prune",
+            max_instances=1,
+            coalesce=True,
+        )
+        scheduler.add_job(
+            lambda: call_command("run_exports"),
+            "interval",
+            seconds=int(getattr(settings, "EXPORT_POLL_SECONDS", 10)),
+            id="admin_exports",
+            max_instances=1,
+            coalesce=True,
+        )
+        scheduler.add_job(
+            lambda: call_command("prune_exports"),
+            "interval",
+            hours=1,
+            id="export_prune",
+            max_instances=1,
+            coalesce=True,
+        )
         scheduler.start()
@@ -0,0 +1,84 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:07
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def _local_day(value):
+    if not value:
+        return None
+    if timezone.is_aware(value):
+        return timezone.localtime(value).date()
+    return value.date()
+
+
+def backfill_rollups(apps, schema_editor):
+    Lead = apps.get_model("crm", "Lead")
+    Payment = apps.get_model("crm", "Payment")
+    LeadDailyRollup = apps.get_model("crm", "LeadDailyRollup")
+    PaymentDailyRollup = apps.get_model("crm", "PaymentDailyRollup")
+
+    lead_buckets = {}
+    for created_at, source, status in Lead.objects.values_list("created_at", "source", "status").iterator():
+        day = _local_day(created_at)
+        if day:
+            key = (day, source or "", status or "")
+            lead_buckets[key] = lead_buckets.get(key, 0) + 1
+    LeadDailyRollup.objects.bulk_create(
+        [LeadDailyRollup(day=day, source=source, status=status, count=count) for (day, source, status), count in lead_buckets.items()],
+        batch_size=500,
+    )
+
+    payment_buckets = {}
+    for paid_at, method, status, amount in Payment.objects.values_list("paid_at", "method", "status", "amount").iterator():
+        day = _local_day(paid_at)
+        if day:
+            count, total = payment_buckets.get((day, method or "", status or ""), (0, Decimal("0")))
+            payment_buckets[(day, method or "", status or "")] = (count + 1, total + (amount or 0))
+    PaymentDailyRollup.objects.bulk_create(
+        [
+            PaymentDailyRollup(day=day, method=method, status=status, count=count, total=total)
+            for (day, method, status), (count, total) in payment_buckets.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0022_dashboardsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('method', models.CharField(blank=True, max_length=20)),
+                ('status', models.CharField(blank=True, max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+            options={
+                'unique_together': {('day', 'method', 'status')},
+            },
+        ),
+        migrations.CreateModel(
+            name='LeadDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('source', models.CharField(blank=True, max_length=100)),
+                ('status', models.CharField(blank=True, max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('day', 'source', 'status')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
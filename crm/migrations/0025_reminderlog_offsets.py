@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0024_scheduledemail_claiming'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reminderlog',
+            name='reminder_type',
+            field=models.CharField(choices=[('lesson_48h', 'Lesson 48h'), ('lesson_24h', 'Lesson 24h'), ('lesson_2h', 'Lesson 2h')], max_length=30),
+        ),
+    ]
@@ -0,0 +1,115 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:22
+
+import html
+import re
+from collections import Counter
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils.html import strip_tags
+
+# Frozen copy of the crm.search tokenizer as of this migration, so later changes to the app code cannot alter it.
+FTS_TABLE = "crm_blog_fts"
+FIELD_WEIGHTS = (("title", 5), ("summary", 2), ("content", 1))
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have how i if in into is it its of on or our so that the their "
+    "then there these they this to was we were what when which who will with you your".split()
+)
+SUFFIXES = ("ingly", "edly", "ings", "ing", "ies", "ied", "ers", "er", "ed", "es", "ly", "s")
+
+
+def plain_text(value):
+    return html.unescape(strip_tags(value or ""))
+
+
+def stem(word):
+    """Light suffix stripping so "driving", "drives" and "drivers" share one index term."""
+    if len(word) <= 3 or word.isdigit():
+        return word
+    for suffix in SUFFIXES:
+        if not word.endswith(suffix) or len(word) - len(suffix) < 3:
+            continue
+        if suffix == "s" and word.endswith("ss"):
+            return word
+        if suffix == "es" and not word[:-2].endswith(("s", "x", "z", "ch", "sh")):
+            continue
+        word = word[: -len(suffix)]
+        if suffix in ("ies", "ied"):
+            return word + "y"
+        break
+    return word[:-1] if word.endswith("e") and len(word) > 4 else word
+
+
+def tokenize(text):
+    return [stem(word) for word in WORD_PATTERN.findall(text.lower()) if word not in STOPWORDS and len(word) > 1]
+
+
+def blog_terms(blog):
+    weights = Counter()
+    for field, weight in FIELD_WEIGHTS:
+        for term in tokenize(plain_text(getattr(blog, field))):
+            weights[term[:64]] += weight
+    return weights
+
+
+def create_native_fulltext(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "mysql":
+        schema_editor.execute("CREATE FULLTEXT INDEX crm_blog_fulltext ON crm_blog (title, summary, content)")
+    elif connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            options = {row[0] for row in cursor.execute("PRAGMA compile_options").fetchall()}
+        if "ENABLE_FTS5" in options:
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS crm_blog_fts USING fts5(title, summary, content, tokenize='porter unicode61')"
+            )
+
+
+def index_existing_blogs(apps, schema_editor):
+    Blog = apps.get_model("crm", "Blog")
+    BlogSearchTerm = apps.get_model("crm", "BlogSearchTerm")
+    connection = schema_editor.connection
+    fts = connection.vendor == "sqlite" and FTS_TABLE in connection.introspection.table_names()
+    for blog in Blog.objects.iterator(chunk_size=200):
+        BlogSearchTerm.objects.bulk_create(
+            [BlogSearchTerm(blog=blog, term=term, weight=weight) for term, weight in blog_terms(blog).items()],
+            batch_size=500,
+        )
+        if fts:
+            schema_editor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, summary, content) VALUES (%s, %s, %s, %s)",
+                [blog.pk, blog.title, plain_text(blog.summary), plain_text(blog.content)],
+            )
+
+
+def drop_native_fulltext(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "mysql":
+        schema_editor.execute("DROP INDEX crm_blog_fulltext ON crm_blog")
+    elif connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS crm_blog_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0028_course_pricing_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlogSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveIntegerField(default=0)),
+                ('blog', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='crm.blog')),
+            ],
+            options={
+                'unique_together': {('term', 'blog')},
+            },
+        ),
+        migrations.RunPython(create_native_fulltext, drop_native_fulltext),
+        migrations.RunPython(index_existing_blogs, migrations.RunPython.noop),
+    ]
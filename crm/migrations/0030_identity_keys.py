@@ -0,0 +1,98 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:46
+
+import re
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Frozen copy of crm.identity as of this migration, so later changes to the app code cannot alter it.
+NON_DIGITS = re.compile(r"\D+")
+# Mailboxes that ignore dots and "+tag" suffixes in the local part.
+DOTLESS_DOMAINS = {"gmail.com": "gmail.com", "googlemail.com": "gmail.com"}
+
+
+def normalize_email(value):
+    """Lower-cased address with provider aliases folded, e.g. ``J.Doe+ads@GMail.com`` -> ``jdoe@gmail.com``."""
+    email = (value or "").strip().lower()
+    local, at, domain = email.rpartition("@")
+    if not at or not local or not domain:
+        return ""
+    if domain in DOTLESS_DOMAINS:
+        local = local.split("+", 1)[0].replace(".", "")
+        domain = DOTLESS_DOMAINS[domain]
+    return f"{local}@{domain}"[:254]
+
+
+def normalize_phone(value):
+    """The last ten digits of a North American number; shorter numbers are kept whole, junk becomes ``""``."""
+    digits = NON_DIGITS.sub("", value or "")
+    if len(digits) == 11 and digits.startswith("1"):
+        digits = digits[1:]
+    if len(digits) < 7:
+        return ""
+    return digits[-10:]
+
+
+def backfill_identity_keys(apps, schema_editor):
+    for model_name in ("Lead", "Student", "EnrollmentRequest"):
+        model = apps.get_model("crm", model_name)
+        batch = []
+        for obj in model.objects.only("pk", "email", "phone").iterator(chunk_size=1000):
+            obj.email_key = normalize_email(obj.email)
+            obj.phone_key = normalize_phone(obj.phone)
+            batch.append(obj)
+            if len(batch) >= 1000:
+                model.objects.bulk_update(batch, ["email_key", "phone_key"])
+                batch = []
+        model.objects.bulk_update(batch, ["email_key", "phone_key"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0029_blog_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrollmentrequest',
+            name='email_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=254),
+        ),
+        migrations.AddField(
+            model_name='enrollmentrequest',
+            name='lead',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='enrollment_requests', to='crm.lead'),
+        ),
+        migrations.AddField(
+            model_name='enrollmentrequest',
+            name='phone_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='lead',
+            name='email_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=254),
+        ),
+        migrations.AddField(
+            model_name='lead',
+            name='phone_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='lead',
+            name='student',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='leads', to='crm.student'),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='email_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=254),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='phone_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=20),
+        ),
+        migrations.RunPython(backfill_identity_keys, migrations.RunPython.noop),
+    ]
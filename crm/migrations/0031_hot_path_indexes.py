@@ -0,0 +1,61 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0030_identity_keys'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blog',
+            index=models.Index(fields=['published_at', 'id'], name='crm_blog_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['display_order', 'name'], name='crm_course_listing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['created_at'], name='crm_lead_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['instructor', 'start_time', 'end_time'], name='crm_lesson_instructor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['status', 'start_time'], name='crm_lesson_status_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['start_time'], name='crm_lesson_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lessonrequest',
+            index=models.Index(fields=['status', 'created_at'], name='crm_lessonreq_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificationreceipt',
+            index=models.Index(fields=['user', 'read_at'], name='crm_receipt_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', 'paid_at'], name='crm_payment_status_paid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['paid_at'], name='crm_payment_paid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scheduledemail',
+            index=models.Index(fields=['status', 'scheduled_for'], name='crm_scheduled_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['email'], name='crm_student_email_idx'),
+        ),
+    ]
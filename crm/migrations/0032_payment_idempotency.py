@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:52
+
+import hashlib
+
+from django.db import migrations, models
+
+
+# Frozen copy of crm.delivery.email_dedupe_key as of this migration, so later changes cannot alter the backfill.
+def email_dedupe_key(recipient_email, subject, body):
+    digest = hashlib.sha256()
+    for part in (recipient_email.strip().lower(), subject, body):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def backfill_dedupe_keys(apps, schema_editor):
+    ScheduledEmail = apps.get_model("crm", "ScheduledEmail")
+    batch = []
+    rows = ScheduledEmail.objects.filter(channel="email").only("pk", "recipient_email", "subject", "body")
+    for scheduled in rows.iterator(chunk_size=1000):
+        scheduled.dedupe_key = email_dedupe_key(scheduled.recipient_email, scheduled.subject, scheduled.body)
+        batch.append(scheduled)
+        if len(batch) >= 1000:
+            ScheduledEmail.objects.bulk_update(batch, ["dedupe_key"])
+            batch = []
+    ScheduledEmail.objects.bulk_update(batch, ["dedupe_key"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0031_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StripeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=255, unique=True)),
+                ('event_type', models.CharField(blank=True, max_length=100)),
+                ('processed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='scheduledemail',
+            name='dedupe_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+        migrations.RunPython(backfill_dedupe_keys, migrations.RunPython.noop),
+    ]
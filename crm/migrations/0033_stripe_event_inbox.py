@@ -0,0 +1,61 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:53
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def mark_ledger_processed(apps, schema_editor):
+    # Every row written before the inbox existed was applied inline by the webhook.
+    StripeEvent = apps.get_model("crm", "StripeEvent")
+    StripeEvent.objects.update(status="processed", received_at=F("processed_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0032_payment_idempotency'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stripeevent',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='stripeevent',
+            name='last_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='stripeevent',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='stripeevent',
+            name='payload',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='stripeevent',
+            name='received_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='stripeevent',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processed', 'Processed'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='stripeevent',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='stripeevent',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='crm_stripeevent_due_idx'),
+        ),
+        migrations.RunPython(mark_ledger_processed, migrations.RunPython.noop),
+    ]
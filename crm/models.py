@@ -1,6 +1,4 @@
 import uuid
-from datetime import timedelta
-from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 from django.conf import settings
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.core.exceptions import ValidationError
@@ -9,8 +7,26 @@ from django.utils import timezone
 from django.utils.text import slugify
 from ckeditor_uploader.fields import RichTextUploadingField
 
+from .identity import IDENTITY_FIELDS, normalize_email, normalize_phone
+from .pricing import course_pricing, invalid_fee_fields, normalize_features
 
-class Lead(models.Model):
+
+class IdentityKeysMixin:
+    """Keeps the indexed ``email_key``/``phone_key`` columns in step with ``email`` and ``phone`` on save."""
+
+    def refresh_identity_keys(self):
+        self.email_key = normalize_email(self.email)
+        self.phone_key = normalize_phone(self.phone)
+
+    def save(self, *args, **kwargs):
+        self.refresh_identity_keys()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, *IDENTITY_FIELDS}
+        super().save(*args, **kwargs)
+
+
+class Lead(IdentityKeysMixin, models.Model):
     STATUS_CHOICES = [
         ("new", "New"),
         ("contacted", "Contacted"),
@@ -29,14 +45,24 @@ class Lead(models.Model):
         settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name="assigned_leads"
     )
     notes = models.TextField(blank=True)
+    student = models.ForeignKey(
+        "Student", null=True, blank=True, on_delete=models.SET_NULL, related_name="leads"
+    )
+    email_key = models.CharField(max_length=254, blank=True, db_index=True, editable=False)
+    phone_key = models.CharField(max_length=20, blank=True, db_index=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"], name="crm_lead_created_idx"),
+        ]
+
     def __str__(self):
         return f"{self.first_name} {self.last_name}".strip()
 
 
-class EnrollmentRequest(models.Model):
+class EnrollmentRequest(IdentityKeysMixin, models.Model):
     STATUS_CHOICES = [
         ("new", "New"),
         ("contacted", "Contacted"),
@@ -51,6 +77,9 @@ class EnrollmentRequest(models.Model):
     preferred_schedule = models.CharField(max_length=200, blank=True)
     notes = models.TextField(blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="new")
+    lead = models.ForeignKey(Lead, null=True, blank=True, on_delete=models.SET_NULL, related_name="enrollment_requests")
+    email_key = models.CharField(max_length=254, blank=True, db_index=True, editable=False)
+    phone_key = models.CharField(max_length=20, blank=True, db_index=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -88,7 +117,7 @@ class LeadTask(models.Model):
         return self.title
 
 
-class Student(models.Model):
+class Student(IdentityKeysMixin, models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
     first_name = models.CharField(max_length=100)
     middle_name = models.CharField(max_length=100, blank=True)
@@ -106,9 +135,16 @@ class Student(models.Model):
     license_expiry_date = models.DateField(null=True, blank=True)
     license_status = models.CharField(max_length=100, blank=True)
     preferred_location = models.CharField(max_length=100, blank=True)
+    email_key = models.CharField(max_length=254, blank=True, db_index=True, editable=False)
+    phone_key = models.CharField(max_length=20, blank=True, db_index=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["email"], name="crm_student_email_idx"),
+        ]
+
     def __str__(self):
         name = f"{self.first_name} {self.middle_name} {self.last_name}".strip()
         return " ".join(name.split())
@@ -132,6 +168,9 @@ class StudentDocument(models.Model):
         return f"{self.student} {self.document_type}"
 
 
+PRICING_FIELDS = ("hst_amount", "total_with_hst", "fees_display", "features_display")
+
+
 class Course(models.Model):
     COURSE_TYPES = [
         ("bde", "BDE"),
@@ -159,6 +198,16 @@ class Course(models.Model):
     features = models.JSONField(default=list, blank=True)
     display_order = models.PositiveIntegerField(default=0)
     active = models.BooleanField(default=True)
+    hst_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
+    total_with_hst = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
+    fees_display = models.JSONField(default=dict, blank=True, editable=False)
+    features_display = models.JSONField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Ordered like the catalogue; see Blog.Meta for why ``active`` does not lead.
+            models.Index(fields=["display_order", "name"], name="crm_course_listing_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -183,96 +232,28 @@ class Course(models.Model):
 
     @property
     def fees_calc(self):
-        def _parse_decimal(value):
-            if value is None:
-                return None
-            if isinstance(value, Decimal):
-                return value
-            if isinstance(value, (int, float)):
-                return Decimal(str(value))
-            if isinstance(value, str):
-                cleaned = value.strip().replace("$", "").replace(",", "")
-                for token in ("+HST", "HST"):
-                    cleaned = cleaned.replace(token, "")
-                cleaned = cleaned.strip()
-                if not cleaned:
-                    return None
-                return Decimal(cleaned)
-            return None
-
-        base = Decimal(self.price or 0).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-        rate = Decimal("0.13")
-        hst_amount = (base * rate).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-        total = (base + hst_amount).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-
-        fees = self.fees if isinstance(self.fees, dict) else {}
-        raw_total = fees.get("total")
-        raw_hst = fees.get("hst_amount")
+        if self.fees_display:
+            return self.fees_display
+        return course_pricing(self.price, self.fees)[2]
 
-        try:
-            parsed_total = _parse_decimal(raw_total)
-        except (InvalidOperation, TypeError, ValueError):
-            parsed_total = None
-        try:
-            parsed_hst = _parse_decimal(raw_hst)
-        except (InvalidOperation, TypeError, ValueError):
-            parsed_hst = None
+    @property
+    def features_calc(self):
+        if self.features_display is not None:
+            return self.features_display
+        return self._normalized_features()
 
-        effective_total = (parsed_total if parsed_total is not None else total).quantize(
-            Decimal("0.01"), rounding=ROUND_HALF_UP
-        )
-        effective_hst = (parsed_hst if parsed_hst is not None else hst_amount).quantize(
-            Decimal("0.01"), rounding=ROUND_HALF_UP
-        )
+    def _normalized_features(self):
+        return normalize_features(self.features, self.session, self.hours_theory, self.hours_homework, self.hours_incar)
 
-        return {
-            "regular": fees.get("regular") or f"${base:.2f} +HST",
-            "promotion_savings": fees.get("promotion_savings") or "0$ +HST",
-            "pay_only": fees.get("pay_only") or f"${base:.2f} +HST",
-            "hst_rate_percent": fees.get("hst_rate_percent") or "13%",
-            "hst_amount": f"{effective_hst:.2f}",
-            "total": f"{effective_total:.2f}",
-        }
+    def refresh_pricing(self):
+        """Recompute the denormalized pricing and feature columns from price, fees and features."""
+        self.hst_amount, self.total_with_hst, self.fees_display = course_pricing(self.price, self.fees)
+        self.features_display = self._normalized_features()
 
-    @property
-    def features_calc(self):
-        raw = self.features
-        normalized = []
-
-        def _add(label, value):
-            label = (label or "").strip()
-            value = (value or "").strip()
-            if not label or not value:
-                return
-            normalized.append({"label": label, "value": value})
-
-        if isinstance(raw, dict):
-            for k, v in raw.items():
-                _add(str(k), str(v))
-        elif isinstance(raw, (list, tuple)):
-            for item in raw:
-                if isinstance(item, dict):
-                    label = item.get("label") or item.get("title") or item.get("name") or ""
-                    value = item.get("value") or item.get("text") or item.get("subtitle") or ""
-                    _add(str(label), str(value))
-                elif isinstance(item, (list, tuple)) and len(item) >= 2:
-                    _add(str(item[0]), str(item[1]))
-                elif isinstance(item, str):
-                    _add("Feature", item)
-
-        if normalized:
-            return normalized
-
-        if self.session:
-            _add("Session", self.session)
-        if self.hours_theory:
-            _add("Theory", f"{self.hours_theory} Hours")
-        if self.hours_homework:
-            _add("Homework", f"{self.hours_homework} Hours")
-        if self.hours_incar:
-            _add("In-Car", f"{self.hours_incar} Hours")
-
-        return normalized
+    def clean(self):
+        invalid = invalid_fee_fields(self.fees)
+        if invalid:
+            raise ValidationError({"fees": f"Could not parse fee amount(s): {', '.join(invalid)}."})
 
     @property
     def price_display(self):
@@ -288,6 +269,10 @@ class Course(models.Model):
                 candidate = f"{base_slug[: (180 - len(suffix_str))]}{suffix_str}"
                 suffix += 1
             self.slug = candidate
+        self.refresh_pricing()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, *PRICING_FIELDS}
         super().save(*args, **kwargs)
 
 
@@ -440,46 +425,55 @@ class Lesson(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="scheduled")
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["instructor", "start_time", "end_time"], name="crm_lesson_instructor_idx"),
+            models.Index(fields=["status", "start_time"], name="crm_lesson_status_start_idx"),
+            models.Index(fields=["start_time"], name="crm_lesson_start_idx"),
+        ]
 
     def __str__(self):
         return f"{self.student} {self.start_time}"
 
     def clean(self):
-        if not self.end_time and self.start_time:
-            self.end_time = self.start_time + timedelta(hours=1)
-            
-        if self.start_time >= self.end_time:
-            raise ValidationError("End time must be after start time.")
-        overlapping = Lesson.objects.filter(start_time__lt=self.end_time, end_time__gt=self.start_time)
-        if self.pk:
-            overlapping = overlapping.exclude(pk=self.pk)
-        if self.instructor and overlapping.filter(instructor=self.instructor).exists():
-            raise ValidationError("Instructor is already booked for this time.")
-        if self.vehicle and overlapping.filter(vehicle=self.vehicle).exists():
-            raise ValidationError("Vehicle is already booked for this time.")
-        if self.classroom and overlapping.filter(classroom=self.classroom).exists():
-            raise ValidationError("Classroom is already booked for this time.")
-        
-        # Validation rule: Max 5 lessons if not paid
-        if self.student:
-            # Check if student has paid in full
-            # We check if there is any enrollment that is 'paid' or 'completed'
-            has_paid = Enrollment.objects.filter(
-                student=self.student, 
-                status__in=["paid", "completed"]
-            ).exists()
-            
-            if not has_paid:
-                # Count existing lessons (excluding self)
-                lesson_count = Lesson.objects.filter(student=self.student).exclude(pk=self.pk).count()
-                if lesson_count >= 5:
-                    raise ValidationError("Student has not paid in full. Maximum 5 lessons allowed.")
+        from .booking import lesson_errors
+
+        # Calendar overlaps for instructor, vehicle and classroom, plus the "max 5 lessons if not paid" rule,
+        # share the set-based checks used for bulk booking.
+        errors = lesson_errors([self])
+        if errors:
+            raise ValidationError(errors[0][0])
 
     def save(self, *args, **kwargs):
         self.full_clean()
         super().save(*args, **kwargs)
 
 
+class LessonChange(models.Model):
+    ACTION_CHOICES = [
+        ("created", "Created"),
+        ("updated", "Updated"),
+        ("deleted", "Deleted"),
+    ]
+    lesson_id = models.BigIntegerField(db_index=True)
+    action = models.CharField(max_length=20, choices=ACTION_CHOICES)
+    changed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.lesson_id} {self.action}"
+
+
+class SyncCheckpoint(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    position = models.BigIntegerField(default=0)
+    checked_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} {self.position}"
+
+
 class LessonAttendance(models.Model):
     STATUS_CHOICES = [
         ("attended", "Attended"),
@@ -534,6 +528,11 @@ class LessonRequest(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="new")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="crm_lessonreq_status_idx"),
+        ]
+
     def __str__(self):
         return f"{self.name} {self.status}"
 
@@ -561,6 +560,14 @@ class Invoice(models.Model):
         return self.number
 
 
+class InvoiceSequence(models.Model):
+    day = models.DateField(unique=True)
+    last_number = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.day} {self.last_number}"
+
+
 class PaymentSchedule(models.Model):
     STATUS_CHOICES = [
         ("pending", "Pending"),
@@ -599,10 +606,41 @@ class Payment(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="completed")
     stripe_payment_intent_id = models.CharField(max_length=200, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "paid_at"], name="crm_payment_status_paid_idx"),
+            models.Index(fields=["paid_at"], name="crm_payment_paid_idx"),
+        ]
+
     def __str__(self):
         return f"{self.invoice} {self.amount}"
 
 
+class StripeEvent(models.Model):
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("processed", "Processed"),
+        ("failed", "Failed"),
+    ]
+    event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=100, blank=True)
+    payload = models.JSONField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="crm_stripeevent_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} {self.event_id}"
+
+
 class Certificate(models.Model):
     STATUS_CHOICES = [
         ("pending", "Pending"),
@@ -677,6 +715,7 @@ class ScheduledEmail(models.Model):
     ]
     STATUS_CHOICES = [
         ("scheduled", "Scheduled"),
+        ("sending", "Sending"),
         ("sent", "Sent"),
         ("failed", "Failed"),
         ("cancelled", "Cancelled"),
@@ -694,15 +733,26 @@ class ScheduledEmail(models.Model):
     attempts = models.PositiveIntegerField(default=0)
     last_error = models.TextField(blank=True)
     sent_at = models.DateTimeField(null=True, blank=True)
+    claimed_by = models.CharField(max_length=120, blank=True)
+    claim_token = models.CharField(max_length=32, blank=True, db_index=True)
+    dedupe_key = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "scheduled_for"], name="crm_scheduled_due_idx"),
+        ]
+
     def __str__(self):
         return f"{self.status} {self.recipient_email}"
 
 
 class ReminderLog(models.Model):
     REMINDER_TYPES = [
+        ("lesson_48h", "Lesson 48h"),
         ("lesson_24h", "Lesson 24h"),
+        ("lesson_2h", "Lesson 2h"),
     ]
     lesson = models.ForeignKey(Lesson, null=True, blank=True, on_delete=models.CASCADE, related_name="reminder_logs")
     reminder_type = models.CharField(max_length=30, choices=REMINDER_TYPES)
@@ -776,11 +826,43 @@ class NotificationReceipt(models.Model):
 
     class Meta:
         unique_together = ("notification", "user")
+        indexes = [
+            models.Index(fields=["user", "read_at"], name="crm_receipt_unread_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user.get_username()} - {self.notification.title}"
 
 
+class ExportJob(models.Model):
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+    model_label = models.CharField(max_length=100)
+    object_ids = models.JSONField(default=list)
+    compress = models.BooleanField(default=True)
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name="export_jobs"
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    filename = models.CharField(max_length=200, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="crm_exportjob_status_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.model_label} export #{self.pk}"
+
+
 class Event(models.Model):
     title = models.CharField(max_length=200)
     start = models.DateTimeField()
@@ -851,6 +933,13 @@ class Blog(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Django renders is_published=True as a bare column test, which no backend can seek on, so the index
+            # follows the list's keyset order instead: the walk skips the few drafts and stops at the page size.
+            models.Index(fields=["published_at", "id"], name="crm_blog_published_idx"),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -866,6 +955,18 @@ class Blog(models.Model):
         super().save(*args, **kwargs)
 
 
+class BlogSearchTerm(models.Model):
+    blog = models.ForeignKey(Blog, on_delete=models.CASCADE, related_name="search_terms")
+    term = models.CharField(max_length=64)
+    weight = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("term", "blog")
+
+    def __str__(self):
+        return f"{self.term} {self.blog_id}"
+
+
 class BlogComment(models.Model):
     blog = models.ForeignKey(Blog, on_delete=models.CASCADE, related_name="comments")
     name = models.CharField(max_length=120)
@@ -943,3 +1044,39 @@ class Testimonial(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class DashboardSnapshot(models.Model):
+    key = models.CharField(max_length=50, unique=True, default="default")
+    data = models.JSONField(default=dict, blank=True)
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.key} {self.computed_at}"
+
+
+class LeadDailyRollup(models.Model):
+    day = models.DateField()
+    source = models.CharField(max_length=100, blank=True)
+    status = models.CharField(max_length=20, blank=True)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("day", "source", "status")
+
+    def __str__(self):
+        return f"{self.day} {self.source} {self.status}"
+
+
+class PaymentDailyRollup(models.Model):
+    day = models.DateField()
+    method = models.CharField(max_length=20, blank=True)
+    status = models.CharField(max_length=20, blank=True)
+    count = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ("day", "method", "status")
+
+    def __str__(self):
+        return f"{self.day} {self.method} {self.status}"
@@ -0,0 +1,106 @@
+import hashlib
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+CACHE_PREFIX = "crm:page"
+# Cached pages are rendered with this marker in place of the CSRF token and get the visitor's own token on
+# the way out, so forms on cached pages keep working.
+CSRF_PLACEHOLDER = "crm-page-cache-csrf-token"
+
+# Which page tags a model change invalidates.
+MODEL_TAGS = {
+    "crm.course": ("courses",),
+    "crm.blog": ("blogs",),
+    "crm.blogcomment": ("blog_comments",),
+    "crm.testimonial": ("testimonials",),
+    "crm.homeheroslide": ("hero_slides",),
+}
+
+
+def _tag_key(tag):
+    return f"{CACHE_PREFIX}:tag:{tag}"
+
+
+def _timeout():
+    return int(getattr(settings, "PUBLIC_PAGE_CACHE_SECONDS", 0))
+
+
+def invalidate_tags(*tags):
+    for tag in tags:
+        key = _tag_key(tag)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def invalidate_model(model):
+    invalidate_tags(*MODEL_TAGS.get(model._meta.label_lower, ()))
+
+
+def _page_key(request, tags, query_params):
+    versions = cache.get_many([_tag_key(tag) for tag in tags])
+    version_part = ".".join(str(versions.get(_tag_key(tag), 0)) for tag in tags)
+    query = urlencode(sorted((name, request.GET.get(name)) for name in query_params if request.GET.get(name)))
+    location = hashlib.md5(f"{request.path}?{query}".encode("utf-8")).hexdigest()
+    return f"{CACHE_PREFIX}:{location}:{version_part}"
+
+
+def csrf_placeholder(request):
+    """Context processor that swaps the CSRF token for a placeholder while a page is rendered for the cache."""
+    if getattr(request, "_page_cache_render", False):
+        return {"csrf_token": CSRF_PLACEHOLDER}
+    return {}
+
+
+def _respond(request, content, content_type):
+    response = HttpResponse(content.replace(CSRF_PLACEHOLDER.encode(), get_token(request).encode()), content_type=content_type)
+    response["Vary"] = "Cookie"
+    return response
+
+
+def cache_public_page(*tags, query_params=(), bypass_params=()):
+    """Cache a public page's full response for anonymous GET requests.
+
+    The cache key is the path, the values of ``query_params`` and the current version of each tag; saving or
+    deleting a model bumps its tags (see ``MODEL_TAGS``), which retires every page built from it. Other query
+    parameters, such as campaign tracking ones, share the cached page. Requests carrying any of
+    ``bypass_params`` are rendered live.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            timeout = _timeout()
+            if (
+                not timeout
+                or request.method not in ("GET", "HEAD")
+                or request.user.is_authenticated
+                or any(request.GET.get(name) for name in bypass_params)
+            ):
+                return view(request, *args, **kwargs)
+
+            key = _page_key(request, tags, query_params)
+            cached = cache.get(key)
+            if cached is not None:
+                return _respond(request, *cached)
+
+            request._page_cache_render = True
+            try:
+                response = view(request, *args, **kwargs)
+            finally:
+                request._page_cache_render = False
+            if response.status_code != 200 or response.streaming or response.cookies:
+                return response
+            content_type = response.get("Content-Type", "text/html; charset=utf-8")
+            cache.set(key, (response.content, content_type), timeout)
+            return _respond(request, response.content, content_type)
+
+        return wrapped
+
+    return decorator
@@ -0,0 +1,105 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+@dataclass
+class KeysetPage:
+    items: list
+    next_cursor: str = ""
+    previous_cursor: str = ""
+
+    @property
+    def has_other_pages(self):
+        return bool(self.next_cursor or self.previous_cursor)
+
+
+def _key(item, names):
+    return [getattr(item, name) for name in names]
+
+
+def _json_value(value):
+    # Full-precision ISO strings; DjangoJSONEncoder drops microseconds, which would skip rows on equal keys.
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_cursor(direction, values):
+    payload = json.dumps([direction, values], default=_json_value, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(model, names, cursor):
+    """Return ``(direction, values)`` from a cursor, or ``None`` when it is malformed or does not fit ``names``."""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        direction, raw_values = json.loads(payload)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        return None
+    if direction not in ("next", "previous") or not isinstance(raw_values, list) or len(raw_values) != len(names):
+        return None
+    values = []
+    for name, value in zip(names, raw_values):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Annotations such as a search rank are plain JSON numbers.
+            if not isinstance(value, (int, float)):
+                return None
+            values.append(value)
+            continue
+        try:
+            values.append(field.to_python(value))
+        except ValidationError:
+            return None
+    return direction, values
+
+
+def _after(ordering, values, reverse=False):
+    """Q matching rows strictly after ``values`` in ``ordering`` (before them when ``reverse``)."""
+    clauses = []
+    for index, (name, descending) in enumerate(ordering):
+        lookup = "lt" if descending != reverse else "gt"
+        equal = {prior: values[position] for position, (prior, _) in enumerate(ordering[:index])}
+        clauses.append(Q(**equal, **{f"{name}__{lookup}": values[index]}))
+    return reduce(or_, clauses)
+
+
+def keyset_page(queryset, ordering, cursor="", per_page=10):
+    """Return one :class:`KeysetPage` of ``queryset`` ordered by ``ordering``, e.g. ``("-published_at", "-id")``.
+
+    Pages are found by filtering on the last row seen instead of an OFFSET, so deep pages cost the same as the
+    first one. ``ordering`` must end with a unique column. An invalid cursor yields the first page.
+    """
+    ordering = [(name.lstrip("-"), name.startswith("-")) for name in ordering]
+    names = [name for name, _ in ordering]
+    decoded = decode_cursor(queryset.model, names, cursor) if cursor else None
+    direction, values = decoded or ("next", None)
+    backwards = direction == "previous"
+
+    order_by = [f"{'-' if descending != backwards else ''}{name}" for name, descending in ordering]
+    page = queryset.order_by(*order_by)
+    if values is not None:
+        page = page.filter(_after(ordering, values, reverse=backwards))
+    items = list(page[: per_page + 1])
+    has_more = len(items) > per_page
+    items = items[:per_page]
+    if backwards:
+        items.reverse()
+    if not items:
+        return KeysetPage(items)
+
+    has_next = (not backwards and has_more) or (backwards and values is not None)
+    has_previous = (backwards and has_more) or (not backwards and values is not None)
+    return KeysetPage(
+        items,
+        next_cursor=encode_cursor("next", _key(items[-1], names)) if has_next else "",
+        previous_cursor=encode_cursor("previous", _key(items[0], names)) if has_previous else "",
+    )
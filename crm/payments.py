@@ -0,0 +1,187 @@
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.template.loader import get_template
+from django.utils import timezone
+
+from .dashboard_cache import bump_model_version
+from .delivery import queue_email
+from .models import Invoice, Payment, StripeEvent
+
+logger = logging.getLogger(__name__)
+
+STRIPE_INBOX_LEASE_SECONDS = 300
+STRIPE_INBOX_MAX_RETRY_SECONDS = 3600
+
+
+def _send_payment_receipts(invoice):
+    enrollment = invoice.enrollment
+    student = enrollment.student
+    course_name = enrollment.session.course.name if enrollment.session else "Driving Course"
+
+    if student and student.email:
+        user_subject = "Payment Confirmation - Sams Driving School"
+        user_context = {
+            "student_name": f"{student.first_name} {student.last_name}".strip(),
+            "course_name": course_name,
+            "invoice_number": invoice.number,
+            "amount": f"{invoice.total_amount:.2f}",
+        }
+        user_html = get_template("emails/purchase_success_user.html").render(user_context)
+        queue_email(recipient_email=student.email, subject=user_subject, body=user_html, to_student=student, dedupe=True)
+
+    admin_email = getattr(settings, "ENROLLMENT_NOTIFICATION_EMAIL", "")
+    if admin_email:
+        admin_subject = f"New Payment Received - Invoice {invoice.number}"
+        admin_context = {
+            "student_name": f"{student.first_name} {student.last_name}".strip() if student else "Unknown",
+            "student_email": student.email if student else "Unknown",
+            "invoice_number": invoice.number,
+            "amount": f"{invoice.total_amount:.2f}",
+            "course_name": course_name,
+        }
+        admin_html = get_template("emails/purchase_success_admin.html").render(admin_context)
+        queue_email(recipient_email=admin_email, subject=admin_subject, body=admin_html, dedupe=True)
+
+
+def mark_invoice_paid(invoice_id, payment_intent_id, session_id):
+    """Mark an invoice paid, record its Stripe payment and send the receipts, once per payment intent.
+
+    Stripe reports one payment as both ``checkout.session.completed`` and ``payment_intent.succeeded`` and the
+    success redirect reports it a third time. The conditional UPDATE lets exactly one of them through; the rest
+    return ``False`` without saving the invoice or rendering any email. The claim, the Payment and the receipt
+    rows commit together, so a failure part-way leaves the invoice unclaimed for the next delivery to finish;
+    the receipts are only sent once that transaction commits.
+    """
+    if not invoice_id:
+        return False
+    changes = {"status": "paid"}
+    pending = Invoice.objects.filter(pk=invoice_id)
+    if payment_intent_id:
+        changes["stripe_payment_intent_id"] = payment_intent_id
+        pending = pending.exclude(status="paid", stripe_payment_intent_id=payment_intent_id)
+    else:
+        pending = pending.exclude(status="paid")
+    if session_id:
+        changes["stripe_checkout_session_id"] = session_id
+    with transaction.atomic():
+        if not pending.update(**changes):
+            return False
+        # update() sends no post_save, which is what normally expires the dashboard widgets.
+        transaction.on_commit(lambda: bump_model_version(Invoice))
+        if not payment_intent_id:
+            return True
+
+        invoice = Invoice.objects.select_related("enrollment__student", "enrollment__session__course").get(pk=invoice_id)
+        Payment.objects.get_or_create(
+            stripe_payment_intent_id=payment_intent_id,
+            defaults={
+                "invoice": invoice,
+                "amount": invoice.total_amount,
+                "paid_at": timezone.now(),
+                "method": "stripe",
+                "status": "completed",
+            },
+        )
+        _send_payment_receipts(invoice)
+    return True
+
+
+def apply_stripe_event(event):
+    event_type = event.get("type") or ""
+    data_object = event.get("data", {}).get("object", {})
+    if event_type == "checkout.session.completed":
+        invoice_id = data_object.get("metadata", {}).get("invoice_id")
+        mark_invoice_paid(invoice_id, data_object.get("payment_intent"), data_object.get("id"))
+    if event_type == "payment_intent.succeeded":
+        invoice_id = data_object.get("metadata", {}).get("invoice_id")
+        mark_invoice_paid(invoice_id, data_object.get("id"), "")
+
+
+def process_stripe_event(event):
+    """Apply one verified Stripe event; returns ``False`` when its id is already in the ledger.
+
+    The event and its ledger row commit together, so a delivery that failed part-way leaves nothing behind
+    and is retried by Stripe instead of being swallowed. Two deliveries racing past the check are harmless
+    because :func:`mark_invoice_paid` only lets one of them change anything.
+    """
+    event_id = event.get("id") or ""
+    if event_id and StripeEvent.objects.filter(event_id=event_id, status="processed").exists():
+        return False
+    with transaction.atomic():
+        apply_stripe_event(event)
+        if event_id:
+            StripeEvent.objects.update_or_create(
+                event_id=event_id,
+                defaults={"event_type": event.get("type") or "", "status": "processed", "processed_at": timezone.now()},
+            )
+    return True
+
+
+def enqueue_stripe_event(event):
+    """Store a verified event in the inbox for :func:`process_stripe_inbox`; returns ``False`` for a repeat."""
+    event_id = event.get("id") or f"local-{uuid.uuid4().hex}"
+    now = timezone.now()
+    _, created = StripeEvent.objects.get_or_create(
+        event_id=event_id,
+        defaults={
+            "event_type": event.get("type") or "",
+            "payload": event,
+            "status": "pending",
+            "received_at": now,
+            "next_attempt_at": now,
+        },
+    )
+    return created
+
+
+def _retry_delay(attempts):
+    base = int(getattr(settings, "STRIPE_INBOX_RETRY_SECONDS", 30))
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), STRIPE_INBOX_MAX_RETRY_SECONDS))
+
+
+def process_stripe_inbox(limit=100, now=None):
+    """Apply due inbox events in the order they arrived; returns ``(processed, failed)``.
+
+    Each event is claimed by bumping ``attempts`` with a conditional UPDATE that also pushes
+    ``next_attempt_at`` out by a lease, so concurrent workers never apply the same event and one that died
+    mid-event is picked up again once the lease lapses. A failing event backs off exponentially and is marked
+    ``failed`` after ``STRIPE_INBOX_MAX_ATTEMPTS``; it does not hold back the events behind it, which is safe
+    because applying a payment is idempotent. An event is applied in one transaction with its ``processed``
+    mark, so a retry re-applies everything a failed attempt rolled back.
+    """
+    now = now or timezone.now()
+    max_attempts = int(getattr(settings, "STRIPE_INBOX_MAX_ATTEMPTS", 8))
+    due = (
+        StripeEvent.objects.filter(status="pending", next_attempt_at__lte=now)
+        .order_by("received_at", "pk")
+        .values_list("pk", "attempts")[:limit]
+    )
+    processed = failed = 0
+    for pk, attempts in list(due):
+        claimed = StripeEvent.objects.filter(pk=pk, status="pending", attempts=attempts).update(
+            attempts=attempts + 1, next_attempt_at=now + timedelta(seconds=STRIPE_INBOX_LEASE_SECONDS)
+        )
+        if not claimed:
+            continue
+        event = StripeEvent.objects.get(pk=pk)
+        try:
+            # The event's effects and its "processed" mark commit together; a failure leaves neither behind.
+            with transaction.atomic():
+                apply_stripe_event(event.payload or {})
+                StripeEvent.objects.filter(pk=pk).update(status="processed", processed_at=timezone.now(), last_error="")
+        except Exception as exc:
+            logger.exception("Stripe inbox event %s failed (attempt %s)", event.event_id, event.attempts)
+            event.last_error = str(exc)
+            if event.attempts >= max_attempts:
+                event.status = "failed"
+            else:
+                event.next_attempt_at = timezone.now() + _retry_delay(event.attempts)
+            event.save(update_fields=["status", "last_error", "next_attempt_at"])
+            failed += 1
+            continue
+        processed += 1
+    return processed, failed
@@ -0,0 +1,109 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+HST_RATE = Decimal("0.13")
+CENT = Decimal("0.01")
+
+
+def parse_amount(value):
+    """Parse a fee amount such as ``"$1,234.50 +HST"``; returns None for blanks and raises on garbage."""
+    if value is None:
+        return None
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, (int, float)):
+        return Decimal(str(value))
+    if isinstance(value, str):
+        cleaned = value.strip().replace("$", "").replace(",", "")
+        for token in ("+HST", "HST"):
+            cleaned = cleaned.replace(token, "")
+        cleaned = cleaned.strip()
+        if not cleaned:
+            return None
+        return Decimal(cleaned)
+    return None
+
+
+def _safe_amount(value):
+    try:
+        return parse_amount(value)
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+
+
+def invalid_fee_fields(fees):
+    """Names of ``fees`` amount entries that are present but cannot be parsed."""
+    fees = fees if isinstance(fees, dict) else {}
+    invalid = []
+    for name in ("total", "hst_amount"):
+        try:
+            parse_amount(fees.get(name))
+        except (InvalidOperation, TypeError, ValueError):
+            invalid.append(name)
+    return invalid
+
+
+def course_pricing(price, fees):
+    """Return ``(hst_amount, total, display)`` for a course price and its ``fees`` overrides.
+
+    Amounts given in ``fees`` win over the ones derived from ``price``; unparsable overrides are ignored.
+    ``display`` holds the strings the course pages show.
+    """
+    base = Decimal(price or 0).quantize(CENT, rounding=ROUND_HALF_UP)
+    hst_amount = (base * HST_RATE).quantize(CENT, rounding=ROUND_HALF_UP)
+    total = (base + hst_amount).quantize(CENT, rounding=ROUND_HALF_UP)
+
+    fees = fees if isinstance(fees, dict) else {}
+    parsed_total = _safe_amount(fees.get("total"))
+    parsed_hst = _safe_amount(fees.get("hst_amount"))
+    effective_total = (parsed_total if parsed_total is not None else total).quantize(CENT, rounding=ROUND_HALF_UP)
+    effective_hst = (parsed_hst if parsed_hst is not None else hst_amount).quantize(CENT, rounding=ROUND_HALF_UP)
+
+    display = {
+        "regular": fees.get("regular") or f"${base:.2f} +HST",
+        "promotion_savings": fees.get("promotion_savings") or "0$ +HST",
+        "pay_only": fees.get("pay_only") or f"${base:.2f} +HST",
+        "hst_rate_percent": fees.get("hst_rate_percent") or "13%",
+        "hst_amount": f"{effective_hst:.2f}",
+        "total": f"{effective_total:.2f}",
+    }
+    return effective_hst, effective_total, display
+
+
+def normalize_features(raw, session="", hours_theory=0, hours_homework=0, hours_incar=0):
+    """Flatten the ``features`` JSON into ``[{"label", "value"}]``, falling back to the course hours."""
+    normalized = []
+
+    def _add(label, value):
+        label = (label or "").strip()
+        value = (value or "").strip()
+        if not label or not value:
+            return
+        normalized.append({"label": label, "value": value})
+
+    if isinstance(raw, dict):
+        for k, v in raw.items():
+            _add(str(k), str(v))
+    elif isinstance(raw, (list, tuple)):
+        for item in raw:
+            if isinstance(item, dict):
+                label = item.get("label") or item.get("title") or item.get("name") or ""
+                value = item.get("value") or item.get("text") or item.get("subtitle") or ""
+                _add(str(label), str(value))
+            elif isinstance(item, (list, tuple)) and len(item) >= 2:
+                _add(str(item[0]), str(item[1]))
+            elif isinstance(item, str):
+                _add("Feature", item)
+
+    if normalized:
+        return normalized
+
+    if session:
+        _add("Session", session)
+    if hours_theory:
+        _add("Theory", f"{hours_theory} Hours")
+    if hours_homework:
+        _add("Homework", f"{hours_homework} Hours")
+    if hours_incar:
+        _add("In-Car", f"{hours_incar} Hours")
+
+    return normalized
@@ -0,0 +1,115 @@
+import json
+import re
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .identity import normalize_email, normalize_phone
+from .models import (
+    Blog,
+    Course,
+    Lead,
+    Lesson,
+    LessonRequest,
+    NotificationReceipt,
+    Payment,
+    ScheduledEmail,
+    Student,
+)
+
+POSTGRES_SEQ_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+def _hot_queries():
+    """``(name, queryset)`` for the filters the site and the schedulers run most, shaped as the code runs them."""
+    now = timezone.now()
+    day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    month_start = day_start.replace(day=1)
+    week_end = day_start + timedelta(days=7)
+    claimable = Q(status="scheduled") | Q(status="sending", lease_expires_at__lt=now)
+    return [
+        ("delivery: due scheduled emails", ScheduledEmail.objects.filter(claimable, scheduled_for__lte=now).order_by("pk")),
+        (
+            "booking: instructor calendar",
+            Lesson.objects.filter(instructor_id=1, start_time__lt=week_end, end_time__gt=day_start),
+        ),
+        (
+            "dashboard: upcoming lessons",
+            Lesson.objects.filter(status="scheduled", start_time__gte=day_start, start_time__lt=week_end),
+        ),
+        (
+            "conflicts: lesson window",
+            Lesson.objects.filter(
+                Q(end_time__gt=day_start) | Q(end_time__isnull=True, start_time__gt=day_start - timedelta(hours=1)),
+                start_time__lt=week_end,
+            ),
+        ),
+        ("dashboard: leads this month", Lead.objects.filter(created_at__gte=month_start)),
+        ("rollups: lead day", Lead.objects.filter(created_at__gte=day_start, created_at__lt=day_start + timedelta(days=1))),
+        ("dashboard: revenue this month", Payment.objects.filter(status="completed", paid_at__gte=month_start)),
+        (
+            "dashboard: recent payments",
+            Payment.objects.filter(status="completed").order_by("-paid_at")[:5],
+        ),
+        ("rollups: payment day", Payment.objects.filter(paid_at__gte=day_start, paid_at__lt=day_start + timedelta(days=1))),
+        ("notifications: unread count", NotificationReceipt.objects.filter(user_id=1, read_at__isnull=True)),
+        (
+            "blog: published list",
+            Blog.objects.filter(is_published=True).order_by("-published_at", "-id")[:11],
+        ),
+        (
+            "courses: active listing",
+            Course.objects.filter(active=True).order_by("display_order", "name"),
+        ),
+        ("enrollment: student by email", Student.objects.filter(email="student@example.com")),
+        ("identity: student by email key", Student.objects.filter(email_key=normalize_email("student@example.com"))),
+        ("identity: lead by email key", Lead.objects.filter(email_key=normalize_email("lead@example.com"))),
+        ("identity: lead by phone key", Lead.objects.filter(phone_key=normalize_phone("416 555 0100"))),
+        (
+            "identity: lead by email or phone",
+            Lead.objects.filter(
+                Q(email_key=normalize_email("lead@example.com"))
+                | Q(phone_key=normalize_phone("416 555 0100"), first_name__iexact="Lead")
+            ),
+        ),
+        ("scheduler: new lesson requests", LessonRequest.objects.filter(status="new").order_by("created_at")),
+    ]
+
+
+def _mysql_full_scans(node):
+    """Tables read with ``access_type: ALL``, including ones with ``possible_keys`` the optimizer chose not to use."""
+    scans = []
+    if isinstance(node, dict):
+        if node.get("access_type") == "ALL":
+            scans.append(node.get("table_name", "?"))
+        for value in node.values():
+            scans.extend(_mysql_full_scans(value))
+    elif isinstance(node, list):
+        for value in node:
+            scans.extend(_mysql_full_scans(value))
+    return scans
+
+
+def explain(queryset):
+    """Return ``(plan, full_scans)``: the backend's EXPLAIN output and the tables it reads in full."""
+    vendor = connection.vendor
+    if vendor == "mysql":
+        plan = queryset.explain(format="json")
+        return plan, _mysql_full_scans(json.loads(plan))
+    plan = queryset.explain()
+    if vendor == "sqlite":
+        scans = []
+        for line in plan.splitlines():
+            detail = line.split(" ", 3)[-1]
+            # "SCAN t USING [COVERING] INDEX i" walks an index; a bare "SCAN t" reads the whole table.
+            if detail.startswith("SCAN ") and "USING" not in detail and "CONSTANT ROW" not in detail:
+                scans.append(detail.split()[-1] if " AS " not in detail else detail.split()[1])
+        return plan, scans
+    return plan, POSTGRES_SEQ_SCAN.findall(plan)
+
+
+def check_query_plans():
+    """EXPLAIN every hot query; returns ``[(name, plan, full_scans)]``."""
+    return [(name, *explain(queryset)) for name, queryset in _hot_queries()]
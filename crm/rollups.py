@@ -0,0 +1,201 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Lead, LeadDailyRollup, Payment, PaymentDailyRollup
+
+
+def _local_day(value):
+    if not value:
+        return None
+    if timezone.is_aware(value):
+        return timezone.localtime(value).date()
+    return value.date()
+
+
+def _day_bounds(day):
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(day, time.min), tz)
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+def record_lead_created(lead):
+    day = _local_day(lead.created_at)
+    if not day:
+        return
+    rollup, created = LeadDailyRollup.objects.get_or_create(
+        day=day, source=lead.source or "", status=lead.status or "", defaults={"count": 1}
+    )
+    if not created:
+        LeadDailyRollup.objects.filter(pk=rollup.pk).update(count=F("count") + 1)
+
+
+def record_payment_created(payment):
+    day = _local_day(payment.paid_at)
+    if not day:
+        return
+    amount = Decimal(payment.amount or 0)
+    rollup, created = PaymentDailyRollup.objects.get_or_create(
+        day=day,
+        method=payment.method or "",
+        status=payment.status or "",
+        defaults={"count": 1, "total": amount},
+    )
+    if not created:
+        PaymentDailyRollup.objects.filter(pk=rollup.pk).update(count=F("count") + 1, total=F("total") + amount)
+
+
+def _replace_day(model, day, rollups, keys, update_fields):
+    """Make ``day``'s rollup rows exactly ``rollups`` without deleting rows another refresh may re-insert.
+
+    Deleting the day and inserting it again lets two concurrent refreshes both insert the same key and fail
+    on the unique constraint. Upserting the rows that exist and deleting only keys that are gone never does.
+    """
+    features = connections[router.db_for_write(model)].features
+    with transaction.atomic():
+        if rollups:
+            model.objects.bulk_create(
+                rollups,
+                update_conflicts=True,
+                # MySQL upserts on any unique key and rejects naming one.
+                unique_fields=["day", *keys] if features.supports_update_conflicts_with_target else None,
+                update_fields=update_fields,
+            )
+        present = {tuple(getattr(rollup, key) for key in keys) for rollup in rollups}
+        stale = [
+            pk
+            for pk, *key in model.objects.filter(day=day).values_list("pk", *keys)
+            if tuple(key) not in present
+        ]
+        if stale:
+            model.objects.filter(pk__in=stale).delete()
+
+
+def refresh_lead_day(day):
+    start, end = _day_bounds(day)
+    rows = (
+        Lead.objects.filter(created_at__gte=start, created_at__lt=end)
+        .values("source", "status")
+        .annotate(count=Count("id"))
+    )
+    _replace_day(
+        LeadDailyRollup,
+        day,
+        [
+            LeadDailyRollup(day=day, source=row["source"] or "", status=row["status"] or "", count=row["count"])
+            for row in rows
+        ],
+        ("source", "status"),
+        ["count"],
+    )
+
+
+def refresh_payment_day(day):
+    start, end = _day_bounds(day)
+    rows = (
+        Payment.objects.filter(paid_at__gte=start, paid_at__lt=end)
+        .values("method", "status")
+        .annotate(count=Count("id"), total=Sum("amount"))
+    )
+    _replace_day(
+        PaymentDailyRollup,
+        day,
+        [
+            PaymentDailyRollup(
+                day=day,
+                method=row["method"] or "",
+                status=row["status"] or "",
+                count=row["count"],
+                total=row["total"] or 0,
+            )
+            for row in rows
+        ],
+        ("method", "status"),
+        ["count", "total"],
+    )
+
+
+def remember_lead_day(lead):
+    """Note the day a stored lead is counted under, so an edit that moves it also fixes the day it left."""
+    stored = Lead.objects.filter(pk=lead.pk).values_list("created_at", flat=True).first() if lead.pk else None
+    lead._rollup_day = _local_day(stored)
+
+
+def remember_payment_day(payment):
+    """Note the day a stored payment is counted under, so an edit to ``paid_at`` also fixes the day it left."""
+    stored = Payment.objects.filter(pk=payment.pk).values_list("paid_at", flat=True).first() if payment.pk else None
+    payment._rollup_day = _local_day(stored)
+
+
+def lead_changed(lead, created=False):
+    if created:
+        record_lead_created(lead)
+        return
+    for day in {_local_day(lead.created_at), getattr(lead, "_rollup_day", None)} - {None}:
+        refresh_lead_day(day)
+
+
+def payment_changed(payment, created=False):
+    if created:
+        record_payment_created(payment)
+        return
+    for day in {_local_day(payment.paid_at), getattr(payment, "_rollup_day", None)} - {None}:
+        refresh_payment_day(day)
+
+
+def rebuild_lead_rollups():
+    buckets = {}
+    for created_at, source, status in Lead.objects.values_list("created_at", "source", "status").iterator():
+        day = _local_day(created_at)
+        if day:
+            key = (day, source or "", status or "")
+            buckets[key] = buckets.get(key, 0) + 1
+    with transaction.atomic():
+        LeadDailyRollup.objects.all().delete()
+        LeadDailyRollup.objects.bulk_create(
+            [LeadDailyRollup(day=day, source=source, status=status, count=count) for (day, source, status), count in buckets.items()],
+            batch_size=500,
+        )
+    return len(buckets)
+
+
+def rebuild_payment_rollups():
+    buckets = {}
+    for paid_at, method, status, amount in Payment.objects.values_list("paid_at", "method", "status", "amount").iterator():
+        day = _local_day(paid_at)
+        if day:
+            count, total = buckets.get((day, method or "", status or ""), (0, Decimal("0")))
+            buckets[(day, method or "", status or "")] = (count + 1, total + (amount or 0))
+    with transaction.atomic():
+        PaymentDailyRollup.objects.all().delete()
+        PaymentDailyRollup.objects.bulk_create(
+            [
+                PaymentDailyRollup(day=day, method=method, status=status, count=count, total=total)
+                for (day, method, status), (count, total) in buckets.items()
+            ],
+            batch_size=500,
+        )
+    return len(buckets)
+
+
+def leads_by_month(since=None):
+    qs = LeadDailyRollup.objects.all()
+    if since:
+        qs = qs.filter(day__gte=_local_day(since))
+    return list(
+        qs.annotate(month=TruncMonth("day")).values("month").annotate(value=Sum("count")).order_by("month")
+    )
+
+
+def revenue_by_month(since=None, status="completed"):
+    qs = PaymentDailyRollup.objects.filter(status=status)
+    if since:
+        qs = qs.filter(day__gte=_local_day(since))
+    return list(
+        qs.annotate(month=TruncMonth("day")).values("month").annotate(value=Sum("total")).order_by("month")
+    )
@@ -0,0 +1,279 @@
+import re
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .booking import book_lessons, lesson_errors
+from .conflicts import load_lesson_intervals
+from .models import Instructor, Lesson, LessonRequest, Student, Vehicle
+
+TIME_WINDOWS = {
+    "morning": (8, 12),
+    "afternoon": (12, 17),
+    "evening": (17, 21),
+}
+TIME_PATTERN = re.compile(r"(\d{1,2})(?::(\d{2}))?\s*([ap])?\.?m?\.?", re.IGNORECASE)
+
+
+def _setting(name, default):
+    return int(getattr(settings, name, default))
+
+
+def _location_key(value):
+    return (value or "").split(",")[0].strip().lower()
+
+
+class AvailabilityBitmap:
+    """Busy time slots per resource and day, stored as one integer bitmask each.
+
+    Bit ``i`` of a day's mask is the ``i``-th slot of the working day, so checking whether a lesson fits is a
+    single ``&`` against the mask of the slots it covers.
+    """
+
+    def __init__(self, day_start_hour, day_end_hour, slot_minutes):
+        self.day_start_hour = day_start_hour
+        self.slot_minutes = slot_minutes
+        self.slots_per_day = (day_end_hour - day_start_hour) * 60 // slot_minutes
+        self.busy = {}
+
+    def slot_datetime(self, day, slot):
+        minutes = self.day_start_hour * 60 + slot * self.slot_minutes
+        naive = datetime.combine(day, time()) + timedelta(minutes=minutes)
+        return timezone.make_aware(naive, timezone.get_current_timezone())
+
+    def lesson_mask(self, slot, length):
+        return ((1 << length) - 1) << slot
+
+    def mark(self, key, start, end):
+        start = timezone.localtime(start)
+        end = timezone.localtime(end)
+        day = start.date()
+        origin = self.day_start_hour * 3600
+        slot_seconds = self.slot_minutes * 60
+        start_seconds = start.hour * 3600 + start.minute * 60 + start.second
+        if end.date() == day:
+            end_seconds = end.hour * 3600 + end.minute * 60 + end.second + (1 if end.microsecond else 0)
+        else:
+            end_seconds = 24 * 3600
+        first = max((start_seconds - origin) // slot_seconds, 0)
+        last = min(-(-(end_seconds - origin) // slot_seconds), self.slots_per_day)
+        if last > first:
+            self.reserve(key, day, self.lesson_mask(first, last - first))
+
+    def day_mask(self, key, day):
+        return self.busy.get((key, day), 0)
+
+    def reserve(self, key, day, mask):
+        self.busy[(key, day)] = self.busy.get((key, day), 0) | mask
+
+
+def candidate_slots(preferred_time, bitmap, length):
+    """Start slots to try for a free-text preferred time, best match first."""
+    last_start = bitmap.slots_per_day - length
+    if last_start < 0:
+        return []
+    every_slot = list(range(last_start + 1))
+    text = (preferred_time or "").strip().lower()
+    if not text:
+        return every_slot
+
+    for label, (start_hour, end_hour) in TIME_WINDOWS.items():
+        if label in text:
+            first = max((start_hour - bitmap.day_start_hour) * 60 // bitmap.slot_minutes, 0)
+            stop = min((end_hour - bitmap.day_start_hour) * 60 // bitmap.slot_minutes - length, last_start)
+            return list(range(first, stop + 1))
+
+    match = TIME_PATTERN.search(text)
+    if not match:
+        return every_slot
+    hour = int(match.group(1)) % 24
+    minute = int(match.group(2) or 0)
+    meridiem = (match.group(3) or "").lower()
+    if meridiem == "p" and hour < 12:
+        hour += 12
+    elif meridiem == "a" and hour == 12:
+        hour = 0
+    elif not meridiem and hour < bitmap.day_start_hour:
+        # "after 5" means the afternoon, not before opening.
+        hour += 12
+    preferred = ((hour - bitmap.day_start_hour) * 60 + minute) // bitmap.slot_minutes
+    # Closest slots to the requested time first, earlier before later on ties.
+    return sorted(every_slot, key=lambda slot: (abs(slot - preferred), slot))
+
+
+def plan_lesson_requests(requests, now=None):
+    """Place lesson requests on instructor and vehicle calendars without writing anything.
+
+    Requests are placed greedily in order of preferred date then age. Each one takes the first day from its
+    preferred date onwards and the first slot matching its preferred time where the student, an instructor
+    and a vehicle are all free; instructors near the student and vehicles near the instructor are tried
+    first, then the least busy ones. Existing lessons are loaded once and tracked in an
+    :class:`AvailabilityBitmap`. Returns ``(placements, unplaced)`` where ``unplaced`` holds
+    ``(request, reason)`` pairs.
+    """
+    now = now or timezone.now()
+    slot_minutes = _setting("AUTO_SCHEDULE_SLOT_MINUTES", 30)
+    bitmap = AvailabilityBitmap(
+        _setting("AUTO_SCHEDULE_DAY_START_HOUR", 8), _setting("AUTO_SCHEDULE_DAY_END_HOUR", 20), slot_minutes
+    )
+    lesson_minutes = _setting("AUTO_SCHEDULE_LESSON_MINUTES", 60)
+    length = -(-lesson_minutes // slot_minutes)
+    search_days = _setting("AUTO_SCHEDULE_SEARCH_DAYS", 7)
+
+    requests = list(requests)
+    placements = []
+    unplaced = []
+    if not requests:
+        return placements, unplaced
+
+    emails = {request.email.strip().lower() for request in requests if request.email}
+    students = {}
+    for student in Student.objects.annotate(email_lower=Lower("email")).filter(email_lower__in=emails).order_by("pk"):
+        students.setdefault(student.email_lower, student)
+
+    instructors = list(Instructor.objects.filter(active=True).only("pk", "home_location").order_by("pk"))
+    vehicles = list(Vehicle.objects.filter(active=True).only("pk", "location").order_by("pk"))
+    if not instructors or not vehicles:
+        reason = "No active instructors." if not instructors else "No active vehicles."
+        return placements, [(request, reason) for request in requests]
+
+    today = timezone.localdate(now)
+    first_day = today + timedelta(days=1)
+
+    def first_candidate_day(request):
+        return max(request.preferred_date or first_day, first_day)
+
+    requests.sort(key=lambda request: (first_candidate_day(request), request.created_at or now, request.pk or 0))
+    window_start = bitmap.slot_datetime(first_candidate_day(requests[0]), 0)
+    window_end = bitmap.slot_datetime(max(first_candidate_day(r) for r in requests) + timedelta(days=search_days), 0)
+
+    for row in load_lesson_intervals(window_start, window_end):
+        for key in (("student", row["student_id"]), ("instructor", row["instructor_id"]), ("vehicle", row["vehicle_id"])):
+            if key[1]:
+                bitmap.mark(key, row["start_time"], row["end_time"])
+
+    # Vehicle search order per instructor location: vehicles kept at that location first, then the rest.
+    vehicle_order = {}
+    for instructor in instructors:
+        location = _location_key(instructor.home_location)
+        if location not in vehicle_order:
+            nearby = [v for v in vehicles if location and _location_key(v.location) == location]
+            vehicle_order[location] = nearby + [v for v in vehicles if v not in nearby]
+
+    for request in requests:
+        email = (request.email or "").strip().lower()
+        student = students.get(email)
+        student_key = ("student", student.pk) if student else ("request", email or request.pk or id(request))
+        home = _location_key(student.preferred_location or student.city) if student else ""
+        slots = candidate_slots(request.preferred_time, bitmap, length)
+        placed = None
+        day = first_candidate_day(request)
+        for _ in range(search_days):
+            student_busy = bitmap.day_mask(student_key, day)
+            vehicle_busy = {vehicle.pk: bitmap.day_mask(("vehicle", vehicle.pk), day) for vehicle in vehicles}
+            ranked_instructors = sorted(
+                ((bitmap.day_mask(("instructor", i.pk), day), i) for i in instructors),
+                key=lambda pair: (
+                    not home or _location_key(pair[1].home_location) != home,
+                    bin(pair[0]).count("1"),
+                    pair[1].pk,
+                ),
+            )
+            for slot in slots:
+                mask = bitmap.lesson_mask(slot, length)
+                if student_busy & mask:
+                    continue
+                for instructor_busy, instructor in ranked_instructors:
+                    if instructor_busy & mask:
+                        continue
+                    vehicle = next(
+                        (
+                            v
+                            for v in vehicle_order[_location_key(instructor.home_location)]
+                            if not vehicle_busy[v.pk] & mask
+                        ),
+                        None,
+                    )
+                    if vehicle is not None:
+                        placed = (instructor, vehicle, day, mask, bitmap.slot_datetime(day, slot))
+                        break
+                if placed:
+                    break
+            if placed:
+                break
+            day += timedelta(days=1)
+
+        if not placed:
+            unplaced.append((request, f"No free instructor and vehicle within {search_days} day(s)."))
+            continue
+        instructor, vehicle, day, mask, start_time = placed
+        for key in (student_key, ("instructor", instructor.pk), ("vehicle", vehicle.pk)):
+            bitmap.reserve(key, day, mask)
+        placements.append(
+            {
+                "request": request,
+                "student": student,
+                "instructor": instructor,
+                "vehicle": vehicle,
+                "start_time": start_time,
+                "end_time": start_time + timedelta(minutes=lesson_minutes),
+            }
+        )
+    return placements, unplaced
+
+
+def _student_for_request(request):
+    names = request.name.split()
+    return Student.objects.create(
+        first_name=names[0] if names else request.email,
+        last_name=" ".join(names[1:]),
+        email=request.email,
+        phone=request.phone,
+    )
+
+
+def schedule_lesson_requests(requests, now=None, apply=False):
+    """Plan lesson requests and, with ``apply``, book the placements and mark the requests scheduled.
+
+    Requesters without a student record get one created from the request. Placements that still fail the
+    booking rules (such as the unpaid-lesson limit) are moved to ``unplaced``. Returns ``(placements, unplaced)``.
+    """
+    placements, unplaced = plan_lesson_requests(requests, now=now)
+    if not apply or not placements:
+        return placements, unplaced
+
+    with transaction.atomic():
+        created_students = {}
+        for placement in placements:
+            if placement["student"] is None:
+                email = placement["request"].email.strip().lower()
+                if email not in created_students:
+                    created_students[email] = _student_for_request(placement["request"])
+                placement["student"] = created_students[email]
+
+        lessons = [
+            Lesson(
+                student=placement["student"],
+                instructor=placement["instructor"],
+                vehicle=placement["vehicle"],
+                start_time=placement["start_time"],
+                end_time=placement["end_time"],
+                lesson_type="driving",
+                notes=placement["request"].notes,
+            )
+            for placement in placements
+        ]
+        errors = lesson_errors(lessons)
+        booked = []
+        for index, placement in enumerate(placements):
+            if index in errors:
+                unplaced.append((placement["request"], " ".join(errors[index])))
+            else:
+                placement["lesson"] = lessons[index]
+                booked.append(placement)
+        book_lessons([placement["lesson"] for placement in booked])
+        LessonRequest.objects.filter(pk__in=[placement["request"].pk for placement in booked]).update(status="scheduled")
+    return booked, unplaced
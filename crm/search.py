@@ -0,0 +1,170 @@
+import html
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, Count, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils.html import strip_tags
+
+from .models import Blog, BlogSearchTerm
+
+FTS_TABLE = "crm_blog_fts"
+FIELD_WEIGHTS = (("title", 5), ("summary", 2), ("content", 1))
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have how i if in into is it its of on or our so that the their "
+    "then there these they this to was we were what when which who will with you your".split()
+)
+SUFFIXES = ("ingly", "edly", "ings", "ing", "ies", "ied", "ers", "er", "ed", "es", "ly", "s")
+
+
+def plain_text(value):
+    return html.unescape(strip_tags(value or ""))
+
+
+def stem(word):
+    """Light suffix stripping so "driving", "drives" and "drivers" share one index term."""
+    if len(word) <= 3 or word.isdigit():
+        return word
+    for suffix in SUFFIXES:
+        if not word.endswith(suffix) or len(word) - len(suffix) < 3:
+            continue
+        if suffix == "s" and word.endswith("ss"):
+            return word
+        if suffix == "es" and not word[:-2].endswith(("s", "x", "z", "ch", "sh")):
+            continue
+        word = word[: -len(suffix)]
+        if suffix in ("ies", "ied"):
+            return word + "y"
+        break
+    return word[:-1] if word.endswith("e") and len(word) > 4 else word
+
+
+def tokenize(text):
+    return [stem(word) for word in WORD_PATTERN.findall(text.lower()) if word not in STOPWORDS and len(word) > 1]
+
+
+def blog_terms(blog):
+    weights = Counter()
+    for field, weight in FIELD_WEIGHTS:
+        for term in tokenize(plain_text(getattr(blog, field))):
+            weights[term[:64]] += weight
+    return weights
+
+
+@lru_cache(maxsize=None)
+def _fts_available():
+    return connection.vendor == "sqlite" and FTS_TABLE in connection.introspection.table_names()
+
+
+def index_blog(blog):
+    """Replace a blog's inverted index rows (and its FTS5 row on SQLite)."""
+    BlogSearchTerm.objects.filter(blog=blog).delete()
+    BlogSearchTerm.objects.bulk_create(
+        [BlogSearchTerm(blog=blog, term=term, weight=weight) for term, weight in blog_terms(blog).items()],
+        batch_size=500,
+    )
+    if _fts_available():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [blog.pk])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, summary, content) VALUES (%s, %s, %s, %s)",
+                [blog.pk, blog.title, plain_text(blog.summary), plain_text(blog.content)],
+            )
+
+
+def unindex_blog(blog_id):
+    if _fts_available():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [blog_id])
+
+
+def rebuild_index():
+    """Rebuild every blog's index rows; returns the number of blogs indexed."""
+    count = 0
+    for blog in Blog.objects.iterator(chunk_size=200):
+        index_blog(blog)
+        count += 1
+    return count
+
+
+def _unranked(blogs):
+    """Give results without a relevance score the same ``search_rank`` annotation and order as ranked ones."""
+    return blogs.annotate(search_rank=Value(0.0, output_field=FloatField())).order_by("-search_rank", "-published_at")
+
+
+def _index_search(blogs, terms):
+    document_frequency = dict(
+        BlogSearchTerm.objects.filter(term__in=terms).values_list("term").annotate(blogs=Count("blog_id"))
+    )
+    if len(document_frequency) < len(terms):
+        # Every term must match; one that appears nowhere rules out all posts.
+        return _unranked(blogs.none())
+    total = max(Blog.objects.count(), 1)
+    score = Sum(
+        Case(
+            *[
+                When(term=term, then=F("weight") * Value(math.log(1 + total / frequency)))
+                for term, frequency in document_frequency.items()
+            ],
+            output_field=FloatField(),
+        )
+    )
+    matches = BlogSearchTerm.objects.filter(term__in=terms).values("blog_id")
+    complete = matches.annotate(matched=Count("term")).filter(matched=len(terms)).values("blog_id")
+    rank = matches.filter(blog_id=OuterRef("pk")).annotate(score=score).values("score")[:1]
+    return (
+        blogs.filter(pk__in=complete)
+        .annotate(search_rank=Subquery(rank, output_field=FloatField()))
+        .order_by("-search_rank", "-published_at")
+    )
+
+
+def _native_search(blogs, query, terms):
+    if connection.vendor == "mysql":
+        match = "MATCH (crm_blog.title, crm_blog.summary, crm_blog.content) AGAINST (%s IN NATURAL LANGUAGE MODE)"
+        return (
+            blogs.annotate(search_rank=RawSQL(match, (query,), output_field=FloatField()))
+            .filter(search_rank__gt=0)
+            .order_by("-search_rank", "-published_at")
+        )
+    if _fts_available():
+        words = " ".join(f'"{word}"' for word in WORD_PATTERN.findall(query.lower()))
+        if not words:
+            return _unranked(blogs.none())
+        rank = RawSQL(
+            f"(SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = crm_blog.id)",
+            (words,),
+            output_field=FloatField(),
+        )
+        return (
+            blogs.filter(pk__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", (words,)))
+            .annotate(search_rank=rank)
+            .order_by("-search_rank", "-published_at")
+        )
+    return None
+
+
+def search_blogs(blogs, query):
+    """Filter ``blogs`` to posts matching ``query``, best match first.
+
+    BLOG_SEARCH_BACKEND picks the strategy: ``index`` (the BlogSearchTerm inverted index), ``native`` (MySQL
+    FULLTEXT or SQLite FTS5), ``like`` (substring scans) or ``auto``, which uses the index once it has been
+    built and otherwise falls back to native full-text search, then to substring scans. Every result carries a
+    ``search_rank`` annotation; unranked strategies give each post ``0.0``.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return _unranked(blogs.none())
+    backend = getattr(settings, "BLOG_SEARCH_BACKEND", "auto")
+    if backend == "index" or (backend == "auto" and BlogSearchTerm.objects.exists()):
+        return _index_search(blogs, terms)
+    if backend in ("native", "auto"):
+        results = _native_search(blogs, query, terms)
+        if results is not None:
+            return results
+    return _unranked(blogs.filter(Q(title__icontains=query) | Q(summary__icontains=query) | Q(content__icontains=query)))
@@ -0,0 +1,109 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import rollups
+from .dashboard_cache import bump_model_version
+from .journal import record_lesson_change
+from .models import (
+    Blog,
+    BlogComment,
+    Course,
+    CourseSession,
+    Enrollment,
+    HomeHeroSlide,
+    Invoice,
+    Lead,
+    Lesson,
+    Payment,
+    Testimonial,
+)
+from .page_cache import invalidate_model
+from .search import index_blog, unindex_blog
+
+
+@receiver(pre_save, sender=Lead)
+def remember_lead_rollup_day(sender, instance, raw=False, **kwargs):
+    if not raw:
+        rollups.remember_lead_day(instance)
+
+
+@receiver(post_save, sender=Lead)
+def update_lead_rollups(sender, instance, created=False, raw=False, **kwargs):
+    if not raw:
+        rollups.lead_changed(instance, created=created)
+
+
+@receiver(post_delete, sender=Lead)
+def remove_lead_from_rollups(sender, instance, **kwargs):
+    rollups.lead_changed(instance)
+
+
+@receiver(pre_save, sender=Payment)
+def remember_payment_rollup_day(sender, instance, raw=False, **kwargs):
+    if not raw:
+        rollups.remember_payment_day(instance)
+
+
+@receiver(post_save, sender=Payment)
+def update_payment_rollups(sender, instance, created=False, raw=False, **kwargs):
+    if not raw:
+        rollups.payment_changed(instance, created=created)
+
+
+@receiver(post_delete, sender=Payment)
+def remove_payment_from_rollups(sender, instance, **kwargs):
+    rollups.payment_changed(instance)
+
+
+@receiver(post_save, sender=Lesson)
+def journal_lesson_save(sender, instance, created=False, raw=False, **kwargs):
+    if not raw:
+        record_lesson_change(instance.pk, "created" if created else "updated")
+
+
+@receiver(post_delete, sender=Lesson)
+def journal_lesson_delete(sender, instance, **kwargs):
+    record_lesson_change(instance.pk, "deleted")
+
+
+@receiver(post_save, sender=Lead)
+@receiver(post_save, sender=Invoice)
+@receiver(post_save, sender=Payment)
+@receiver(post_save, sender=Lesson)
+@receiver(post_save, sender=Enrollment)
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=CourseSession)
+@receiver(post_delete, sender=Lead)
+@receiver(post_delete, sender=Invoice)
+@receiver(post_delete, sender=Payment)
+@receiver(post_delete, sender=Lesson)
+@receiver(post_delete, sender=Enrollment)
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=CourseSession)
+def invalidate_dashboard_widgets(sender, **kwargs):
+    bump_model_version(sender)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=Blog)
+@receiver(post_save, sender=BlogComment)
+@receiver(post_save, sender=Testimonial)
+@receiver(post_save, sender=HomeHeroSlide)
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=Blog)
+@receiver(post_delete, sender=BlogComment)
+@receiver(post_delete, sender=Testimonial)
+@receiver(post_delete, sender=HomeHeroSlide)
+def invalidate_public_pages(sender, **kwargs):
+    invalidate_model(sender)
+
+
+@receiver(post_save, sender=Blog)
+def index_blog_for_search(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_blog(instance)
+
+
+@receiver(post_delete, sender=Blog)
+def unindex_blog_for_search(sender, instance, **kwargs):
+    unindex_blog(instance.pk)
@@ -0,0 +1,98 @@
+import gzip
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.template import engines
+from django.template.loader import render_to_string
+
+from .page_cache import CSRF_PLACEHOLDER
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is used alone without it
+    brotli = None
+
+
+@lru_cache(maxsize=None)
+def template_index():
+    """Names of the top-level ``.html`` templates any template directory provides, scanned once per process.
+
+    The catch-all route only matches single-segment names, so nested directories are not indexed.
+    """
+    names = set()
+    for engine in engines.all():
+        for directory in getattr(engine, "template_dirs", ()):
+            path = Path(directory)
+            if path.is_dir():
+                names.update(entry.name for entry in path.iterdir() if entry.suffix == ".html" and entry.is_file())
+    return frozenset(names)
+
+
+def template_exists(template_name):
+    return template_name in template_index()
+
+
+class PageCache:
+    """A size-bounded LRU of rendered pages, holding each one as bytes plus any precompressed variants."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        entry_size = sum(len(body) for body in entry.values())
+        if entry_size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= sum(len(body) for body in self.entries.pop(key).values())
+            self.entries[key] = entry
+            self.size += entry_size
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= sum(len(body) for body in evicted.values())
+
+
+_page_cache = PageCache(int(getattr(settings, "TEMPLATE_PAGE_CACHE_BYTES", 8 * 1024 * 1024)))
+
+
+def _compress(body):
+    # Pages holding a CSRF placeholder are finished per request, so they are only stored uncompressed.
+    variants = {"identity": body}
+    if not getattr(settings, "TEMPLATE_PAGE_PRECOMPRESS", True) or CSRF_PLACEHOLDER.encode() in body:
+        return variants
+    variants["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+    if brotli is not None:
+        variants["br"] = brotli.compress(body)
+    return variants
+
+
+def rendered_page(template_name):
+    """Return ``{encoding: body}`` for a static template, rendering it on the first request only."""
+    entry = _page_cache.get(template_name)
+    if entry is None:
+        body = render_to_string(template_name, {"csrf_token": CSRF_PLACEHOLDER}).encode("utf-8")
+        entry = _compress(body)
+        if not settings.DEBUG:
+            _page_cache.set(template_name, entry)
+    return entry
+
+
+def choose_encoding(entry, accept_encoding):
+    accepted = {part.split(";")[0].strip().lower() for part in (accept_encoding or "").split(",")}
+    for encoding in ("br", "gzip"):
+        if encoding in entry and encoding in accepted:
+            return encoding
+    return "identity"
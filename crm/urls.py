@@ -19,6 +19,7 @@ urlpatterns = [
         name="notifications_mark_read",
     ),
     path("gallery/", views.gallery, name="gallery"),
+    path("exports/<str:filename>", views.export_download, name="export_download"),
     path("notifications/mark-all-read/", views.notifications_mark_all_read, name="notifications_mark_all_read"),
     path("calendar/<uuid:token>/", views.calendar_feed, name="calendar_feed"),
     path("google-calendar/connect/", views.google_calendar_connect, name="google_calendar_connect"),
@@ -3,21 +3,20 @@ import json
 import uuid
 import logging
 from datetime import timedelta
-from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
 from urllib.parse import urlencode
 from urllib import request as urlrequest
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout, get_user_model
 from django.contrib.auth.decorators import login_required
-from django.core.mail import send_mail
-from django.db.models import Q
-from django.db import transaction, IntegrityError
-from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.middleware.csrf import get_token
 from django.shortcuts import get_object_or_404, render
 from django.template.loader import get_template
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
 from django.views.decorators.csrf import csrf_exempt
 
 from .forms import (
@@ -28,25 +27,30 @@ from .forms import (
     LessonRequestForm,
     BlogCommentForm,
 )
+from .dedupe import capture_lead
+from .delivery import queue_email
+from .enrollment import enroll_student
+from .exports import export_path
+from .ics import feed_etag, load_feed_state, render_calendar, visible_events
+from .page_cache import CSRF_PLACEHOLDER, cache_public_page
+from .pagination import keyset_page
+from .payments import enqueue_stripe_event, mark_invoice_paid, process_stripe_event
+from .search import search_blogs
+from .static_pages import choose_encoding, rendered_page, template_exists
 from .models import (
-    Lead,
     LeadNote,
     Student,
     Invoice,
-    Payment,
     CalendarFeed,
     Lesson,
     EnrollmentRequest,
     LessonRequest,
-    ScheduledEmail,
     Notification,
     NotificationReceipt,
     Blog,
     BlogComment,
     Testimonial,
     Course,
-    CourseSession,
-    Enrollment,
     CalendarAccount,
     HomeHeroSlide,
 )
@@ -54,85 +58,26 @@ from .models import (
 
 logger = logging.getLogger(__name__)
 
-def _course_total_with_hst(course):
-    def _parse_decimal(value):
-        if value is None:
-            return None
-        if isinstance(value, Decimal):
-            return value
-        if isinstance(value, (int, float)):
-            return Decimal(str(value))
-        if isinstance(value, str):
-            cleaned = value.strip().replace("$", "").replace(",", "")
-            for token in ("+HST", "HST"):
-                cleaned = cleaned.replace(token, "")
-            cleaned = cleaned.strip()
-            if not cleaned:
-                return None
-            return Decimal(cleaned)
-        return None
-
-    try:
-        fees_total = None
-        if hasattr(course, "fees_calc"):
-            fees_total = _parse_decimal((course.fees_calc or {}).get("total"))
-        if fees_total is not None:
-            return fees_total.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-    except (InvalidOperation, TypeError, ValueError):
-        pass
-
-    base = Decimal(getattr(course, "price", 0) or 0).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-    hst_amount = (base * Decimal("0.13")).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-    return (base + hst_amount).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-
-
-def _queue_and_send_email(*, recipient_email, subject, body, to_lead=None, to_student=None):
-    if not recipient_email:
-        return 0
-    scheduled = ScheduledEmail.objects.create(
-        recipient_email=recipient_email,
-        subject=subject,
-        body=body,
-        scheduled_for=timezone.now(),
-        channel="email",
-        to_lead=to_lead,
-        to_student=to_student,
-        status="scheduled",
-    )
-    try:
-        html_message = body if body.strip().startswith("<") else None
-        send_mail(
-            subject,
-            body if not html_message else "",
-            getattr(settings, "DEFAULT_FROM_EMAIL", None),
-            [recipient_email],
-            fail_silently=False,
-            html_message=html_message,
-        )
-    except Exception as exc:
-        scheduled.last_error = str(exc)
-        scheduled.save(update_fields=["last_error"])
-        logger.exception("Email send failed (queued for retry): %s", subject)
-        return 0
-    scheduled.status = "sent"
-    scheduled.sent_at = timezone.now()
-    scheduled.last_error = ""
-    scheduled.save(update_fields=["status", "sent_at", "last_error"])
-    return 1
-
-
 def template_page(request, template_name):
     if ".." in template_name or template_name.startswith("/"):
         raise Http404()
     if not template_name.endswith(".html"):
         template_name = f"{template_name}.html"
-    try:
-        get_template(template_name)
-    except Exception as exc:
-        raise Http404() from exc
-    return render(request, template_name)
-
-
+    if not template_exists(template_name):
+        raise Http404()
+    entry = rendered_page(template_name)
+    encoding = choose_encoding(entry, request.META.get("HTTP_ACCEPT_ENCODING"))
+    body = entry[encoding]
+    if CSRF_PLACEHOLDER.encode() in body:
+        body = body.replace(CSRF_PLACEHOLDER.encode(), get_token(request).encode())
+    response = HttpResponse(body, content_type="text/html; charset=utf-8")
+    if encoding != "identity":
+        response["Content-Encoding"] = encoding
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return response
+
+
+@cache_public_page("blogs", "testimonials", "courses", "hero_slides")
 def index_page(request):
     home_blogs = Blog.objects.filter(is_published=True).order_by("-published_at")[:6]
     testimonials = Testimonial.objects.filter(is_published=True).order_by("display_order", "-updated_at")[:12]
@@ -148,6 +93,7 @@ def index_page(request):
     )
 
 
+@cache_public_page("testimonials")
 def about_page(request):
     testimonials = Testimonial.objects.filter(is_published=True).order_by("display_order", "-updated_at")[:12]
     return render(request, "about.html", {"testimonials": testimonials})
@@ -177,11 +123,13 @@ def not_found_page(request):
     return render(request, "404.html")
 
 
+@cache_public_page("courses")
 def course_page(request):
     courses = Course.objects.filter(active=True).exclude(slug="").order_by("display_order", "name")
     return render(request, "course.html", {"courses": courses})
 
 
+@cache_public_page("courses")
 def course_details_page(request, course_slug=None):
     if not course_slug:
         course = Course.objects.filter(active=True).exclude(slug="").order_by("display_order", "name").first()
@@ -212,125 +160,11 @@ def process_enrollment(request):
         raise Http404()
     course = get_object_or_404(Course, slug=course_slug, active=True)
         
-    first_name = request.POST.get("first_name", "").strip()
-    last_name = request.POST.get("last_name", "").strip()
-    email = request.POST.get("email", "").strip()
-    phone = request.POST.get("phone", "").strip()
-    address = request.POST.get("address", "").strip()
-    city = request.POST.get("city", "").strip()
-    province = request.POST.get("province", "").strip()
-    postal_code = request.POST.get("postal_code", "").strip()
-    notes = request.POST.get("notes", "").strip()
-    
-    # Create or update student
-    student = None
-    if request.user.is_authenticated:
-        student = Student.objects.filter(user=request.user).first()
-        
-    if not student:
-        # Check by email
-        student = Student.objects.filter(email=email).first()
-        
-    if not student:
-        # Create new student (without user account for now)
-        student = Student.objects.create(
-            first_name=first_name,
-            last_name=last_name,
-            email=email,
-            phone=phone,
-            address_line1=address,
-            city=city,
-            province=province,
-            postal_code=postal_code,
-        )
-    
-    # Create Enrollment Request (for admin tracking)
-    EnrollmentRequest.objects.create(
-        name=f"{first_name} {last_name}",
-        email=email,
-        phone=phone,
-        package=course.enroll_package or course.title,
-        preferred_location=f"{city}, {province}",
-        notes=notes,
-    )
-    
-    # Create Lead
-    Lead.objects.create(
-        first_name=first_name,
-        last_name=last_name,
-        email=email,
-        phone=phone,
-        status="new",
-        interest=course.title,
-        notes=notes,
-    )
-    
-    # Create Enrollment record (pending)
-    # We need a CourseSession, but for now we might not have one selected.
-    # Let's check if we can create an Enrollment without a session or pick a default/dummy one.
-    # The Enrollment model requires a session.
-    # For simplicity, we'll try to find an open session for this course type or create a placeholder.
-    # Or, given the constraints, we might skip Enrollment creation and go straight to Invoice 
-    # if Invoice doesn't strictly require Enrollment (let's check Invoice model).
-    # Invoice requires Enrollment.
-    
-    # So we need a Course and CourseSession in DB matching the catalog.
-    # This might be a bit complex if DB is empty.
-    # Let's try to find or create a placeholder Course and Session.
-    
-    db_session = CourseSession.objects.filter(course=course, enrollment_open=True).first()
-    if not db_session:
-        db_session = CourseSession.objects.create(
-            course=course,
-            start_date=timezone.now().date(),
-            location="Online/TBD",
-            delivery_mode="online" if "online" in (course.session or "").lower() else "in_class"
-        )
-        
-    enrollment = Enrollment.objects.create(
-        student=student,
-        session=db_session,
-        status="pending"
-    )
-    
-    # Create Invoice
-    import random
-    total_amount = _course_total_with_hst(course)
-    
-    invoice = None
-    max_retries = 5
-    for _ in range(max_retries):
-        invoice_number = f"INV-{timezone.now().strftime('%Y%m%d')}-{random.randint(1000, 9999)}"
-        if not Invoice.objects.filter(number=invoice_number).exists():
-            try:
-                with transaction.atomic():
-                    invoice = Invoice.objects.create(
-                        enrollment=enrollment,
-                        number=invoice_number,
-                        issue_date=timezone.now().date(),
-                        total_amount=total_amount,
-                        status="draft",
-                        notes=f"Enrollment for {course.title}"
-                    )
-                break
-            except IntegrityError:
-                continue
-            except Exception:
-                continue
-    
-    if not invoice:
-        # Fallback to UUID if random fails repeatedly
-        import uuid
-        invoice_number = f"INV-{uuid.uuid4().hex[:12].upper()}"
-        invoice = Invoice.objects.create(
-            enrollment=enrollment,
-            number=invoice_number,
-            issue_date=timezone.now().date(),
-            total_amount=total_amount,
-            status="draft",
-            notes=f"Enrollment for {course.title}"
-        )
-    
+    fields = ("first_name", "last_name", "email", "phone", "address", "city", "province", "postal_code", "notes")
+    details = {name: request.POST.get(name, "").strip() for name in fields}
+    first_name, last_name, email = details["first_name"], details["last_name"], details["email"]
+    student, invoice = enroll_student(course, details, user=request.user)
+
     payment_method = request.POST.get("payment_method", "stripe")
     if payment_method == "pay_later":
         student_name = f"{first_name} {last_name}".strip() or "Student"
@@ -352,11 +186,7 @@ def process_enrollment(request):
                 f"<p>To complete payment and confirm your lesson time, please call <a href=\"tel:+16478891708\">+1 (647) 889-1708</a>.</p>"
                 f"<p>Regards,<br/>Sams Driving School</p>"
             )
-            exists = ScheduledEmail.objects.filter(
-                recipient_email=student.email, subject=user_subject, body=user_body, channel="email"
-            ).exclude(status="cancelled").exists()
-            if not exists:
-                _queue_and_send_email(recipient_email=student.email, subject=user_subject, body=user_body, to_student=student)
+            queue_email(recipient_email=student.email, subject=user_subject, body=user_body, to_student=student)
 
         admin_email = getattr(settings, "ENROLLMENT_NOTIFICATION_EMAIL", "")
         if admin_email:
@@ -371,11 +201,7 @@ def process_enrollment(request):
                 f"<li><strong>Amount Due:</strong> ${amount_due}</li>"
                 f"</ul>"
             )
-            exists = ScheduledEmail.objects.filter(
-                recipient_email=admin_email, subject=admin_subject, body=admin_body, channel="email"
-            ).exclude(status="cancelled").exists()
-            if not exists:
-                _queue_and_send_email(recipient_email=admin_email, subject=admin_subject, body=admin_body)
+            queue_email(recipient_email=admin_email, subject=admin_subject, body=admin_body)
 
         return render(request, "enroll_success_pay_later.html", {
             "invoice": invoice, 
@@ -402,13 +228,69 @@ def requests_get_or_create_course(course_data):
     return course, created
 
 
+# Listing pages never show the post body, so these are the only Blog columns they load.
+BLOG_CARD_FIELDS = (
+    "id",
+    "title",
+    "slug",
+    "cover_image",
+    "author_image",
+    "author_name",
+    "author_title",
+    "published_at",
+)
+
+
+def _page_url(request, param, cursor, fragment=""):
+    query = request.GET.copy()
+    query.pop(param, None)
+    if cursor:
+        query[param] = cursor
+    encoded = query.urlencode()
+    return f"{request.path}{'?' + encoded if encoded else ''}{fragment}"
+
+
+def _recent_comments(limit):
+    return (
+        BlogComment.objects.filter(is_approved=True, blog__is_published=True)
+        .select_related("blog")
+        .only("body", "blog__slug")
+        .order_by("-created_at", "-id")[:limit]
+    )
+
+
+def _blog_details_context(request, blog, comment_form):
+    comments = keyset_page(
+        BlogComment.objects.filter(blog=blog, is_approved=True).only("name", "body", "created_at"),
+        ("-created_at", "-id"),
+        request.GET.get("comments", ""),
+        int(getattr(settings, "BLOG_COMMENTS_PAGE_SIZE", 20)),
+    )
+    return {
+        "blog": blog,
+        "latest_blogs": (
+            Blog.objects.filter(is_published=True)
+            .exclude(pk=blog.pk)
+            .only(*BLOG_CARD_FIELDS)
+            .order_by("-published_at", "-id")[:3]
+        ),
+        "comments": comments.items,
+        "comment_count": BlogComment.objects.filter(blog=blog, is_approved=True).count(),
+        "comments_next_url": _page_url(request, "comments", comments.next_cursor, "#comments") if comments.next_cursor else "",
+        "comments_previous_url": (
+            _page_url(request, "comments", comments.previous_cursor, "#comments") if comments.previous_cursor else ""
+        ),
+        "recent_comments": _recent_comments(6),
+        "comment_form": comment_form,
+    }
+
+
+@cache_public_page("blogs", "blog_comments", query_params=("category", "tag", "cursor"), bypass_params=("q",))
 def blog_grid_right_page(request):
-    blogs = Blog.objects.filter(is_published=True).order_by("-published_at")
+    blogs = Blog.objects.filter(is_published=True).only(*BLOG_CARD_FIELDS)
     q = (request.GET.get("q") or "").strip()
     category_slug = (request.GET.get("category") or "").strip()
     tag_slug = (request.GET.get("tag") or "").strip()
-    if q:
-        blogs = blogs.filter(Q(title__icontains=q) | Q(summary__icontains=q) | Q(content__icontains=q))
 
     blog_field_names = {f.name for f in Blog._meta.get_fields()}
     categories = []
@@ -416,28 +298,38 @@ def blog_grid_right_page(request):
     if "categories" in blog_field_names:
         category_model = Blog._meta.get_field("categories").related_model
         categories = category_model.objects.order_by("name")
+        blogs = blogs.prefetch_related("categories")
         if category_slug:
             blogs = blogs.filter(categories__slug=category_slug)
     if "tags" in blog_field_names:
         tag_model = Blog._meta.get_field("tags").related_model
         tags = tag_model.objects.order_by("name")
+        blogs = blogs.prefetch_related("tags")
         if tag_slug:
             blogs = blogs.filter(tags__slug=tag_slug)
-    latest_blogs = blogs[:3]
-    comments = (
-        BlogComment.objects.filter(is_approved=True, blog__is_published=True)
-        .select_related("blog")
-        .order_by("-created_at")[:4]
+    latest_blogs = blogs.order_by("-published_at", "-id")[:3]
+    ordering = ("-published_at", "-id")
+    if q:
+        blogs = search_blogs(blogs, q)
+        if "search_rank" in blogs.query.annotations:
+            ordering = ("-search_rank",) + ordering
+    page = keyset_page(
+        blogs.distinct(),
+        ordering,
+        request.GET.get("cursor", ""),
+        int(getattr(settings, "BLOG_PAGE_SIZE", 10)),
     )
     return render(
         request,
         "blogs.html",
         {
-            "blogs": blogs.distinct(),
+            "blogs": page.items,
+            "next_url": _page_url(request, "cursor", page.next_cursor) if page.next_cursor else "",
+            "previous_url": _page_url(request, "cursor", page.previous_cursor) if page.previous_cursor else "",
             "latest_blogs": latest_blogs,
             "categories": categories,
             "tags": tags,
-            "comments": comments,
+            "comments": _recent_comments(4),
             "q": q,
             "category": category_slug,
             "tag": tag_slug,
@@ -447,27 +339,7 @@ def blog_grid_right_page(request):
 
 def blog_details_right_page(request, slug):
     blog = get_object_or_404(Blog, slug=slug, is_published=True)
-    latest_blogs = (
-        Blog.objects.filter(is_published=True).exclude(pk=blog.pk).order_by("-published_at")[:3]
-    )
-    comments = BlogComment.objects.filter(blog=blog, is_approved=True).order_by("-created_at")
-    recent_comments = (
-        BlogComment.objects.filter(is_approved=True, blog__is_published=True)
-        .select_related("blog")
-        .order_by("-created_at")[:6]
-    )
-    comment_form = BlogCommentForm()
-    return render(
-        request,
-        "blog-details.html",
-        {
-            "blog": blog,
-            "latest_blogs": latest_blogs,
-            "comments": comments,
-            "recent_comments": recent_comments,
-            "comment_form": comment_form,
-        },
-    )
+    return render(request, "blog-details.html", _blog_details_context(request, blog, BlogCommentForm()))
 
 
 def blog_comment_create(request, slug):
@@ -486,26 +358,7 @@ def blog_comment_create(request, slug):
         )
         return HttpResponseRedirect(f"{reverse('blog_details', args=[blog.slug])}#comments")
 
-    latest_blogs = (
-        Blog.objects.filter(is_published=True).exclude(pk=blog.pk).order_by("-published_at")[:3]
-    )
-    comments = BlogComment.objects.filter(blog=blog, is_approved=True).order_by("-created_at")
-    recent_comments = (
-        BlogComment.objects.filter(is_approved=True, blog__is_published=True)
-        .select_related("blog")
-        .order_by("-created_at")[:6]
-    )
-    return render(
-        request,
-        "blog-details.html",
-        {
-            "blog": blog,
-            "latest_blogs": latest_blogs,
-            "comments": comments,
-            "recent_comments": recent_comments,
-            "comment_form": form,
-        },
-    )
+    return render(request, "blog-details.html", _blog_details_context(request, blog, form))
 
 
 def contact_page(request):
@@ -526,17 +379,16 @@ def lead_capture(request):
     parts = name.split()
     first_name = parts[0] if parts else ""
     last_name = " ".join(parts[1:]) if len(parts) > 1 else ""
-    lead = Lead.objects.create(
+    lead, created = capture_lead(
         first_name=first_name,
         last_name=last_name,
         email=email,
         phone=phone,
-        status="new",
         source="Website Contact Form",
         interest=subject,
         notes=message,
     )
-    if message:
+    if message and created:
         LeadNote.objects.create(lead=lead, note=message)
 
     # Send acknowledgement to lead (HTML)
@@ -548,7 +400,7 @@ def lead_capture(request):
             "message": message,
         }
         ack_html = get_template("emails/contact_ack.html").render(ack_context)
-        _queue_and_send_email(recipient_email=email, subject=ack_subject, body=ack_html, to_lead=lead)
+        queue_email(recipient_email=email, subject=ack_subject, body=ack_html, to_lead=lead)
 
     notification_email = getattr(settings, "ENROLLMENT_NOTIFICATION_EMAIL", "")
     if notification_email:
@@ -561,7 +413,7 @@ def lead_capture(request):
             "message": message,
         }
         admin_html = get_template("emails/contact_admin_notification.html").render(admin_context)
-        _queue_and_send_email(recipient_email=notification_email, subject=admin_subject, body=admin_html)
+        queue_email(recipient_email=notification_email, subject=admin_subject, body=admin_html)
     return HttpResponseRedirect(request.META.get("HTTP_REFERER") or reverse("contact_page"))
 
 
@@ -628,6 +480,14 @@ def enroll_request(request):
         data["email"] = f"visitor+{timezone.now().strftime('%Y%m%d%H%M%S')}@example.com"
     if not data["notes"]:
         data["notes"] = "Auto-captured from pricing Apply Now."
+    lead, _ = capture_lead(
+        first_name=data["name"].split()[0],
+        last_name=" ".join(data["name"].split()[1:]),
+        email=data["email"],
+        phone=data.get("phone", ""),
+        interest=data.get("package", ""),
+        notes=data.get("notes", ""),
+    )
     EnrollmentRequest.objects.create(
         name=data["name"],
         email=data["email"],
@@ -636,18 +496,10 @@ def enroll_request(request):
         preferred_location=data.get("preferred_location", ""),
         preferred_schedule=data.get("preferred_schedule", ""),
         notes=data.get("notes", ""),
-    )
-    Lead.objects.create(
-        first_name=data["name"].split()[0],
-        last_name=" ".join(data["name"].split()[1:]),
-        email=data["email"],
-        phone=data.get("phone", ""),
-        status="new",
-        interest=data.get("package", ""),
-        notes=data.get("notes", ""),
+        lead=lead,
     )
     if settings.ENROLLMENT_NOTIFICATION_EMAIL:
-        _queue_and_send_email(
+        queue_email(
             recipient_email=settings.ENROLLMENT_NOTIFICATION_EMAIL,
             subject="New Enrollment Request",
             body=f"{data['name']} requested {data.get('package','')} {data.get('preferred_location','')}",
@@ -670,16 +522,15 @@ def lesson_request(request):
         preferred_time=data.get("preferred_time", ""),
         notes=data.get("notes", ""),
     )
-    Lead.objects.create(
+    capture_lead(
         first_name=data["name"].split()[0],
         last_name=" ".join(data["name"].split()[1:]),
         email=data["email"],
         phone=data.get("phone", ""),
-        status="new",
         notes=data.get("notes", ""),
     )
     if settings.ENROLLMENT_NOTIFICATION_EMAIL:
-        _queue_and_send_email(
+        queue_email(
             recipient_email=settings.ENROLLMENT_NOTIFICATION_EMAIL,
             subject="New Lesson Request",
             body=f"{data['name']} requested a lesson on {data.get('preferred_date','')} {data.get('preferred_time','')}",
@@ -688,41 +539,25 @@ def lesson_request(request):
 
 
 def calendar_feed(request, token):
-    feed = CalendarFeed.objects.filter(token=token, active=True).select_related("student", "instructor").first()
+    feed = CalendarFeed.objects.filter(token=token, active=True).first()
     if not feed:
         raise Http404()
-    lessons = Lesson.objects.all()
-    if feed.feed_type == "student" and feed.student:
-        lessons = lessons.filter(student=feed.student)
-    if feed.feed_type == "instructor" and feed.instructor:
-        lessons = lessons.filter(instructor=feed.instructor)
-    if not feed.include_past:
-        lessons = lessons.filter(end_time__gte=timezone.now())
-    lessons = lessons.order_by("start_time")
-    lines = [
-        "BEGIN:VCALENDAR",
-        "VERSION:2.0",
-        "PRODID:-//Sams Driving//CRM//EN",
-        "CALSCALE:GREGORIAN",
-    ]
-    for lesson in lessons:
-        start = lesson.start_time.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
-        end = lesson.end_time.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
-        summary = f"{lesson.lesson_type.title()} Lesson"
-        uid = f"lesson-{lesson.id}@samsdriving"
-        lines.extend(
-            [
-                "BEGIN:VEVENT",
-                f"UID:{uid}",
-                f"DTSTAMP:{timezone.now().astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}",
-                f"DTSTART:{start}",
-                f"DTEND:{end}",
-                f"SUMMARY:{summary}",
-                "END:VEVENT",
-            ]
-        )
-    lines.append("END:VCALENDAR")
-    return HttpResponse("\r\n".join(lines), content_type="text/calendar; charset=utf-8")
+    now = timezone.now()
+    state = load_feed_state(feed, now)
+    events = visible_events(feed, state, now)
+    etag = feed_etag(events)
+    last_modified = state["modified_at"]
+    # Calendar clients poll every few minutes; unchanged feeds are answered without sending a body.
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified.timestamp()) if last_modified else None
+    )
+    if response is None:
+        response = StreamingHttpResponse(render_calendar(events), content_type="text/calendar; charset=utf-8")
+    response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 def stripe_checkout(request, invoice_id):
@@ -766,7 +601,7 @@ def stripe_success(request, invoice_id):
             payment_status = session.get("payment_status")
             payment_intent_id = session.get("payment_intent")
             if session_invoice_id and str(session_invoice_id) == str(invoice_id) and payment_status == "paid":
-                _mark_invoice_paid(invoice_id, payment_intent_id, session_id)
+                mark_invoice_paid(invoice_id, payment_intent_id, session_id)
         except Exception:
             logger.exception("Stripe success handler failed for invoice_id=%s", invoice_id)
     return HttpResponseRedirect(reverse("course_page"))
@@ -788,84 +623,31 @@ def stripe_webhook(request):
     payload = request.body
     sig_header = request.META.get("HTTP_STRIPE_SIGNATURE", "")
     try:
-        event = stripe.Webhook.construct_event(payload, sig_header, settings.STRIPE_WEBHOOK_SECRET)
+        stripe.Webhook.construct_event(payload, sig_header, settings.STRIPE_WEBHOOK_SECRET)
     except Exception:
         logger.exception("Stripe webhook signature verification failed")
         return JsonResponse({"status": "invalid"}, status=400)
-    event_type = event.get("type")
-    data_object = event.get("data", {}).get("object", {})
-    if event_type == "checkout.session.completed":
-        invoice_id = data_object.get("metadata", {}).get("invoice_id")
-        payment_intent_id = data_object.get("payment_intent")
-        session_id = data_object.get("id")
-        _mark_invoice_paid(invoice_id, payment_intent_id, session_id)
-    if event_type == "payment_intent.succeeded":
-        invoice_id = data_object.get("metadata", {}).get("invoice_id")
-        payment_intent_id = data_object.get("id")
-        _mark_invoice_paid(invoice_id, payment_intent_id, "")
+    # The verified payload as a plain dict: it is what the inbox stores, and recent stripe-python Event objects
+    # no longer support dict methods such as get().
+    event = json.loads(payload)
+    if getattr(settings, "STRIPE_WEBHOOK_MODE", "inline") == "inbox":
+        # Persist and acknowledge; the scheduler's inbox worker applies it, so SMTP latency never reaches Stripe.
+        enqueue_stripe_event(event)
+    else:
+        process_stripe_event(event)
     return JsonResponse({"status": "ok"})
 
 
-def _mark_invoice_paid(invoice_id, payment_intent_id, session_id):
-    if not invoice_id:
-        return
-    invoice = Invoice.objects.filter(id=invoice_id).first()
-    if not invoice:
-        return
-    invoice.status = "paid"
-    if payment_intent_id:
-        invoice.stripe_payment_intent_id = payment_intent_id
-    if session_id:
-        invoice.stripe_checkout_session_id = session_id
-    invoice.save(update_fields=["status", "stripe_payment_intent_id", "stripe_checkout_session_id"])
-    if not payment_intent_id:
-        return
-
-    Payment.objects.get_or_create(
-        stripe_payment_intent_id=payment_intent_id,
-        defaults={
-            "invoice": invoice,
-            "amount": invoice.total_amount,
-            "paid_at": timezone.now(),
-            "method": "stripe",
-            "status": "completed",
-        },
-    )
-
-    student = invoice.enrollment.student
-    course_name = invoice.enrollment.session.course.name if invoice.enrollment and invoice.enrollment.session else "Driving Course"
-
-    if student and student.email:
-        user_subject = "Payment Confirmation - Sams Driving School"
-        user_context = {
-            "student_name": f"{student.first_name} {student.last_name}".strip(),
-            "course_name": course_name,
-            "invoice_number": invoice.number,
-            "amount": f"{invoice.total_amount:.2f}",
-        }
-        user_html = get_template("emails/purchase_success_user.html").render(user_context)
-        exists = ScheduledEmail.objects.filter(
-            recipient_email=student.email, subject=user_subject, body=user_html, channel="email"
-        ).exclude(status="cancelled").exists()
-        if not exists:
-            _queue_and_send_email(recipient_email=student.email, subject=user_subject, body=user_html, to_student=student)
-
-    admin_email = getattr(settings, "ENROLLMENT_NOTIFICATION_EMAIL", "")
-    if admin_email:
-        admin_subject = f"New Payment Received - Invoice {invoice.number}"
-        admin_context = {
-            "student_name": f"{student.first_name} {student.last_name}".strip() if student else "Unknown",
-            "student_email": student.email if student else "Unknown",
-            "invoice_number": invoice.number,
-            "amount": f"{invoice.total_amount:.2f}",
-            "course_name": course_name,
-        }
-        admin_html = get_template("emails/purchase_success_admin.html").render(admin_context)
-        exists = ScheduledEmail.objects.filter(
-            recipient_email=admin_email, subject=admin_subject, body=admin_html, channel="email"
-        ).exclude(status="cancelled").exists()
-        if not exists:
-            _queue_and_send_email(recipient_email=admin_email, subject=admin_subject, body=admin_html)
+@login_required
+def export_download(request, filename):
+    if not (request.user.is_active and request.user.is_staff):
+        return JsonResponse({"detail": "forbidden"}, status=403)
+    path = export_path(filename)
+    if path is None:
+        raise Http404("Export not found")
+    response = FileResponse(open(path, "rb"), as_attachment=True, filename=filename)
+    response["Cache-Control"] = "private, no-store"
+    return response
 
 
 @login_required
@@ -53,6 +53,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "crm.page_cache.csrf_placeholder",
             ],
         },
     },
@@ -131,10 +132,67 @@ if EMAIL_USE_TLS and EMAIL_USE_SSL:
 EMAIL_TIMEOUT = int(os.environ.get("EMAIL_TIMEOUT", "20"))
 DEFAULT_FROM_EMAIL = os.environ.get("DEFAULT_FROM_EMAIL", "info@samsdriving.ca")
 ENROLLMENT_NOTIFICATION_EMAIL = os.environ.get("ENROLLMENT_NOTIFICATION_EMAIL", "info@samsdriving.ca")
+EMAIL_DELIVERY_WORKERS = int(os.environ.get("EMAIL_DELIVERY_WORKERS", "4"))
+EMAIL_DELIVERY_BATCH_SIZE = int(os.environ.get("EMAIL_DELIVERY_BATCH_SIZE", "50"))
+EMAIL_DELIVERY_LEASE_SECONDS = int(os.environ.get("EMAIL_DELIVERY_LEASE_SECONDS", "300"))
+EMAIL_DELIVERY_MAX_ATTEMPTS = int(os.environ.get("EMAIL_DELIVERY_MAX_ATTEMPTS", "5"))
+EMAIL_DELIVERY_RETRY_SECONDS = int(os.environ.get("EMAIL_DELIVERY_RETRY_SECONDS", "60"))
+# Outbox mode: requests only queue emails and the run_email_dispatcher process sends them.
+EMAIL_OUTBOX_MODE = os.environ.get("EMAIL_OUTBOX_MODE", "False").lower() == "true"
+EMAIL_DISPATCHER_ADDRESS = os.environ.get("EMAIL_DISPATCHER_ADDRESS", "127.0.0.1:8765")
+EMAIL_DISPATCHER_POLL_SECONDS = float(os.environ.get("EMAIL_DISPATCHER_POLL_SECONDS", "1"))
+LESSON_REMINDER_OFFSETS_HOURS = [
+    int(h) for h in os.environ.get("LESSON_REMINDER_OFFSETS_HOURS", "48,24,2").split(",") if h.strip()
+]
 
 SMS_WEBHOOK_URL = os.environ.get("SMS_WEBHOOK_URL", "")
 SMS_WEBHOOK_TOKEN = os.environ.get("SMS_WEBHOOK_TOKEN", "")
 
+DASHBOARD_SNAPSHOT_REFRESH_SECONDS = int(os.environ.get("DASHBOARD_SNAPSHOT_REFRESH_SECONDS", "300"))
+DASHBOARD_SNAPSHOT_MAX_AGE = int(os.environ.get("DASHBOARD_SNAPSHOT_MAX_AGE", "600"))
+DASHBOARD_WIDGET_CACHE_SECONDS = int(os.environ.get("DASHBOARD_WIDGET_CACHE_SECONDS", "300"))
+CALENDAR_FEED_CACHE_SECONDS = int(os.environ.get("CALENDAR_FEED_CACHE_SECONDS", "900"))
+LESSON_CHANGE_RETENTION_DAYS = int(os.environ.get("LESSON_CHANGE_RETENTION_DAYS", "30"))
+PUBLIC_PAGE_CACHE_SECONDS = int(os.environ.get("PUBLIC_PAGE_CACHE_SECONDS", "3600"))
+TEMPLATE_PAGE_CACHE_BYTES = int(os.environ.get("TEMPLATE_PAGE_CACHE_BYTES", str(8 * 1024 * 1024)))
+TEMPLATE_PAGE_PRECOMPRESS = os.environ.get("TEMPLATE_PAGE_PRECOMPRESS", "True").lower() == "true"
+# auto, index, native or like; see crm.search.search_blogs.
+BLOG_SEARCH_BACKEND = os.environ.get("BLOG_SEARCH_BACKEND", "auto")
+BLOG_PAGE_SIZE = int(os.environ.get("BLOG_PAGE_SIZE", "10"))
+BLOG_COMMENTS_PAGE_SIZE = int(os.environ.get("BLOG_COMMENTS_PAGE_SIZE", "20"))
+# Log admin changelists that run more queries than their changelist_query_budget.
+ADMIN_QUERY_BUDGET_ENFORCE = os.environ.get("ADMIN_QUERY_BUDGET_ENFORCE", "False").lower() == "true"
+EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", "2000"))
+# Background admin exports hold contact details; keep them outside MEDIA_ROOT and delete them after a while.
+EXPORT_ROOT = Path(os.environ.get("EXPORT_ROOT", str(BASE_DIR / "private" / "exports")))
+EXPORT_RETENTION_HOURS = int(os.environ.get("EXPORT_RETENTION_HOURS", "24"))
+# The scheduler's run_exports job writes queued exports; one still running after the timeout is marked failed.
+EXPORT_POLL_SECONDS = int(os.environ.get("EXPORT_POLL_SECONDS", "10"))
+EXPORT_JOB_TIMEOUT_SECONDS = int(os.environ.get("EXPORT_JOB_TIMEOUT_SECONDS", "3600"))
+
+# Without CACHE_DIR every process keeps its own in-memory cache; set it to share one on disk between workers.
+CACHE_DIR = os.environ.get("CACHE_DIR", "")
+if CACHE_DIR:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": CACHE_DIR,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "OPTIONS": {"MAX_ENTRIES": 1000},
+        }
+    }
+
+AUTO_SCHEDULE_DAY_START_HOUR = int(os.environ.get("AUTO_SCHEDULE_DAY_START_HOUR", "8"))
+AUTO_SCHEDULE_DAY_END_HOUR = int(os.environ.get("AUTO_SCHEDULE_DAY_END_HOUR", "20"))
+AUTO_SCHEDULE_SLOT_MINUTES = int(os.environ.get("AUTO_SCHEDULE_SLOT_MINUTES", "30"))
+AUTO_SCHEDULE_LESSON_MINUTES = int(os.environ.get("AUTO_SCHEDULE_LESSON_MINUTES", "60"))
+AUTO_SCHEDULE_SEARCH_DAYS = int(os.environ.get("AUTO_SCHEDULE_SEARCH_DAYS", "7"))
+
 
 CSRF_TRUSTED_ORIGINS = [
     "http://localhost",
@@ -151,6 +209,11 @@ SITE_URL = os.environ.get("SITE_URL", "http://localhost:8000")
 STRIPE_PUBLISHABLE_KEY = os.environ.get("STRIPE_PUBLISHABLE_KEY", "")
 STRIPE_SECRET_KEY = os.environ.get("STRIPE_SECRET_KEY", "")
 STRIPE_WEBHOOK_SECRET = os.environ.get("STRIPE_WEBHOOK_SECRET", "")
+# "inline" applies webhook events in the request; "inbox" stores them for the scheduler's process_stripe_inbox job.
+STRIPE_WEBHOOK_MODE = os.environ.get("STRIPE_WEBHOOK_MODE", "inline")
+STRIPE_INBOX_POLL_SECONDS = int(os.environ.get("STRIPE_INBOX_POLL_SECONDS", "5"))
+STRIPE_INBOX_RETRY_SECONDS = int(os.environ.get("STRIPE_INBOX_RETRY_SECONDS", "30"))
+STRIPE_INBOX_MAX_ATTEMPTS = int(os.environ.get("STRIPE_INBOX_MAX_ATTEMPTS", "8"))
 
 
 GOOGLE_OAUTH_CLIENT_ID = os.environ.get("GOOGLE_OAUTH_CLIENT_ID", "")